@@ -1,36 +1,303 @@
-from flask import Flask, render_template, redirect, url_for
-from flask_session import Session
-import mysql.connector
+from flask import Flask, Blueprint, Response, render_template, redirect, url_for, request, jsonify, abort
+from datetime import date, datetime
+import io
+import dal
+import rollups
+import history
+import exports
+import product_import
+import cache
+import sessions
+import metrics
+import receipt_archive
+import cold_storage
+import analytics
+import top_sellers
+import stock
 import sys
+import os
+import re
+import time
+import threading
+import mysql.connector
+from catalog import ProductCatalog
+from search import ProductSearchIndex
 from conn import *
 
+APP_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Routes live on a blueprint so `create_app` can build the app for any server.
+# Development: `python admin.py`. Production: `gunicorn -c gunicorn.conf.py wsgi:app`, see wsgi.py.
+pages = Blueprint("pages", __name__)
 
-app = Flask(__name__)
-app.config['SESSION_PERMANENT'] = False      # The session will expire when the browser is closed
-app.config['SESSION_TYPE'] = 'filesystem'    # The session data is stored in the disk
+def create_app(config=CONFIG):
+    # Raises ValueError on an invalid session backend
+    app = Flask(__name__)
+    app.config['SESSION_PERMANENT'] = False      # The session will expire when the browser is closed
+    # Server-side sessions in memory or in SQLite, see sessions.py
+    app.session_interface = sessions.StoreSessionInterface(sessions.create_store(config, APP_PATH))
+    app.register_blueprint(pages)
+    return app
 
-Session(app)                                 # Initialize Flask-session for the web server
+# Every request borrows its own connection from the pool in `dal`, so requests can run concurrently.
+# Each server worker process gets its own pool on first use.
 
-db = mysql.connector.connect(
-    host=r_host,
-    user=r_username,
-    password=r_password,
-    database=r_database
+# Pages are cached until the sales, products or stock they show change, see cache.py
+response_cache = cache.ResponseCache(
+    probe=lambda: cache.probe_versions(dal),
+    ttl=CONFIG.get('cache_ttl', 30),
+    probe_interval=CONFIG.get('cache_probe_interval', 2)
 )
-cursor = db.cursor()
 
-@app.route("/")
+# Product search runs against an in-memory catalog, loaded on first use and brought up to date
+# with a delta refresh once it is older than `catalog_refresh_interval` seconds
+product_catalog = ProductCatalog(search_index=ProductSearchIndex(), reconcile_interval=CONFIG.get('catalog_reconcile_interval', 600))
+product_catalog_refreshed = 0.0
+product_catalog_lock = threading.Lock()
+
+# Closed months moved out of MySQL by `python cold_storage.py archive`; history and exports read
+# them from their files
+sales_cold_storage = cold_storage.ColdStorage(os.path.join(APP_PATH, CONFIG.get('cold_storage_path', 'archive/sales')))
+
+def searchable_catalog(force=False):
+    global product_catalog_refreshed
+    if force or time.monotonic() - product_catalog_refreshed >= CONFIG.get('catalog_refresh_interval', 60):
+        with product_catalog_lock: # One refresh at a time; the others search the current state
+            if force or time.monotonic() - product_catalog_refreshed >= CONFIG.get('catalog_refresh_interval', 60):
+                product_catalog.refresh(dal)
+                product_catalog_refreshed = time.monotonic()
+    return product_catalog
+
+@pages.route("/")
+@response_cache.cached("sales", "stock", "metrics")
 def index():
-    return render_template("index.html")
+    today = date.today()
+    return render_template(
+        "index.html",
+        summary=rollups.daily_summary(dal, today),
+        top_products=rollups.top_products(dal, today),
+        low_stock=stock.low_stock(dal, limit=10),
+        lanes=metrics.lane_summary(metrics.load_lanes(dal), stale_after=3 * CONFIG.get('metrics_ship_interval', 15)),
+        currency=CONFIG['currency_code']
+    )
 
-@app.route("/transaction")
+@pages.route("/transaction")
+@response_cache.cached()
 def transaction():
-    return render_template("transaction.html", date='26-05-2025')
+    filters = history.Filters()
+    return render_template("transaction.html", date_from=filters.date_from, date_to=filters.date_to, currency=CONFIG['currency_code'])
+
+@pages.route("/api/transactions")
+@response_cache.cached("sales")
+def api_transactions():
+    try:
+        filters = history.Filters.from_args(request.args)
+        before_date = request.args.get('before_date')
+        before = (date.fromisoformat(before_date), request.args['before_id']) if before_date else None
+        limit = int(request.args.get('limit', 50))
+    except (ValueError, KeyError):
+        abort(400)
+    return jsonify(history.page(dal, filters, before, limit, cold=sales_cold_storage))
+
+@pages.route("/api/transactions/<transaction_id>/items")
+@response_cache.cached("sales")
+def api_transaction_items(transaction_id):
+    try:
+        transaction_date = date.fromisoformat(request.args['date']) if request.args.get('date') else None
+    except ValueError:
+        abort(400)
+    return jsonify(history.items(dal, transaction_id, transaction_date, cold=sales_cold_storage))
+
+@pages.route("/api/reports")
+@pages.route("/api/reports/<section>")
+@response_cache.cached("sales")
+def api_reports(section=None):
+    # Sales reports over `date_from`..`date_to` (default: the last 30 days), optionally one cashier
+    if section is not None and section not in analytics.SECTIONS:
+        abort(404)
+    try:
+        filters = history.Filters.from_args(request.args)
+        top = max(1, min(int(request.args.get('top', 20)), 500))
+    except ValueError:
+        abort(400)
+    if filters.date_from > filters.date_to or (filters.date_to - filters.date_from).days > 366 * 3:
+        abort(400)
+    sections = (section,) if section else analytics.SECTIONS
+    return jsonify(analytics.report(dal, filters, cold=sales_cold_storage, sections=sections, top=top, timeout_ms=CONFIG.get('report_timeout_ms', 110000)))
+
+@pages.route("/api/top-sellers")
+@response_cache.cached("metrics")
+def api_top_sellers():
+    # Best sellers across all lanes from their heavy-hitter sketches (top_sellers.py), with bounds:
+    # `window` is "hour" (the rolling last hour) or "day" (today)
+    window = request.args.get('window', 'hour')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), top_sellers.CAPACITY))
+    except ValueError:
+        abort(400)
+    lanes = metrics.load_lanes(dal)
+    now = datetime.now()
+    try:
+        if window == 'hour':
+            result = top_sellers.last_window(lanes, now, limit=limit)
+        elif window == 'day':
+            result = top_sellers.today(lanes, now.date().isoformat(), limit=limit)
+        else:
+            abort(400)
+    except (ValueError, KeyError) as e:
+        print("Unable to merge the lanes' best seller sketches")
+        print(e)
+        abort(500)
+    result.update(window=window, as_of=now.isoformat(timespec='seconds'))
+    return jsonify(result)
 
-@app.route("/product_management")
+@pages.route("/api/stock/low")
+@response_cache.cached("stock", "products")
+def api_low_stock():
+    # Products below their reorder level, including movements not compacted yet (see stock.py)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 1000))
+    except ValueError:
+        abort(400)
+    return jsonify(stock.low_stock(dal, limit))
+
+@pages.route("/api/stock")
+@response_cache.cached("stock", "products")
+def api_stock_levels():
+    # ?ean13=...&ean13=... (up to 500)
+    eans = request.args.getlist('ean13')
+    if not eans or len(eans) > 500:
+        abort(400)
+    return jsonify(stock.levels(dal, eans))
+
+@pages.route("/api/receipts")
+@response_cache.cached("sales")
+def api_receipts():
+    try:
+        receipt_date = date.fromisoformat(request.args['date'])
+        limit = max(1, min(int(request.args.get('limit', 500)), 5000))
+    except (ValueError, KeyError):
+        abort(400)
+    return jsonify(receipt_archive.on_date(dal, receipt_date, limit))
+
+@pages.route("/receipts/<transaction_id>.<receipt_format>")
+@response_cache.cached("sales")
+def archived_receipt(transaction_id, receipt_format):
+    # Reprint of any archived receipt, straight from its snapshot
+    formats = {
+        'txt': ('text', 'text/plain; charset=utf-8'),
+        'pdf': ('pdf', 'application/pdf'),
+        'bin': ('escpos', 'application/octet-stream')
+    }
+    if receipt_format not in formats:
+        abort(404)
+    receipt = receipt_archive.fetch(dal, transaction_id)
+    if receipt is None:
+        abort(404)
+    output_format, mimetype = formats[receipt_format]
+    headers = {"Content-Disposition": f"inline; filename=receipt_{transaction_id}.{receipt_format}"}
+    return Response(receipt.render(output_format, CONFIG.get('receipt_width', 42)), mimetype=mimetype, headers=headers)
+
+@pages.route("/export/transactions.<export_format>")
+def export_transactions(export_format):
+    encoders = {
+        'csv': (exports.csv_chunks, 'text/csv'),
+        'jsonl': (exports.jsonl_chunks, 'application/x-ndjson')
+    }
+    if export_format not in encoders:
+        abort(404)
+    try:
+        filters = history.Filters.from_args(request.args)
+    except ValueError:
+        abort(400)
+    encode, mimetype = encoders[export_format]
+    chunks = encode(exports.rows(dal, filters, timeout_ms=CONFIG.get('export_timeout_ms', 600000), cold=sales_cold_storage))
+    filename = f"transactions_{filters.date_from}_{filters.date_to}.{export_format}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = exports.gzip_chunks(chunks)
+        headers["Content-Disposition"] += ".gz"
+        mimetype = 'application/gzip'
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+@pages.route("/api/products/search")
+@response_cache.cached("products")
+def api_product_search():
+    query = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+    except ValueError:
+        abort(400)
+    results = searchable_catalog().search(query, limit)
+    return jsonify([{
+        "product_name": product_name,
+        "ean13": ean13,
+        "price": float(price),
+        "score": score
+    } for product_name, ean13, price, score in results])
+
+@pages.route("/api/metrics/<lane>", methods=["POST"])
+def ingest_lane_metrics(lane):
+    # Lanes POST their metrics snapshot here every `metrics_ship_interval` seconds (metrics.MetricsShipper)
+    if CONFIG.get('metrics_token') and request.headers.get('X-Metrics-Token') != CONFIG['metrics_token']:
+        abort(403)
+    if (request.content_length or 0) > 256 * 1024:
+        abort(413)
+    payload = request.get_json(silent=True)
+    try:
+        if not isinstance(payload, dict):
+            raise ValueError("payload must be an object")
+        if not re.fullmatch(r"[0-9A-Za-z_-]{1,16}", lane):
+            raise ValueError("invalid lane")
+        metrics.validate(payload.get("metrics"))
+        if "top_sellers" in payload["metrics"].get("sketches", {}):
+            top_sellers.validate(payload["metrics"]["sketches"]["top_sellers"])
+    except ValueError:
+        abort(400)
+    metrics.store_lane(dal, lane, payload["metrics"])
+    return "", 204
+
+@pages.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(metrics.load_lanes(dal)), mimetype="text/plain; version=0.0.4")
+
+@pages.route("/product_management")
+@response_cache.cached()
 def product_management():
     return render_template("product_management.html")
 
+@pages.route("/product_management/import", methods=["POST"])
+def product_import_upload():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return render_template("product_management.html", import_error="Choose a CSV file to import"), 400
+    text_stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    report = product_import.ImportReport()
+    try:
+        with dal.connection() as connection:
+            product_import.import_products(text_stream, connection, report=report)
+    except (ValueError, UnicodeDecodeError, mysql.connector.Error) as e:
+        # Transactions committed before the error stay imported
+        if report.committed:
+            imported_products()
+        if isinstance(e, mysql.connector.Error):
+            print("Product import stopped by a database error")
+            print(e)
+            return render_template("product_management.html", import_error=f"Import stopped by a database error after {report.committed} rows were saved: {e}", report=report), 500
+        return render_template("product_management.html", import_error=str(e), report=report if report.committed else None), 400
+    imported_products()
+    return render_template("product_management.html", report=report)
+
+def imported_products():
+    response_cache.invalidate("products")
+    if product_catalog.loaded:
+        searchable_catalog(force=True) # Imported rows are searchable straight away
+
 
 if __name__ == "__main__":
+    try:
+        app = create_app()
+    except ValueError as e:
+        print(e)
+        sys.exit(0)
     app.run(debug=True) # Starts the server in debug mode. This avoids server restarts on code changes
\ No newline at end of file
@@ -0,0 +1,300 @@
+from datetime import timedelta
+import numpy as np
+import history
+
+# Sales analytics for the admin reports.
+#
+# A period's sales are loaded once into a `SalesFrame`: plain NumPy column arrays, one row per
+# transaction and one per line item, with cashiers and EAN-13s as integer codes. Every report is
+# then a vectorized group-by over those columns (np.bincount on the codes), never a Python loop
+# over rows.
+#
+# Live months are read with two narrow queries fetched in batches (`dal.batches`); each batch is
+# transposed into columns and appended as arrays. A year of line items streams for longer than the
+# pool's statement timeout, so the caller passes its own (`timeout_ms`) as a MAX_EXECUTION_TIME
+# hint. Months in cold storage (cold_storage.py) are taken straight from their files, only the
+# columns needed. Loading dominates: the reports over a year of line items take a fraction of the
+# load time.
+#
+# Money is in integer cents throughout and converted to currency units in the JSON.
+# There is no cost price in `products`, so reports show revenue, not profit.
+
+LOAD_BATCH_SIZE = 50000
+MAX_BASKET_SIZE = 20 # Baskets with more items are counted together in the last bucket
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+UNKNOWN_HOUR = -1
+SECTIONS = ("totals", "comparison", "daily", "hourly", "weekdays", "cashiers", "products", "baskets")
+
+TRANSACTIONS_QUERY = """SELECT {hint}t.transaction_id, t.transaction_date, HOUR(t.transaction_time), CAST(ROUND(t.total_amount * 100) AS SIGNED), t.cashier_username
+    FROM transactions t WHERE {where}"""
+ITEMS_QUERY = """SELECT {hint}ti.transaction_id, COALESCE(ti.ean13, ''), ti.quantity, CAST(ROUND(ti.quantity * ti.price_per_unit * 100) AS SIGNED)
+    FROM transaction_items ti JOIN transactions t ON t.transaction_id = ti.transaction_id AND t.transaction_date = ti.transaction_date
+    WHERE {where} AND ti.transaction_date BETWEEN %s AND %s"""
+
+class SalesFrame:
+    def __init__(self, dates, hours, totals, cashiers, cashier_names, item_transactions, eans, ean_values, quantities, amounts):
+        # Transactions
+        self.dates = dates # datetime64[D]
+        self.hours = hours # int8, UNKNOWN_HOUR when the time is missing
+        self.totals = totals # int64 cents
+        self.cashiers = cashiers # int32 codes into cashier_names
+        self.cashier_names = cashier_names
+        # Line items
+        self.item_transactions = item_transactions # int32 row in the transaction columns
+        self.eans = eans # int32 codes into ean_values
+        self.ean_values = ean_values
+        self.quantities = quantities # int64
+        self.amounts = amounts # int64 cents, quantity * price_per_unit
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype="datetime64[D]"), np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=str), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=str),
+            np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    @property
+    def transaction_count(self):
+        return self.dates.size
+
+    def select(self, mask):
+        # The transactions where `mask` is set, with their line items
+        rows = np.flatnonzero(mask)
+        renumber = np.full(mask.size, -1, dtype=np.int32)
+        renumber[rows] = np.arange(rows.size, dtype=np.int32)
+        items = np.flatnonzero(mask[self.item_transactions])
+        return SalesFrame(self.dates[rows], self.hours[rows], self.totals[rows], self.cashiers[rows], self.cashier_names,
+            renumber[self.item_transactions[items]], self.eans[items], self.ean_values, self.quantities[items], self.amounts[items])
+
+def _unify(parts):
+    # [(codes, values)] with separate dictionaries -> (codes, values) over one sorted dictionary
+    values = np.unique(np.concatenate([part_values for codes, part_values in parts])) if parts else np.zeros(0, dtype=str)
+    codes = [np.searchsorted(values, part_values).astype(np.int32)[part_codes] if part_values.size else part_codes for part_codes, part_values in parts]
+    return (np.concatenate(codes) if codes else np.zeros(0, dtype=np.int32)), values
+
+def concat(frames):
+    frames = [frame for frame in frames if frame.transaction_count]
+    if not frames:
+        return SalesFrame.empty()
+    if len(frames) == 1:
+        return frames[0]
+    offsets = np.cumsum([0] + [frame.transaction_count for frame in frames[:-1]])
+    cashiers, cashier_names = _unify([(frame.cashiers, frame.cashier_names) for frame in frames])
+    eans, ean_values = _unify([(frame.eans, frame.ean_values) for frame in frames])
+    return SalesFrame(
+        np.concatenate([frame.dates for frame in frames]),
+        np.concatenate([frame.hours for frame in frames]),
+        np.concatenate([frame.totals for frame in frames]),
+        cashiers, cashier_names,
+        np.concatenate([frame.item_transactions + offset for frame, offset in zip(frames, offsets)]).astype(np.int32),
+        eans, ean_values,
+        np.concatenate([frame.quantities for frame in frames]),
+        np.concatenate([frame.amounts for frame in frames]))
+
+# Loading
+
+def _encode(values, dictionary):
+    # Codes for a batch of strings, growing `dictionary` ({value : code}) as new values appear.
+    # Only the batch's distinct values go through the dict.
+    distinct, inverse = np.unique(np.array(values, dtype=str), return_inverse=True)
+    codes = np.array([dictionary.setdefault(value, len(dictionary)) for value in distinct.tolist()], dtype=np.int32)
+    return codes[inverse] if codes.size else np.zeros(0, dtype=np.int32)
+
+def load_live(db, filters, batch_size=LOAD_BATCH_SIZE, timeout_ms=None):
+    where, params = filters.where()
+    hint = f"/*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */ " if timeout_ms else ""
+    cashier_codes = dict() # Format: {cashier_username : code}
+    transaction_ids, dates, hours, totals, cashiers = [], [], [], [], []
+    for rows in db.batches(TRANSACTIONS_QUERY.format(hint=hint, where=where), params, batch_size):
+        batch_ids, batch_dates, batch_hours, batch_totals, batch_cashiers = zip(*rows)
+        transaction_ids.append(np.array(batch_ids, dtype=str))
+        dates.append(np.array(batch_dates, dtype="datetime64[D]"))
+        # None (a missing time or total) becomes NaN as float, then the sentinel
+        hours.append(np.nan_to_num(np.array(batch_hours, dtype=float), nan=UNKNOWN_HOUR).astype(np.int8))
+        totals.append(np.nan_to_num(np.array(batch_totals, dtype=float)).astype(np.int64))
+        cashiers.append(_encode(batch_cashiers, cashier_codes))
+    if not dates:
+        return SalesFrame.empty()
+    # Line items find their transaction's row by binary search over the sorted IDs
+    transaction_ids = np.concatenate(transaction_ids)
+    by_id = np.argsort(transaction_ids)
+    sorted_ids = transaction_ids[by_id]
+    ean_codes = dict() # Format: {ean13 : code}
+    item_transactions, eans, quantities, amounts = [], [], [], []
+    for rows in db.batches(ITEMS_QUERY.format(hint=hint, where=where), (*params, filters.date_from, filters.date_to), batch_size):
+        batch_ids, batch_eans, batch_quantities, batch_amounts = zip(*rows)
+        batch_ids = np.array(batch_ids, dtype=str)
+        positions = np.minimum(np.searchsorted(sorted_ids, batch_ids), sorted_ids.size - 1)
+        known = sorted_ids[positions] == batch_ids # Sales committed between the two queries are left out
+        item_transactions.append(by_id[positions[known]].astype(np.int32))
+        eans.append(_encode(batch_eans, ean_codes)[known])
+        quantities.append(np.nan_to_num(np.array(batch_quantities, dtype=float)).astype(np.int64)[known])
+        amounts.append(np.nan_to_num(np.array(batch_amounts, dtype=float)).astype(np.int64)[known])
+    def join(parts, dtype):
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+    return SalesFrame(join(dates, "datetime64[D]"), join(hours, np.int8), join(totals, np.int64), join(cashiers, np.int32),
+        np.array(list(cashier_codes), dtype=str), join(item_transactions, np.int32), join(eans, np.int32),
+        np.array(list(ean_codes), dtype=str), join(quantities, np.int64), join(amounts, np.int64))
+
+def load_cold(cold, month, date_from, date_to, cashier=None):
+    mask = cold.transaction_mask(month, date_from, date_to, cashier)
+    rows = np.flatnonzero(mask)
+    renumber = np.full(mask.size, -1, dtype=np.int32)
+    renumber[rows] = np.arange(rows.size, dtype=np.int32)
+    parents = cold.column(month, "items.transaction")
+    items = np.flatnonzero(mask[parents])
+    times = cold.column(month, "transactions.transaction_time")[rows]
+    return SalesFrame(
+        cold.column(month, "transactions.transaction_date")[rows],
+        np.where(times >= 0, times // 3600, UNKNOWN_HOUR).astype(np.int8),
+        cold.column(month, "transactions.total_amount")[rows],
+        cold.column(month, "transactions.cashier_username")[rows],
+        cold.column(month, "transactions.cashier_username.dict"),
+        renumber[parents[items]],
+        cold.column(month, "items.ean13")[items],
+        cold.column(month, "items.ean13.dict"),
+        cold.column(month, "items.quantity")[items].astype(np.int64),
+        cold.column(month, "items.quantity")[items].astype(np.int64) * cold.column(month, "items.price_per_unit")[items])
+
+def load(db, filters, cold=None, timeout_ms=None):
+    # Every sale matching `filters` (a history.Filters), live and archived
+    segments = cold.segments(filters.date_from, filters.date_to) if cold is not None else [(None, filters.date_from, filters.date_to)]
+    frames = []
+    for month, date_from, date_to in segments:
+        if month is None:
+            frames.append(load_live(db, history.Filters(date_from, date_to, filters.cashier), timeout_ms=timeout_ms))
+        else:
+            frames.append(load_cold(cold, month, date_from, date_to, filters.cashier))
+    return concat(frames)
+
+# Reports, each one pass of np.bincount over the codes
+
+def _units(cents):
+    return round(float(cents) / 100, 2)
+
+def _change(current, previous):
+    # Percentage change, None when there is nothing to compare with
+    return round((current - previous) * 100.0 / previous, 1) if previous else None
+
+def totals(frame):
+    transaction_count = frame.transaction_count
+    revenue = int(frame.totals.sum())
+    items = int(frame.quantities.sum())
+    return {
+        "transaction_count": transaction_count,
+        "item_count": items,
+        "revenue": _units(revenue),
+        "average_basket_value": _units(revenue / transaction_count) if transaction_count else 0.0,
+        "average_basket_items": round(items / transaction_count, 2) if transaction_count else 0.0
+    }
+
+def comparison(current, previous, current_period, previous_period):
+    now, before = totals(current), totals(previous)
+    return {
+        "current": {"date_from": current_period[0].isoformat(), "date_to": current_period[1].isoformat(), **now},
+        "previous": {"date_from": previous_period[0].isoformat(), "date_to": previous_period[1].isoformat(), **before},
+        "change_percent": {name: _change(now[name], before[name]) for name in now}
+    }
+
+def daily(frame, date_from, date_to):
+    days = (date_to - date_from).days + 1
+    index = (frame.dates - np.datetime64(date_from)).astype(np.int64)
+    counts = np.bincount(index, minlength=days)
+    revenue = np.bincount(index, weights=frame.totals, minlength=days)
+    items = np.bincount(index[frame.item_transactions], weights=frame.quantities, minlength=days)
+    return [{
+        "date": (date_from + timedelta(days=day)).isoformat(),
+        "transaction_count": int(counts[day]),
+        "item_count": int(items[day]),
+        "revenue": _units(revenue[day])
+    } for day in range(days)]
+
+def hourly(frame):
+    known = frame.hours != UNKNOWN_HOUR
+    hours = frame.hours[known].astype(np.int64)
+    counts = np.bincount(hours, minlength=24)
+    revenue = np.bincount(hours, weights=frame.totals[known], minlength=24)
+    return [{"hour": hour, "transaction_count": int(counts[hour]), "revenue": _units(revenue[hour])} for hour in range(24)]
+
+def weekdays(frame):
+    # 1970-01-01 was a Thursday, so (days since the epoch + 3) % 7 counts from Monday
+    weekday = (frame.dates.astype(np.int64) + 3) % 7
+    counts = np.bincount(weekday, minlength=7)
+    revenue = np.bincount(weekday, weights=frame.totals, minlength=7)
+    days = np.bincount((np.unique(frame.dates).astype(np.int64) + 3) % 7, minlength=7) # Trading days per weekday
+    return [{
+        "weekday": WEEKDAYS[day],
+        "transaction_count": int(counts[day]),
+        "revenue": _units(revenue[day]),
+        "average_daily_revenue": _units(revenue[day] / days[day]) if days[day] else 0.0
+    } for day in range(7)]
+
+def cashiers(frame):
+    size = frame.cashier_names.size
+    counts = np.bincount(frame.cashiers, minlength=size)
+    revenue = np.bincount(frame.cashiers, weights=frame.totals, minlength=size)
+    items = np.bincount(frame.cashiers[frame.item_transactions], weights=frame.quantities, minlength=size)
+    order = np.argsort(-revenue, kind="stable")
+    return [{
+        "cashier_username": str(frame.cashier_names[code]),
+        "transaction_count": int(counts[code]),
+        "item_count": int(items[code]),
+        "revenue": _units(revenue[code]),
+        "average_basket_value": _units(revenue[code] / counts[code])
+    } for code in order if counts[code]]
+
+def products(frame, limit=20):
+    # Top sellers by quantity, then revenue
+    size = frame.ean_values.size
+    quantity = np.bincount(frame.eans, weights=frame.quantities, minlength=size)
+    revenue = np.bincount(frame.eans, weights=frame.amounts, minlength=size)
+    order = np.lexsort((-revenue, -quantity))[:limit]
+    return [{
+        "ean13": str(frame.ean_values[code]),
+        "quantity": int(quantity[code]),
+        "revenue": _units(revenue[code])
+    } for code in order if quantity[code]]
+
+def baskets(frame, max_size=MAX_BASKET_SIZE):
+    # How many transactions had 1, 2, ... items (units, not lines); the last bucket is max_size or more
+    sizes = np.bincount(frame.item_transactions, weights=frame.quantities, minlength=frame.transaction_count).astype(np.int64)
+    counts = np.bincount(np.minimum(sizes, max_size), minlength=max_size + 1)
+    return [{"items": f"{size}+" if size == max_size else str(size), "transaction_count": int(counts[size])} for size in range(max_size + 1)]
+
+def product_names(db, eans, date_from, date_to):
+    # Names as sold, from the product rollup (kept for archived months too)
+    if not eans:
+        return dict()
+    placeholders = ", ".join(["%s"] * len(eans))
+    rows = db.fetchall(f"SELECT ean13, MAX(item_name) FROM sales_by_product WHERE sales_date BETWEEN %s AND %s AND ean13 IN ({placeholders}) GROUP BY ean13",
+        (date_from, date_to, *eans))
+    return {ean13: item_name for ean13, item_name in rows}
+
+def report(db, filters, cold=None, sections=SECTIONS, top=20, timeout_ms=None):
+    # One load covers the period and the one before it, for the comparison
+    days = (filters.date_to - filters.date_from).days + 1
+    previous_period = (filters.date_from - timedelta(days=days), filters.date_from - timedelta(days=1))
+    load_from = previous_period[0] if "comparison" in sections else filters.date_from
+    frame = load(db, history.Filters(load_from, filters.date_to, filters.cashier), cold, timeout_ms)
+    current = frame.select(frame.dates >= np.datetime64(filters.date_from))
+    result = {"date_from": filters.date_from.isoformat(), "date_to": filters.date_to.isoformat(), "cashier": filters.cashier}
+    if "totals" in sections:
+        result["totals"] = totals(current)
+    if "comparison" in sections:
+        result["comparison"] = comparison(current, frame.select(frame.dates < np.datetime64(filters.date_from)), (filters.date_from, filters.date_to), previous_period)
+    if "daily" in sections:
+        result["daily"] = daily(current, filters.date_from, filters.date_to)
+    if "hourly" in sections:
+        result["hourly"] = hourly(current)
+    if "weekdays" in sections:
+        result["weekdays"] = weekdays(current)
+    if "cashiers" in sections:
+        result["cashiers"] = cashiers(current)
+    if "products" in sections:
+        top_products = products(current, top)
+        names = product_names(db, [product["ean13"] for product in top_products], filters.date_from, filters.date_to)
+        for product in top_products:
+            product["item_name"] = names.get(product["ean13"]) or product["ean13"]
+        result["products"] = top_products
+    if "baskets" in sections:
+        result["baskets"] = baskets(current)
+    return result
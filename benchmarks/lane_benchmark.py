@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+# Headless lane benchmark: drives CashierMainApp on Qt's offscreen platform and measures
+#
+#     scan        barcode entered -> cart row rendered (ean13_input + update_cart, catalog hits and misses)
+#     checkout    process_payment -> sale journaled, lane back to the cashier
+#     receipt     process_payment -> receipt produced on the receipt worker and shown
+#     db_commit   one journaled sale flushed into the database (JournalFlusher.flush_batch)
+#
+# for each catalog size, plus catalog load time and process memory.
+#
+#     python benchmarks/lane_benchmark.py                                   1k, 50k, 500k SKUs on the SQLite stand-in
+#     python benchmarks/lane_benchmark.py --skus 50000 --output base.json   save a baseline
+#     python benchmarks/lane_benchmark.py --skus 50000 --baseline base.json compare, exit 1 on a regression
+#     python benchmarks/lane_benchmark.py --backend mysql                   the database in config.json (use a scratch one!)
+#
+# Scripts are generated from `--seed`, so two runs replay exactly the same scans and payments.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results")
+METRICS = ("scan", "checkout", "receipt", "db_commit")
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def at(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3)
+    return {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 3), "p50": at(50), "p95": at(95), "p99": at(99), "max": round(ordered[-1], 3)}
+
+def rss_mb():
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # bytes on macOS, KiB on Linux
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except OSError:
+        return None
+
+def make_script(eans, late_eans, baskets, basket_size, miss_rate, seed):
+    # Format: list of baskets, each a list of EAN-13s; `late_eans` were added after the catalog loaded
+    rng = random.Random(seed)
+    hot = eans[:max(1, len(eans) // 20)] # Most scans hit a small set of fast movers
+    script = []
+    for _ in range(baskets):
+        basket = []
+        for _ in range(max(1, int(rng.gauss(basket_size, basket_size / 3)))):
+            if late_eans and rng.random() < miss_rate:
+                basket.append(rng.choice(late_eans))
+            else:
+                basket.append(rng.choice(hot) if rng.random() < 0.8 else rng.choice(eans))
+        script.append(basket)
+    return script
+
+def run_size(app, main, dal, standin, skus, args, rng_seed, first_ean):
+    from PyQt6.QtCore import QEventLoop
+    from journal import SaleJournal, JournalFlusher
+
+    def pump(condition, timeout=120):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Benchmark step did not finish in time")
+            app.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 5)
+
+    cnx = dal.connect()
+    eans = standin.seed_products(cnx, skus, seed=rng_seed, start=first_ean)
+
+    # Isolated journal, drained synchronously below so commit latency is measured one sale at a time
+    work_dir = tempfile.mkdtemp(prefix="lane_benchmark_")
+    main.flusher.stop() # load_backend started the lane's own flusher on the lane's journal
+    main.journal.close()
+    main.journal = SaleJournal(os.path.join(work_dir, "sales.journal"), fsync_interval=main.journal.fsync_interval)
+    main.flusher = JournalFlusher(main.journal, dal.connect, batch_size=1, on_commit=main.commit_sales, after_commit=main.lane_top_sellers.add_sales)
+
+    main.catalog = main.ProductCatalog(search_index=main.ProductSearchIndex()) # Each size starts cold, from its own database
+    started = time.perf_counter()
+    lane = main.CashierMainApp("bench", "Benchmark")
+    lane.show()
+    pump(lambda: lane.catalog.loaded)
+    catalog_load = time.perf_counter() - started
+
+    # Products added after the catalog loaded are cache misses that go to the database
+    late_count = max(1, skus // 100)
+    late_eans = standin.seed_products(cnx, late_count, seed=rng_seed + 1, start=first_ean + skus)
+    cnx.close()
+
+    script = make_script(eans, late_eans, args.baskets, args.basket_size, args.miss_rate, rng_seed)
+    samples = {metric: [] for metric in METRICS}
+    try:
+        for basket in script:
+            for ean13 in basket:
+                started = time.perf_counter()
+                rows = lane.cart.rowCount()
+                quantity = lane.cart.line(ean13).quantity if lane.cart.line(ean13) else 0
+                lane.ean13_input.setText(ean13)
+                lane.update_cart()
+                pump(lambda: lane.cart.rowCount() != rows or (lane.cart.line(ean13) and lane.cart.line(ean13).quantity != quantity))
+                lane.table.viewport().repaint() # Render now rather than at the next idle paint
+                samples["scan"].append((time.perf_counter() - started) * 1000)
+
+            lane.payment_widget()
+            lane.payment_input.setText(f"{lane.TOTAL + 50:.2f}")
+            started = time.perf_counter()
+            lane.process_payment()
+            samples["checkout"].append((time.perf_counter() - started) * 1000)
+            pump(lambda: lane.LAST_RECEIPT is not None)
+            lane.receipt.repaint()
+            samples["receipt"].append((time.perf_counter() - started) * 1000)
+            lane.receipt.close()
+
+            started = time.perf_counter()
+            main.journal.sync()
+            main.flusher.flush_batch()
+            samples["db_commit"].append((time.perf_counter() - started) * 1000)
+            lane.new_transaction()
+    finally:
+        main.flusher._disconnect()
+        lane.catalog_timer.stop()
+        lane.close()
+        main.journal.close()
+
+    result = {metric: percentiles(values) for metric, values in samples.items()}
+    result["catalog_load_s"] = round(catalog_load, 3)
+    result["catalog_hit_rate"] = round(lane.catalog.hits / max(1, lane.catalog.hits + lane.catalog.misses), 4)
+    result["peak_rss_mb"] = rss_mb()
+    return result
+
+def compare(results, baseline, tolerance):
+    # Returns a list of regressions: p95 slower than the baseline by more than `tolerance`
+    regressions = []
+    for skus, result in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(skus)
+        if not base:
+            continue
+        for metric in METRICS:
+            now, then = result[metric].get("p95"), base.get(metric, {}).get("p95")
+            if now is not None and then and now > then * (1 + tolerance):
+                regressions.append(f"{skus} SKUs {metric} p95 {now:.2f}ms vs baseline {then:.2f}ms (+{(now / then - 1) * 100:.0f}%)")
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Headless lane benchmark: scan and checkout latency")
+    parser.add_argument("--skus", default="1000,50000,500000", help="Comma-separated catalog sizes")
+    parser.add_argument("--baskets", type=int, default=200)
+    parser.add_argument("--basket-size", type=int, default=12)
+    parser.add_argument("--miss-rate", type=float, default=0.02, help="Share of scans for products added after the catalog loaded")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--output", help="Where to write the results JSON (default benchmarks/results/lane-<time>.json)")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown against the baseline")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.chdir(ROOT) # conn.py reads config.json from the working directory
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import standin
+    database_dir = tempfile.mkdtemp(prefix="lane_benchmark_db_")
+    if args.backend == "sqlite":
+        standin.install(os.path.join(database_dir, "lane-0.sqlite"))
+
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication(sys.argv[:1])
+    import dal
+    import main
+    main.load_backend()
+
+    results = {
+        "benchmark": "lane",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "settings": {"baskets": args.baskets, "basket_size": args.basket_size, "miss_rate": args.miss_rate, "seed": args.seed},
+        "sizes": {}
+    }
+    for index, skus in enumerate(int(size) for size in args.skus.split(",")):
+        print(f"{skus} SKUs ...", flush=True)
+        if args.backend == "sqlite":
+            # A fresh database per size; on MySQL each size gets its own EAN range instead
+            dal.close_pool()
+            standin.install(os.path.join(database_dir, f"lane-{skus}.sqlite"))
+        results["sizes"][str(skus)] = result = run_size(app, main, dal, standin, skus, args, args.seed + index, first_ean=index * 10 ** 8)
+        for metric in METRICS:
+            summary = result[metric]
+            print(f"  {metric:<10} p50 {summary['p50']:8.2f}ms  p95 {summary['p95']:8.2f}ms  p99 {summary['p99']:8.2f}ms  (n={summary['count']})")
+        print(f"  catalog load {result['catalog_load_s']:.2f}s, hit rate {result['catalog_hit_rate']:.1%}, peak RSS {result['peak_rss_mb']} MB")
+
+    output = args.output or os.path.join(RESULTS_PATH, f"lane-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+# Multi-lane checkout load generator.
+#
+# Each simulated lane is a thread that takes the same path as `process_payment`: a
+# TransactionIdGenerator ID, SaleJournal.append, then a JournalFlusher commit. The commit writes the
+# transactions header, the transaction_items executemany, the rollups and the receipt snapshots, as
+# the lanes' flushers do.
+# Every lane has its own journal and database connection.
+#
+#     python benchmarks/load_generator.py --lanes 20 --duration 60 --rate 0.5      20 lanes, ~1 sale every 2s each
+#     python benchmarks/load_generator.py --lanes 50 --rate 0                       closed loop: every lane as fast as it can
+#     python benchmarks/load_generator.py --id-scheme unix                          the old unix-seconds IDs, to see them collide
+#     python benchmarks/load_generator.py --backend sqlite                          no MySQL at hand (writes serialize)
+#
+# Reported: sustained sales per second, checkout latency (journal + commit) percentiles,
+# deadlocks (1213), lock wait timeouts (1205), failed inserts (duplicate IDs, rejected sales)
+# and connection errors. MySQL runs use the database in config.json: point it at a scratch
+# database, the generated sales are real rows.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+LANE_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def at(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3)
+    return {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 3), "p50": at(50), "p95": at(95), "p99": at(99), "max": round(ordered[-1], 3)}
+
+def lane_id(number):
+    # "L00" .. "LZZ", kept clear of real serial IDs
+    return "L" + LANE_CHARS[number // 36 % 36] + LANE_CHARS[number % 36]
+
+class LaneStats:
+    def __init__(self):
+        self.attempted = 0
+        self.deadlocks = 0
+        self.lock_waits = 0
+        self.connection_errors = 0
+        self.other_errors = 0
+        self.latencies = [] # Format: ms from journal append to commit
+        self.commit_latencies = [] # Format: ms spent in the database commit alone
+
+class Lane(threading.Thread):
+    def __init__(self, number, products, args, deadline, work_dir, run_id):
+        super().__init__(name=f"lane-{number}", daemon=True)
+        from journal import SaleJournal, JournalFlusher
+        from txid import TransactionIdGenerator
+        import dal
+        import rollups
+        import receipt_archive
+        import stock
+        from conn import CONFIG
+        self.stats = LaneStats()
+        self.products = products
+        self.args = args
+        self.deadline = deadline
+        self.rng = random.Random(args.seed + number)
+        self.lane = lane_id(number)
+        self.txid = TransactionIdGenerator(self.lane)
+        self.cashier = f"load-{run_id}-{self.lane}" # Lets the report count this run's rows in the database
+        self.journal = SaleJournal(os.path.join(work_dir, f"{self.lane}.journal"))
+        archive_receipts = receipt_archive.archiver(CONFIG)
+        def commit_sales(cursor, sales): # As main.commit_sales
+            rollups.apply(cursor, sales)
+            archive_receipts(cursor, sales)
+            stock.record_sales(cursor, sales)
+        self.flusher = JournalFlusher(self.journal, dal.connect, batch_size=args.batch_size, on_commit=commit_sales)
+
+    def next_id(self):
+        if self.args.id_scheme == "unix":
+            return str(int(time.time())) # The legacy scheme: one ID per second for every lane
+        return self.txid.next_id()
+
+    def sale(self):
+        now = datetime.now()
+        items = dict()
+        for _ in range(max(1, int(self.rng.gauss(self.args.basket_size, self.args.basket_size / 3)))):
+            product_name, ean13, price = self.rng.choice(self.products)
+            quantity = items[ean13][1] + 1 if ean13 in items else 1
+            items[ean13] = (product_name, quantity, price, ean13)
+        total = round(sum(quantity * price for name, quantity, price, ean13 in items.values()), 2)
+        return {
+            "transaction_id": self.next_id(),
+            "transaction_date": now.strftime("%Y-%m-%d"),
+            "transaction_time": now.strftime("%H:%M:%S"),
+            "total_amount": total,
+            "cashier_username": self.cashier,
+            "cashier_name": self.cashier,
+            "amount_paid": total,
+            "items": list(items.values())
+        }
+
+    def flush(self, started):
+        from mysql.connector import errors
+        while time.monotonic() < self.deadline + 30: # Let the last sales drain after the run ends
+            commit_started = time.perf_counter()
+            try:
+                self.journal.sync()
+                while self.flusher.flush_batch():
+                    pass
+            except errors.Error as e:
+                self.flusher._disconnect()
+                if e.errno == DEADLOCK:
+                    self.stats.deadlocks += 1
+                elif e.errno == LOCK_WAIT_TIMEOUT:
+                    self.stats.lock_waits += 1
+                elif isinstance(e, (errors.OperationalError, errors.InterfaceError, errors.PoolError)):
+                    self.stats.connection_errors += 1
+                else:
+                    self.stats.other_errors += 1
+                time.sleep(self.rng.uniform(0.01, 0.1)) # The sale is still journaled; retry as the flusher would
+                continue
+            self.stats.commit_latencies.append((time.perf_counter() - commit_started) * 1000)
+            for start in started:
+                self.stats.latencies.append((time.perf_counter() - start) * 1000)
+            return True
+        return False
+
+    def run(self):
+        pending = []
+        try:
+            while time.monotonic() < self.deadline:
+                if self.args.rate > 0:
+                    time.sleep(self.rng.expovariate(self.args.rate)) # Poisson arrivals
+                    if time.monotonic() >= self.deadline:
+                        break
+                pending.append(time.perf_counter())
+                self.journal.append(self.sale())
+                self.stats.attempted += 1
+                if len(pending) >= self.args.batch_size:
+                    self.flush(pending)
+                    pending = []
+            if pending:
+                self.flush(pending)
+        finally:
+            self.flusher._disconnect()
+            self.journal.close()
+
+def load_products(dal, standin, count):
+    products = dal.fetchall("SELECT product_name, ean13, price FROM products LIMIT %s", (count,))
+    if not products:
+        cnx = dal.connect()
+        standin.seed_products(cnx, count)
+        cnx.close()
+        products = dal.fetchall("SELECT product_name, ean13, price FROM products LIMIT %s", (count,))
+    return [(product_name, ean13, float(price)) for product_name, ean13, price in products]
+
+def count_rejected(work_dir):
+    rejected = 0
+    for name in os.listdir(work_dir):
+        if name.endswith(".rejected"):
+            with open(os.path.join(work_dir, name)) as rejected_file:
+                rejected += sum(1 for _ in rejected_file)
+    return rejected
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Simulate concurrent lanes checking out against a local database")
+    parser.add_argument("--lanes", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--rate", type=float, default=1.0, help="Sales per second per lane (Poisson); 0 = as fast as possible")
+    parser.add_argument("--basket-size", type=int, default=12, help="Mean items per sale")
+    parser.add_argument("--batch-size", type=int, default=1, help="Sales per commit, like journal_batch_size when a lane is catching up")
+    parser.add_argument("--products", type=int, default=5000, help="Products to draw baskets from (seeded if the table is empty)")
+    parser.add_argument("--id-scheme", choices=("txid", "unix"), default="txid")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default="mysql")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    os.chdir(ROOT) # conn.py reads config.json from the working directory
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import standin
+    work_dir = tempfile.mkdtemp(prefix="load_generator_")
+    if args.backend == "sqlite":
+        standin.install(os.path.join(work_dir, "load.sqlite"))
+    import dal
+
+    products = load_products(dal, standin, args.products)
+    print(f"{args.lanes} lanes, {args.duration:.0f}s, rate {args.rate or 'unbounded'}/s per lane, {len(products)} products, {args.id_scheme} IDs", flush=True)
+    run_id = f"{int(time.time()) % 100000:05d}"
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    lanes = [Lane(number, products, args, deadline, work_dir, run_id) for number in range(args.lanes)]
+    for lane in lanes:
+        lane.start()
+    for lane in lanes:
+        lane.join()
+    elapsed = time.perf_counter() - started
+
+    total = LaneStats()
+    for lane in lanes:
+        for field in ("attempted", "deadlocks", "lock_waits", "connection_errors", "other_errors"):
+            setattr(total, field, getattr(total, field) + getattr(lane.stats, field))
+        total.latencies.extend(lane.stats.latencies)
+        total.commit_latencies.extend(lane.stats.commit_latencies)
+    # Inserted rows are counted in the database: a sale whose ID already existed is silently
+    # skipped by the idempotent header insert, so the difference is the lost sales
+    committed = dal.fetchone("SELECT COUNT(*) FROM transactions WHERE cashier_username LIKE %s", (f"load-{run_id}-%",))[0]
+    rejected = count_rejected(work_dir)
+    duplicates = max(0, total.attempted - committed - rejected)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "elapsed_s": round(elapsed, 2),
+        "attempted": total.attempted,
+        "committed": committed,
+        "sales_per_second": round(committed / elapsed, 2),
+        "checkout_latency_ms": percentiles(total.latencies),
+        "commit_latency_ms": percentiles(total.commit_latencies),
+        "failed_inserts": {"duplicate_ids": duplicates, "rejected": rejected},
+        "deadlocks": total.deadlocks,
+        "lock_wait_timeouts": total.lock_waits,
+        "connection_errors": total.connection_errors,
+        "other_errors": total.other_errors
+    }
+    latency = report["checkout_latency_ms"]
+    print(f"{committed} of {total.attempted} sales committed in {elapsed:.1f}s: {report['sales_per_second']} sales/s")
+    if latency["count"]:
+        print(f"checkout latency p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  p99 {latency['p99']:.1f}ms  max {latency['max']:.1f}ms")
+    print(f"failed inserts: {duplicates} duplicate IDs, {rejected} rejected")
+    print(f"deadlocks: {total.deadlocks}, lock wait timeouts: {total.lock_waits}, connection errors: {total.connection_errors}, other errors: {total.other_errors}")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
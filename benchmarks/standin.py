@@ -0,0 +1,219 @@
+import re
+import random
+import sqlite3
+from datetime import date, datetime
+import mysql.connector
+from mysql.connector import errors
+
+# SQLite stand-in for MySQL, so the benchmarks run on a laptop without a database server.
+#
+# `install(path)` routes `mysql.connector.connect` (and so `dal`) to a SQLite file. Connections
+# mimic the parts of the mysql-connector API the app uses, and the MySQL-only SQL it issues is
+# translated on the fly:
+#     %s placeholders                            -> ?
+#     ON DUPLICATE KEY UPDATE c = VALUES(c)      -> ON CONFLICT DO UPDATE SET c = excluded.c
+#     ON DUPLICATE KEY UPDATE id = id (no-op)    -> ON CONFLICT DO NOTHING
+#     NOW()                                      -> CURRENT_TIMESTAMP
+#     HOUR(c)                                    -> CAST(strftime('%H', c) AS INTEGER)
+#     FOR UPDATE [SKIP LOCKED]                   -> dropped (SQLite locks the whole database instead)
+#     DROP TEMPORARY TABLE                       -> DROP TABLE
+#     SET SESSION ...                            -> ignored
+# SQLite errors are raised as the matching mysql.connector errors, so callers handle them as usual.
+#
+# Numbers measured on the stand-in show relative changes in the app. They say nothing about MySQL
+# itself; run with `--backend mysql` against a scratch database for that.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT NOT NULL, pword TEXT NOT NULL, clearance INTEGER NOT NULL, full_name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS products (id INTEGER PRIMARY KEY, product_name TEXT NOT NULL, ean13 TEXT NOT NULL UNIQUE, price REAL NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, stock INTEGER NOT NULL DEFAULT 0, reorder_level INTEGER NOT NULL DEFAULT 0,
+    stock_headroom INTEGER GENERATED ALWAYS AS (stock - reorder_level) VIRTUAL);
+CREATE INDEX IF NOT EXISTS products_updated_at ON products (updated_at);
+CREATE INDEX IF NOT EXISTS products_low_stock ON products (stock_headroom);
+CREATE TRIGGER IF NOT EXISTS products_touch AFTER UPDATE OF product_name, price ON products
+    BEGIN UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+CREATE TABLE IF NOT EXISTS transactions (transaction_id TEXT PRIMARY KEY, total_amount REAL, cashier_username TEXT NOT NULL,
+    transaction_date DATE, transaction_time TEXT);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (transaction_date, transaction_id);
+CREATE INDEX IF NOT EXISTS transactions_cashier_date ON transactions (cashier_username, transaction_date, transaction_id);
+CREATE TABLE IF NOT EXISTS transaction_items (item_id INTEGER PRIMARY KEY, transaction_id TEXT REFERENCES transactions (transaction_id),
+    item_name TEXT, quantity INTEGER, price_per_unit REAL, ean13 TEXT, transaction_date DATE);
+CREATE INDEX IF NOT EXISTS transaction_items_transaction_id ON transaction_items (transaction_id);
+CREATE TABLE IF NOT EXISTS sales_daily (sales_date DATE PRIMARY KEY, transaction_count INTEGER NOT NULL DEFAULT 0, item_count INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0, updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE IF NOT EXISTS sales_hourly (sales_date DATE NOT NULL, sales_hour INTEGER NOT NULL, transaction_count INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0, revenue REAL NOT NULL DEFAULT 0, PRIMARY KEY (sales_date, sales_hour));
+CREATE TABLE IF NOT EXISTS sales_by_cashier (sales_date DATE NOT NULL, cashier_username TEXT NOT NULL, transaction_count INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0, revenue REAL NOT NULL DEFAULT 0, PRIMARY KEY (sales_date, cashier_username));
+CREATE TABLE IF NOT EXISTS lane_metrics (lane TEXT PRIMARY KEY, payload TEXT NOT NULL, received_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE IF NOT EXISTS receipt_archive (transaction_id TEXT PRIMARY KEY, receipt_date DATE NOT NULL, snapshot BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS receipt_archive_date ON receipt_archive (receipt_date, transaction_id);
+CREATE TABLE IF NOT EXISTS sales_by_product (sales_date DATE NOT NULL, ean13 TEXT NOT NULL, item_name TEXT, quantity INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0, PRIMARY KEY (sales_date, ean13));
+CREATE TABLE IF NOT EXISTS stock_movements (movement_id INTEGER PRIMARY KEY AUTOINCREMENT, ean13 TEXT NOT NULL, quantity INTEGER NOT NULL, reason TEXT NOT NULL,
+    reference TEXT, created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP);
+CREATE INDEX IF NOT EXISTS stock_movements_pending ON stock_movements (ean13, quantity);
+"""
+
+UPSERT_PATTERN = re.compile(r"\s+ON DUPLICATE KEY UPDATE\s+(.*)$", re.IGNORECASE | re.DOTALL)
+NOOP_UPDATE_PATTERN = re.compile(r"^(\w+)\s*=\s*\1$")
+VALUES_PATTERN = re.compile(r"VALUES\((\w+)\)")
+HOUR_PATTERN = re.compile(r"HOUR\(([\w.]+)\)")
+LOCKING_READ_PATTERN = re.compile(r"\s+FOR UPDATE(\s+SKIP LOCKED)?\s*$", re.IGNORECASE)
+LOCK_WAIT_TIMEOUT = 1205 # MySQL error number for "Lock wait timeout exceeded"
+
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+_translated = dict() # Format: {mysql sql : sqlite sql}
+
+def translate(sql):
+    translated = _translated.get(sql)
+    if translated is None:
+        translated = sql.replace("%s", "?").replace("NOW()", "CURRENT_TIMESTAMP")
+        translated = HOUR_PATTERN.sub(r"CAST(strftime('%H', \1) AS INTEGER)", translated)
+        translated = LOCKING_READ_PATTERN.sub("", translated).replace("DROP TEMPORARY TABLE", "DROP TABLE")
+        match = UPSERT_PATTERN.search(translated)
+        if match:
+            assignments = match.group(1).strip()
+            if NOOP_UPDATE_PATTERN.match(assignments):
+                action = " ON CONFLICT DO NOTHING"
+            else:
+                action = " ON CONFLICT DO UPDATE SET " + VALUES_PATTERN.sub(r"excluded.\1", assignments)
+            translated = translated[:match.start()] + action
+        _translated[sql] = translated
+    return translated
+
+def _mysql_error(e):
+    if isinstance(e, sqlite3.IntegrityError):
+        return errors.IntegrityError(msg=str(e))
+    if isinstance(e, sqlite3.OperationalError) and "locked" in str(e):
+        return errors.DatabaseError(msg=str(e), errno=LOCK_WAIT_TIMEOUT)
+    return errors.ProgrammingError(msg=str(e))
+
+class StandinCursor:
+    def __init__(self, cnx):
+        self.cnx = cnx
+        self.cur = cnx.sqlite.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        if sql.lstrip()[:11].upper() == "SET SESSION":
+            return
+        self.cnx.begin_implicit()
+        try:
+            self.cur.execute(translate(sql), tuple(params))
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+        self.rowcount = self.cur.rowcount
+        self.lastrowid = self.cur.lastrowid
+
+    def executemany(self, sql, seq_params):
+        self.cnx.begin_implicit()
+        try:
+            self.cur.executemany(translate(sql), [tuple(params) for params in seq_params])
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+        self.rowcount = self.cur.rowcount
+
+    def fetchone(self):
+        return self.cur.fetchone()
+
+    def fetchmany(self, size=1):
+        return self.cur.fetchmany(size)
+
+    def fetchall(self):
+        return self.cur.fetchall()
+
+    def close(self):
+        self.cur.close()
+
+class StandinConnection:
+    def __init__(self, path, autocommit=False, **kwargs):
+        self.path = path
+        # isolation_level=None: transactions are opened explicitly, as MySQL does in non-autocommit mode
+        self.sqlite = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.sqlite.execute("PRAGMA journal_mode=WAL")
+        self.sqlite.execute("PRAGMA synchronous=NORMAL")
+        self.sqlite.execute("PRAGMA foreign_keys=ON")
+        self.autocommit = autocommit
+
+    @property
+    def in_transaction(self):
+        return self.sqlite.in_transaction
+
+    def begin_implicit(self):
+        if not self.autocommit and not self.sqlite.in_transaction:
+            self.sqlite.execute("BEGIN IMMEDIATE") # Take the write lock up front, as InnoDB row locks would
+
+    def start_transaction(self, isolation_level=None, **kwargs):
+        # SQLite transactions are serializable whatever level is asked for
+        if not self.sqlite.in_transaction:
+            self.sqlite.execute("BEGIN IMMEDIATE")
+
+    def cursor(self, prepared=False, buffered=None, **kwargs):
+        return StandinCursor(self)
+
+    def commit(self):
+        if self.sqlite.in_transaction:
+            self.sqlite.execute("COMMIT")
+
+    def rollback(self):
+        if self.sqlite.in_transaction:
+            self.sqlite.execute("ROLLBACK")
+
+    def is_connected(self):
+        return True
+
+    def reconnect(self, attempts=1, delay=0):
+        pass
+
+    def close(self):
+        self.sqlite.close()
+
+def install(path):
+    # Creates the schema in `path` and sends every new mysql.connector connection there
+    with sqlite3.connect(path) as cnx:
+        cnx.executescript(SCHEMA)
+    mysql.connector.connect = lambda **kwargs: StandinConnection(path, autocommit=kwargs.get('autocommit', False))
+
+# Synthetic catalogs, shared by the benchmarks
+
+WORDS = ("milk", "bread", "butter", "cheese", "yogurt", "apple", "banana", "orange", "juice", "coffee", "tea", "sugar",
+    "salt", "pepper", "rice", "noodle", "chicken", "beef", "fish", "soap", "shampoo", "tissue", "water", "soda",
+    "chips", "biscuit", "chocolate", "candy", "egg", "flour", "oil", "sauce", "cereal", "honey", "jam", "detergent")
+BRANDS = ("Nestle", "Dutch Lady", "Gardenia", "Maggi", "Milo", "Ayamas", "Adabi", "Julie's", "Munchys", "BOH", "Lipton", "Massimo")
+UNITS = ("g", "kg", "ml", "L", "pcs")
+
+def ean13(number, prefix="20"):
+    # In-store EAN-13 (prefix 20-29) with a valid check digit
+    body = f"{prefix}{number:010d}"
+    check = (10 - sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(body)) % 10) % 10
+    return body + str(check)
+
+def synthetic_products(count, seed=1, start=0):
+    rng = random.Random(seed)
+    for number in range(start, start + count):
+        name = f"{rng.choice(BRANDS)} {rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 999)}{rng.choice(UNITS)}"
+        yield (name, ean13(number), round(rng.uniform(0.5, 120), 2))
+
+def seed_products(cnx, count, seed=1, start=0, batch_size=5000):
+    # Works on MySQL and on the stand-in; returns the list of EAN-13s written
+    cur = cnx.cursor()
+    eans = []
+    batch = []
+    for product in synthetic_products(count, seed, start):
+        batch.append(product)
+        eans.append(product[1])
+        if len(batch) >= batch_size:
+            cur.executemany("INSERT INTO products (product_name, ean13, price) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE product_name = VALUES(product_name), price = VALUES(price)", batch)
+            cnx.commit()
+            batch = []
+    if batch:
+        cur.executemany("INSERT INTO products (product_name, ean13, price) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE product_name = VALUES(product_name), price = VALUES(price)", batch)
+        cnx.commit()
+    cur.close()
+    return eans
@@ -0,0 +1,161 @@
+import time
+import hashlib
+import threading
+import functools
+from datetime import datetime, timezone
+from collections import OrderedDict
+from flask import request, make_response
+
+# Response cache for the admin server.
+#
+# - Rendered responses are kept in memory per URL for `ttl` seconds.
+# - Every entry records the data version it was rendered from. Sales are recorded by the lanes, in
+#   other processes, so the version comes from a cheap probe of `sales_daily`,
+#   `products.updated_at`, `stock_movements` and `lane_metrics`. The probe runs at most once per `probe_interval` however many requests
+#   arrive, and a changed version makes the affected pages render again on their next request.
+# - `invalidate(scope)` drops a scope straight away, for changes made by the admin server itself.
+# - Responses carry an ETag and Last-Modified, so a browser revalidating an unchanged page gets
+#   a 304 without a body.
+# - Concurrent misses on one URL render once; the other requests wait for that result.
+#
+# Ten managers on the dashboard therefore cost one probe every `probe_interval` seconds plus one
+# render per actual change.
+
+VERSION_QUERY = """SELECT
+    (SELECT MAX(updated_at) FROM sales_daily),
+    (SELECT SUM(transaction_count) FROM sales_daily),
+    (SELECT MAX(updated_at) FROM products),
+    (SELECT MAX(movement_id) FROM stock_movements),
+    (SELECT MAX(received_at) FROM lane_metrics)"""
+
+def probe_versions(db):
+    # `updated_at` only has one second resolution, so the sales version also includes the sale count.
+    # Every stock change is a new movement (see stock.py); compaction leaves the levels as they were.
+    sales_updated, sales_count, products_updated, last_movement, metrics_received = db.fetchone(VERSION_QUERY) or (None,) * 5
+    return {"sales": (sales_updated, sales_count), "products": products_updated, "stock": last_movement, "metrics": metrics_received}
+
+class CachedResponse:
+    __slots__ = ("body", "status", "mimetype", "etag", "last_modified", "version", "expires")
+
+    def __init__(self, body, status, mimetype, etag, last_modified, version, expires):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.version = version
+        self.expires = expires
+
+class ResponseCache:
+    def __init__(self, probe=None, ttl=30, probe_interval=2, max_entries=256):
+        self.probe = probe # Callable returning {scope : version}, or None to rely on TTL and invalidate()
+        self.ttl = ttl
+        self.probe_interval = probe_interval
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # Format: {key : CachedResponse}, least recently used first
+        self.probed = dict() # Format: {scope : version} from the last probe
+        self.probed_at = 0.0
+        self.generations = dict() # Format: {scope : number of explicit invalidations}
+        self.key_locks = dict() # Format: {key : [lock held while that key renders, requests holding or waiting for it]}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.probe_lock = threading.Lock()
+
+    def _refresh_versions(self):
+        if self.probe is None or time.monotonic() - self.probed_at < self.probe_interval:
+            return
+        with self.probe_lock: # Requests arriving during a probe use the previous result
+            if time.monotonic() - self.probed_at < self.probe_interval:
+                return
+            try:
+                self.probed = self.probe()
+            except Exception as e:
+                print(f"Cache version probe failed, serving cached pages until their TTL: {e}")
+            self.probed_at = time.monotonic()
+
+    def version(self, scopes):
+        self._refresh_versions()
+        return tuple((scope, self.probed.get(scope), self.generations.get(scope, 0)) for scope in scopes)
+
+    def invalidate(self, *scopes):
+        with self.lock:
+            for scope in scopes:
+                self.generations[scope] = self.generations.get(scope, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.version != version or entry.expires <= time.monotonic():
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _render(self, key, version, ttl, view, args, kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response, None
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self.lock:
+            previous = self.entries.get(key)
+        # Identical output keeps its original Last-Modified, so If-Modified-Since still matches
+        last_modified = previous.last_modified if previous is not None and previous.etag == etag else now
+        entry = CachedResponse(body, response.status_code, response.mimetype, etag, last_modified, version, time.monotonic() + ttl)
+        self._put(key, entry)
+        return response, entry
+
+    def _respond(self, entry):
+        response = make_response(entry.body, entry.status)
+        response.mimetype = entry.mimetype
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        response.headers['Cache-Control'] = 'no-cache' # Browsers may keep the page but must revalidate it
+        return response.make_conditional(request)
+
+    def cached(self, *scopes, ttl=None):
+        # Decorator for GET views. `scopes` name the data the page depends on ("sales", "products", "stock", "metrics").
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+                key = request.full_path
+                version = self.version(scopes)
+                entry = self._get(key, version)
+                if entry is None:
+                    with self.lock:
+                        key_lock = self.key_locks.setdefault(key, [threading.Lock(), 0])
+                        key_lock[1] += 1
+                    try:
+                        with key_lock[0]:
+                            entry = self._get(key, version) # Rendered by another request while this one waited
+                            if entry is None:
+                                self.misses += 1
+                                response, entry = self._render(key, version, self.ttl if ttl is None else ttl, view, args, kwargs)
+                                if entry is None:
+                                    return response
+                                return self._respond(entry)
+                    finally:
+                        # The lock goes only with its last waiter; a request arriving meanwhile
+                        # would otherwise get a new lock and render alongside the waiters
+                        with self.lock:
+                            key_lock[1] -= 1
+                            if not key_lock[1]:
+                                del self.key_locks[key]
+                self.hits += 1
+                return self._respond(entry)
+            return wrapper
+        return decorator
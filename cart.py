@@ -0,0 +1,113 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+# Cart data structure behind the cashier's cart table.
+# Lines are kept in scan order in `lines`, with `rows` mapping EAN-13 -> row number, so a scan
+# finds its line in O(1) and updates exactly one row with a single dataChanged.
+# Only removing a line entirely (quantity down to 0) shifts the rows after it.
+
+class CartLine:
+    __slots__ = ('ean13', 'name', 'price', 'quantity')
+
+    def __init__(self, ean13, name, price, quantity=0):
+        self.ean13 = ean13
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    @property
+    def total(self):
+        return self.price * self.quantity
+
+class CartModel(QAbstractTableModel):
+    HEADERS = ["Product Name", "Quantity", "Price (RM)"]
+    NAME, QUANTITY, PRICE = range(3)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.lines = []
+        self.rows = dict() # Format: {ean13 : row}
+        self.total = 0.0
+        self.item_count = 0
+
+    # Qt model interface
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            line = self.lines[index.row()]
+            column = index.column()
+            if column == self.NAME:
+                return line.name
+            if column == self.QUANTITY:
+                return str(line.quantity)
+            return f"{line.total:.2f}"
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    # Cart operations
+    def line(self, ean13):
+        row = self.rows.get(ean13)
+        return None if row is None else self.lines[row]
+
+    def add(self, ean13, name, price):
+        row = self.rows.get(ean13)
+        if row is None:
+            row = len(self.lines)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.lines.append(CartLine(ean13, name, price, 1))
+            self.rows[ean13] = row
+            self.endInsertRows()
+        else:
+            self.lines[row].quantity += 1
+            self.dataChanged.emit(self.index(row, self.QUANTITY), self.index(row, self.PRICE))
+        self.total += price
+        self.item_count += 1
+        return self.lines[row]
+
+    def remove(self, ean13):
+        row = self.rows.get(ean13)
+        if row is None:
+            return None
+        line = self.lines[row]
+        line.quantity -= 1
+        self.total -= line.price
+        self.item_count -= 1
+        if line.quantity > 0:
+            self.dataChanged.emit(self.index(row, self.QUANTITY), self.index(row, self.PRICE))
+        else:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.lines[row]
+            del self.rows[ean13]
+            for later_row in range(row, len(self.lines)):
+                self.rows[self.lines[later_row].ean13] = later_row
+            self.endRemoveRows()
+        if not self.lines:
+            self.total = 0.0 # Drop accumulated float error once the cart is empty
+        return line
+
+    def clear(self):
+        self.beginResetModel()
+        self.lines = []
+        self.rows.clear()
+        self.total = 0.0
+        self.item_count = 0
+        self.endResetModel()
+
+    def snapshot(self):
+        # Format: list of (item_name, quantity, price_per_unit, ean13)
+        return [(line.name, line.quantity, line.price, line.ean13) for line in self.lines]
+
+    def __len__(self):
+        return len(self.lines)
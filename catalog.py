@@ -0,0 +1,113 @@
+import time
+import threading
+from datetime import datetime
+
+# In-process product catalog keyed by EAN-13.
+# The whole `products` table is loaded once at login, then kept fresh with delta refreshes
+# that only pull rows whose `updated_at` moved past the last seen watermark.
+#
+# Cache miss policy: the lookup falls through to the database with a single-row query and
+# the result (if any) is inserted into the cache. Unknown barcodes are not cached so a
+# product added mid-shift shows up on the next scan.
+#
+# `db` is anything exposing `fetchall(sql, params)` and `fetchone(sql, params, prepared)`, normally the `dal` module.
+#
+# Prices are kept as float, whether the column is FLOAT or DECIMAL (migrations/0002), so cart
+# totals and the journal's JSON never see a Decimal.
+#
+# A deleted row leaves no `updated_at` behind, so the delta refresh cannot see it. Every
+# `reconcile_interval` seconds a refresh also reads the key column alone (the `ean13` unique
+# index) and drops products no longer in the table.
+#
+# An optional `ProductSearchIndex` is kept in step with the catalog: rebuilt on `load`, updated
+# row by row on delta refreshes, cache-miss lookups and reconciliation.
+
+CATALOG_FULL_QUERY = "SELECT product_name, ean13, price, updated_at FROM products"
+CATALOG_DELTA_QUERY = "SELECT product_name, ean13, price, updated_at FROM products WHERE updated_at >= %s"
+CATALOG_ROW_QUERY = "SELECT product_name, ean13, price, updated_at FROM products WHERE ean13 = %s"
+CATALOG_KEYS_QUERY = "SELECT ean13 FROM products"
+
+class ProductCatalog:
+    def __init__(self, search_index=None, reconcile_interval=600):
+        self.products = dict() # Format: {ean13 : (product_name, ean13, price)}
+        self.search_index = search_index
+        self.watermark = None  # Highest `updated_at` seen so far
+        self.reconcile_interval = reconcile_interval
+        self.reconciled_at = 0.0 # time.monotonic() of the last full key read
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _store(self, rows):
+        with self.lock:
+            for product_name, ean13, price, updated_at in rows:
+                self.products[ean13] = (product_name, ean13, float(price))
+                if self.search_index is not None:
+                    self.search_index.add(self.products[ean13])
+                if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                    self.watermark = updated_at
+        return len(rows)
+
+    def load(self, db):
+        rows = db.fetchall(CATALOG_FULL_QUERY)
+        products = {ean13 : (product_name, ean13, float(price)) for product_name, ean13, price, updated_at in rows}
+        watermark = max((row[3] for row in rows if row[3] is not None), default=None)
+        with self.lock: # Swap in one step so scans never see a half-loaded catalog
+            self.products = products
+            self.watermark = watermark
+            self.reconciled_at = time.monotonic()
+        if self.search_index is not None:
+            self.search_index.rebuild(products.values())
+        self.loaded = True
+        return len(products)
+
+    def refresh(self, db):
+        if not self.loaded:
+            return self.load(db)
+        if self.reconcile_interval and time.monotonic() - self.reconciled_at >= self.reconcile_interval:
+            self.reconcile(db)
+        # `>=` rather than `>` because several rows can share the watermark second;
+        # re-reading those few rows is cheaper than missing one.
+        return self._store(db.fetchall(CATALOG_DELTA_QUERY, (self.watermark or datetime(1970, 1, 1),)))
+
+    def reconcile(self, db):
+        # Drops products deleted from the table; returns how many. Only keys cached before the read
+        # are candidates, so a product a lookup stores meanwhile is not dropped.
+        with self.lock:
+            cached = set(self.products)
+        removed = cached.difference(ean13 for (ean13,) in db.fetchall(CATALOG_KEYS_QUERY))
+        with self.lock:
+            for ean13 in removed:
+                self.products.pop(ean13, None)
+            self.reconciled_at = time.monotonic()
+        if self.search_index is not None:
+            for ean13 in removed:
+                self.search_index.remove(ean13)
+        return len(removed)
+
+    def get(self, ean13):
+        with self.lock:
+            item = self.products.get(ean13)
+        if item:
+            self.hits += 1
+        return item
+
+    def lookup(self, ean13, db):
+        item = self.get(ean13)
+        if item:
+            return item
+        self.misses += 1
+        row = db.fetchone(CATALOG_ROW_QUERY, (ean13,), prepared=True)
+        if not row:
+            return None
+        self._store([row])
+        return (row[0], row[1], float(row[2]))
+
+    def search(self, query, limit=10):
+        if self.search_index is None:
+            return []
+        return self.search_index.search(query, limit)
+
+    def __len__(self):
+        return len(self.products)
@@ -0,0 +1,386 @@
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+from array import array
+from decimal import Decimal
+from datetime import date, timedelta
+from collections import OrderedDict
+import numpy as np
+from migrate import month_start, add_months, month_bounds, partition_name
+
+# Cold storage for closed months of sales.
+#
+# `python cold_storage.py archive` moves every month older than `cold_storage_after_months`
+# (default 3) out of `transactions`/`transaction_items` into one file per month:
+#
+#     <cold_storage_path>/sales_YYYYMM.npz
+#
+# A file is a NumPy .npz archive, a zip holding one zlib-compressed array per column, so a reader
+# only decompresses the columns it asks for. Rows are in (transaction_date, transaction_id, item_id)
+# order. Strings that repeat (cashier, item name, EAN-13) are dictionary encoded: an int32 code
+# column plus a `<column>.dict` array of the distinct values. Money is in integer cents.
+#
+#     transactions.transaction_id      str
+#     transactions.transaction_date    datetime64[D]
+#     transactions.transaction_time    int32, seconds after midnight, -1 when unknown
+#     transactions.total_amount        int64, cents
+#     transactions.cashier_username    int32 -> transactions.cashier_username.dict
+#     items.item_id                    int64
+#     items.transaction                int32, row in transactions.*
+#     items.item_name                  int32 -> items.item_name.dict
+#     items.ean13                      int32 -> items.ean13.dict
+#     items.quantity                   int32
+#     items.price_per_unit             int64, cents
+#
+# Archiving a month reads it from MySQL, writes the file under a temporary name, reads it back
+# and checks counts and totals, renames it into place, then empties the month in the live tables:
+# TRUNCATE PARTITION for a monthly partition (migrations/0004), batched deletes for months still
+# in `p_past`. A month that has a file is served from the file only. Live rows left in it by an
+# interrupted run are ignored until `archive` runs again and folds them into the file.
+#
+# `ColdStorage.segments` splits a date range into archived months and live ranges; history.py and
+# exports.py read each part from where it is. Rollup tables keep their rows for archived months.
+#
+#     python cold_storage.py status
+#     python cold_storage.py archive [--before 2025-07-01]
+
+FILE_PATTERN = re.compile(r"^sales_(\d{4})(\d{2})\.npz$")
+DICTIONARY_COLUMNS = ("transactions.cashier_username", "items.item_name", "items.ean13")
+UNKNOWN_TIME = -1
+ARCHIVE_LOCK = "cold_storage"
+
+def cents(value):
+    return int(round((value or 0) * 100))
+
+def money(value):
+    return Decimal(int(value)).scaleb(-2)
+
+def seconds(value):
+    # MySQL TIME arrives as a timedelta; journal records and the benchmark stand-in use "HH:MM:SS"
+    if value is None:
+        return UNKNOWN_TIME
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    hours, minutes, secs = str(value).split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(float(secs))
+
+def time_of_day(value):
+    return None if value == UNKNOWN_TIME else timedelta(seconds=int(value))
+
+def last_day(month):
+    return add_months(month, 1) - timedelta(days=1)
+
+class ColdStorage:
+    def __init__(self, path, cache_size=64):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache = OrderedDict() # Format: {(file path, mtime, column) : np.ndarray}, least recently used first
+        self.lock = threading.Lock()
+
+    def month_path(self, month):
+        return os.path.join(self.path, f"sales_{month:%Y%m}.npz")
+
+    def months(self):
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        months = []
+        for name in names:
+            match = FILE_PATTERN.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    def column(self, month, name):
+        # Decompresses one column of one month; files only change when `archive` rewrites them,
+        # so a column is cached until its file's mtime changes
+        path = self.month_path(month)
+        key = (path, os.stat(path).st_mtime_ns, name)
+        with self.lock:
+            values = self.cache.get(key)
+            if values is not None:
+                self.cache.move_to_end(key)
+                return values
+        with np.load(path, allow_pickle=False) as archive:
+            values = archive[name]
+        with self.lock:
+            self.cache[key] = values
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return values
+
+    def strings(self, month, name, rows=None):
+        codes = self.column(month, name)
+        return self.column(month, name + ".dict")[codes if rows is None else codes[rows]]
+
+    def equals(self, month, name, value):
+        # Row mask for a dictionary encoded column, compared on the codes
+        matches = np.flatnonzero(self.column(month, name + ".dict") == value)
+        codes = self.column(month, name)
+        return codes == matches[0] if matches.size else np.zeros(codes.shape, dtype=bool)
+
+    def segments(self, date_from, date_to):
+        # [(month or None, first day, last day)] covering date_from..date_to in order: `month` for
+        # an archived month, None for a range of the live tables
+        archived = set(self.months())
+        segments = []
+        for start, end in month_bounds(date_from, date_to + timedelta(days=1)):
+            first, last = max(start, date_from), min(end - timedelta(days=1), date_to)
+            if start in archived:
+                segments.append((start, first, last))
+            elif segments and segments[-1][0] is None:
+                segments[-1] = (None, segments[-1][1], last)
+            else:
+                segments.append((None, first, last))
+        return segments
+
+    def transaction_mask(self, month, date_from, date_to, cashier=None):
+        dates = self.column(month, "transactions.transaction_date")
+        mask = (dates >= np.datetime64(date_from)) & (dates <= np.datetime64(date_to))
+        if cashier:
+            mask &= self.equals(month, "transactions.cashier_username", cashier)
+        return mask
+
+    # Reads shaped like the live queries in history.py and exports.py
+
+    def transactions(self, month, date_from, date_to, cashier=None, before=None, limit=None):
+        # (transaction_id, transaction_date, transaction_time, total_amount, cashier_username), newest first
+        mask = self.transaction_mask(month, date_from, date_to, cashier)
+        dates = self.column(month, "transactions.transaction_date")
+        ids = self.column(month, "transactions.transaction_id")
+        if before:
+            before_date = np.datetime64(before[0])
+            mask &= (dates < before_date) | ((dates == before_date) & (ids < before[1]))
+        rows = np.flatnonzero(mask)[::-1][:limit]
+        times = self.column(month, "transactions.transaction_time")[rows]
+        totals = self.column(month, "transactions.total_amount")[rows]
+        cashiers = self.strings(month, "transactions.cashier_username", rows)
+        return [(str(transaction_id), transaction_date, time_of_day(transaction_time), money(total_amount), str(cashier_username))
+            for transaction_id, transaction_date, transaction_time, total_amount, cashier_username
+            in zip(ids[rows].tolist(), dates[rows].tolist(), times.tolist(), totals.tolist(), cashiers.tolist())]
+
+    def items(self, month, transaction_id):
+        # (item_name, quantity, price_per_unit, ean13) in scan order
+        matches = np.flatnonzero(self.column(month, "transactions.transaction_id") == transaction_id)
+        if not matches.size:
+            return []
+        rows = np.flatnonzero(self.column(month, "items.transaction") == matches[0])
+        return list(zip(self.strings(month, "items.item_name", rows).tolist(), self.column(month, "items.quantity")[rows].tolist(),
+            [money(price) for price in self.column(month, "items.price_per_unit")[rows].tolist()], self.strings(month, "items.ean13", rows).tolist()))
+
+    def export_rows(self, month, date_from, date_to, cashier=None, batch_size=10000):
+        # Rows in exports.COLUMNS order, oldest first, converted a batch at a time
+        transaction_rows = self.column(month, "items.transaction")
+        rows = np.flatnonzero(self.transaction_mask(month, date_from, date_to, cashier)[transaction_rows])
+        for start in range(0, rows.size, batch_size):
+            batch = rows[start:start + batch_size]
+            parents = transaction_rows[batch]
+            yield from zip(
+                self.column(month, "transactions.transaction_id")[parents].tolist(),
+                self.column(month, "transactions.transaction_date")[parents].tolist(),
+                [time_of_day(value) for value in self.column(month, "transactions.transaction_time")[parents].tolist()],
+                self.strings(month, "transactions.cashier_username", parents).tolist(),
+                [money(value) for value in self.column(month, "transactions.total_amount")[parents].tolist()],
+                self.strings(month, "items.item_name", batch).tolist(),
+                self.strings(month, "items.ean13", batch).tolist(),
+                self.column(month, "items.quantity")[batch].tolist(),
+                [money(value) for value in self.column(month, "items.price_per_unit")[batch].tolist()])
+
+    def read_month(self, month):
+        # The whole month decoded, in the shape `read_live_month` returns
+        with np.load(self.month_path(month), allow_pickle=False) as archive:
+            def strings(name):
+                return archive[name + ".dict"][archive[name]]
+            transaction_ids = archive["transactions.transaction_id"]
+            transactions = {
+                "transaction_id": transaction_ids,
+                "transaction_date": archive["transactions.transaction_date"],
+                "transaction_time": archive["transactions.transaction_time"],
+                "total_amount": archive["transactions.total_amount"],
+                "cashier_username": strings("transactions.cashier_username")
+            }
+            items = {
+                "item_id": archive["items.item_id"],
+                "transaction_id": transaction_ids[archive["items.transaction"]],
+                "item_name": strings("items.item_name"),
+                "ean13": strings("items.ean13"),
+                "quantity": archive["items.quantity"],
+                "price_per_unit": archive["items.price_per_unit"]
+            }
+        return transactions, items
+
+# Archiving
+
+def read_live_month(db, month, timeout_ms=None):
+    # One month of the live tables as column arrays: ({column : array}, {column : array}).
+    # A busy month streams for longer than the pool's statement timeout: the hint lifts it for these reads
+    period = (month, last_day(month))
+    hint = f"/*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */ " if timeout_ms else ""
+    transaction_ids, dates, cashiers = [], [], []
+    times, totals = array('i'), array('q')
+    for transaction_id, transaction_date, transaction_time, total_amount, cashier_username in db.stream(
+            f"""SELECT {hint}transaction_id, transaction_date, transaction_time, total_amount, cashier_username FROM transactions
+            WHERE transaction_date BETWEEN %s AND %s ORDER BY transaction_date, transaction_id""", period):
+        transaction_ids.append(transaction_id)
+        dates.append(transaction_date)
+        times.append(seconds(transaction_time))
+        totals.append(cents(total_amount))
+        cashiers.append(cashier_username)
+    item_transaction_ids, item_names, eans = [], [], []
+    item_ids, quantities, prices = array('q'), array('i'), array('q')
+    for item_id, transaction_id, item_name, ean13, quantity, price_per_unit in db.stream(
+            f"""SELECT {hint}item_id, transaction_id, item_name, ean13, quantity, price_per_unit FROM transaction_items
+            WHERE transaction_date BETWEEN %s AND %s ORDER BY transaction_date, transaction_id, item_id""", period):
+        item_ids.append(item_id)
+        item_transaction_ids.append(transaction_id or "")
+        item_names.append(item_name or "")
+        eans.append(ean13 or "")
+        quantities.append(quantity or 0)
+        prices.append(cents(price_per_unit))
+    transactions = {
+        "transaction_id": np.array(transaction_ids, dtype=str),
+        "transaction_date": np.array(dates, dtype="datetime64[D]"),
+        "transaction_time": np.frombuffer(times, dtype=np.int32),
+        "total_amount": np.frombuffer(totals, dtype=np.int64),
+        "cashier_username": np.array(cashiers, dtype=str)
+    }
+    items = {
+        "item_id": np.frombuffer(item_ids, dtype=np.int64),
+        "transaction_id": np.array(item_transaction_ids, dtype=str),
+        "item_name": np.array(item_names, dtype=str),
+        "ean13": np.array(eans, dtype=str),
+        "quantity": np.frombuffer(quantities, dtype=np.int32),
+        "price_per_unit": np.frombuffer(prices, dtype=np.int64)
+    }
+    return transactions, items
+
+def merge(archived, live):
+    # Folds live rows into an archived month; rows already in the file win
+    def combine(first, second, key):
+        combined = {name: np.concatenate([first[name], second[name]]) for name in first}
+        keep = np.unique(combined[key], return_index=True)[1]
+        return {name: values[np.sort(keep)] for name, values in combined.items()}
+    return combine(archived[0], live[0], "transaction_id"), combine(archived[1], live[1], "item_id")
+
+def encode(transactions, items):
+    # Sorts, joins items to their transaction row and dictionary encodes; returns {member : array}
+    # Raises ValueError for items whose transaction is not in the month
+    order = np.lexsort((transactions["transaction_id"], transactions["transaction_date"]))
+    transactions = {name: values[order] for name, values in transactions.items()}
+    sorter = np.argsort(transactions["transaction_id"])
+    positions = np.searchsorted(transactions["transaction_id"], items["transaction_id"], sorter=sorter)
+    positions = sorter[np.minimum(positions, max(sorter.size - 1, 0))] if sorter.size else np.zeros(0, dtype=np.int64)
+    if positions.size != items["transaction_id"].size or np.any(transactions["transaction_id"][positions] != items["transaction_id"]):
+        raise ValueError("line items without a transaction in the same month")
+    order = np.lexsort((items["item_id"], positions))
+    items = {name: values[order] for name, values in items.items()}
+    members = {f"transactions.{name}": values for name, values in transactions.items()}
+    members.update({f"items.{name}": values for name, values in items.items() if name != "transaction_id"})
+    members["items.transaction"] = positions[order].astype(np.int32)
+    for name in DICTIONARY_COLUMNS:
+        members[name + ".dict"], codes = np.unique(members[name], return_inverse=True)
+        members[name] = codes.astype(np.int32)
+    return members
+
+def write_month(path, members):
+    # Written under a temporary name and renamed, so readers never see half a file
+    temporary = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+    with open(temporary, 'wb') as archive_file:
+        np.savez_compressed(archive_file, **members)
+    with np.load(temporary, allow_pickle=False) as archive:
+        for name, values in members.items():
+            if not np.array_equal(archive[name], values):
+                os.remove(temporary)
+                raise ValueError(f"'{temporary}' does not read back as written ({name})")
+    os.replace(temporary, path)
+
+def purge_month(schema, month, expected):
+    # Empties an archived month of the live tables. `expected` is the (transactions, items) count
+    # that was archived; anything else means sales arrived meanwhile and nothing is deleted.
+    period = (month, last_day(month))
+    counts = (schema.scalar("SELECT COUNT(*) FROM transactions WHERE transaction_date BETWEEN %s AND %s", period),
+        schema.scalar("SELECT COUNT(*) FROM transaction_items WHERE transaction_date BETWEEN %s AND %s", period))
+    if tuple(counts) != tuple(expected):
+        raise ValueError(f"{month:%Y-%m} changed while it was being archived, run the archive again")
+    for table in ("transaction_items", "transactions"):
+        if partition_name(month) in dict(schema.partitions(table)):
+            schema.log(f"truncating {table} partition {partition_name(month)}")
+            schema.execute(f"ALTER TABLE `{table}` TRUNCATE PARTITION {partition_name(month)}")
+            continue
+        deleted = 0
+        while True:
+            rowcount = schema.execute(f"DELETE FROM `{table}` WHERE transaction_date BETWEEN %s AND %s LIMIT %s", (*period, schema.batch_size))
+            deleted += max(0, rowcount)
+            if rowcount < schema.batch_size:
+                break
+            if schema.pause:
+                time.sleep(schema.pause)
+        schema.log(f"deleted {deleted} rows of {table}")
+
+def archive_month(storage, db, schema, month, timeout_ms=None):
+    # Returns the (transactions, items) count now in the month's file
+    live = read_live_month(db, month, timeout_ms)
+    path = storage.month_path(month)
+    exists = os.path.exists(path)
+    if not live[0]["transaction_id"].size and not live[1]["item_id"].size:
+        return None
+    month_data = merge(storage.read_month(month), live) if exists else live
+    members = encode(*month_data)
+    os.makedirs(storage.path, exist_ok=True)
+    write_month(path, members)
+    schema.log(f"wrote {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    purge_month(schema, month, (live[0]["transaction_id"].size, live[1]["item_id"].size))
+    return members["transactions.transaction_id"].size, members["items.item_id"].size
+
+def archive_before(storage, db, schema, before, timeout_ms=None):
+    first_day = schema.scalar("SELECT MIN(transaction_date) FROM transactions WHERE transaction_date < %s", (before,))
+    if first_day is None:
+        print(f"No live sales before {before}")
+        return
+    for month, end in month_bounds(first_day, month_start(before)):
+        started = time.perf_counter()
+        counts = archive_month(storage, db, schema, month, timeout_ms)
+        if counts:
+            print(f"Archived {month:%Y-%m}: {counts[0]} sales, {counts[1]} line items in {time.perf_counter() - started:.1f}s", flush=True)
+
+def status(storage):
+    for month in storage.months():
+        path = storage.month_path(month)
+        transactions = storage.column(month, "transactions.transaction_id").size
+        items = storage.column(month, "items.item_id").size
+        revenue = money(storage.column(month, "transactions.total_amount").sum())
+        print(f"{month:%Y-%m}  {transactions:>9} sales  {items:>10} line items  {revenue:>14} revenue  {os.path.getsize(path) / 1048576:8.1f} MB")
+
+if __name__ == "__main__":
+    import dal
+    from migrate import Schema
+    from conn import CONFIG
+    parser = argparse.ArgumentParser(description="Move closed months of sales into compressed column files")
+    parser.add_argument("command", choices=["status", "archive"])
+    parser.add_argument("--before", type=date.fromisoformat, help="Archive months that end before this date (default: cold_storage_after_months ago)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per delete batch for months without their own partition")
+    parser.add_argument("--pause", type=float, default=0.05, help="Seconds to wait between delete batches")
+    args = parser.parse_args()
+
+    storage = ColdStorage(os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG.get('cold_storage_path', 'archive/sales')))
+    if args.command == "status":
+        status(storage)
+        sys.exit(0)
+    before = args.before or add_months(month_start(date.today()), -int(CONFIG.get('cold_storage_after_months', 3)))
+    cnx = dal.connect()
+    schema = Schema(cnx, batch_size=args.batch_size, pause=args.pause)
+    if not schema.scalar("SELECT GET_LOCK(%s, 0)", (ARCHIVE_LOCK,)):
+        print("Another archive run is in progress")
+        sys.exit(1)
+    try:
+        archive_before(storage, dal, schema, before, timeout_ms=CONFIG.get('cold_storage_timeout_ms', 3600000))
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        schema.scalar("SELECT RELEASE_LOCK(%s)", (ARCHIVE_LOCK,))
+        cnx.close()
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 from dotenv import load_dotenv, dotenv_values
 
@@ -7,6 +8,7 @@ try:
         CONFIG = json.load(config_file)
 except:
     print("Unable to open configuration file 'config.json'")
+    sys.exit(0)
 
 # USER CONNECTION TO DATABASE
 load_dotenv()
@@ -0,0 +1,256 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import errors
+from conn import CONFIG, r_host, r_username, r_password, r_database
+
+# Data access layer shared by the cashier lanes and the admin server.
+#
+# - A bounded pool of connections, handed out one per call. LIFO order keeps the busy
+#   connections warm and lets idle ones age out.
+# - Health check: a connection idle for longer than `db_health_check_interval` is pinged before
+#   use and reconnected if MySQL dropped it (wait_timeout), so idle lanes never need a restart.
+# - Hot read queries run through server-side prepared statements cached per connection.
+# - Reads that fail because the connection died are retried once on a fresh connection.
+# - With `db_statement_timeout_ms` set, MySQL aborts any SELECT on a pooled connection that runs
+#   longer, so one runaway query cannot hold a connection (and a server thread) indefinitely.
+#
+# Pooled connections run in autocommit mode; use `transaction()` for multi-statement writes.
+
+POOL_SIZE = int(CONFIG.get('db_pool_size', 5))
+POOL_TIMEOUT = float(CONFIG.get('db_pool_timeout', 10))
+HEALTH_CHECK_INTERVAL = float(CONFIG.get('db_health_check_interval', 30))
+STATEMENT_TIMEOUT_MS = int(CONFIG.get('db_statement_timeout_ms', 0))
+
+CONNECTION_LOST = (errors.OperationalError, errors.InterfaceError)
+
+def connect(autocommit=False):
+    # A dedicated connection outside the pool, for long-lived workers such as the journal flusher
+    return mysql.connector.connect(
+        host=r_host,
+        user=r_username,
+        password=r_password,
+        database=r_database,
+        autocommit=autocommit
+    )
+
+class PooledConnection:
+    def __init__(self, cnx):
+        self.cnx = cnx
+        self.last_used = time.monotonic()
+        self.statements = dict() # Format: {sql : prepared cursor}
+        self.setup()
+
+    def setup(self):
+        if STATEMENT_TIMEOUT_MS:
+            cur = self.cnx.cursor()
+            cur.execute("SET SESSION max_execution_time = %s", (STATEMENT_TIMEOUT_MS,))
+            cur.close()
+
+    def prepared(self, sql):
+        statement = self.statements.get(sql)
+        if statement is None:
+            statement = self.cnx.cursor(prepared=True)
+            self.statements[sql] = statement
+        return statement
+
+    def check(self):
+        if time.monotonic() - self.last_used < HEALTH_CHECK_INTERVAL:
+            return
+        if not self.cnx.is_connected():
+            self.cnx.reconnect(attempts=3, delay=1)
+            self.cnx.autocommit = True
+            self.statements.clear() # Prepared statements and session settings do not survive a reconnect
+            self.setup()
+
+    def close(self):
+        try:
+            self.cnx.close()
+        except errors.Error:
+            pass
+
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            pooled = self.idle.get_nowait()
+        except queue.Empty:
+            pooled = None
+            with self.lock:
+                if self.created < self.size:
+                    self.created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    pooled = PooledConnection(connect(autocommit=True))
+                except errors.Error:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            else:
+                try:
+                    pooled = self.idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise errors.PoolError(f"No database connection available after {self.timeout}s ({self.size} in use)")
+        try:
+            pooled.check()
+        except errors.Error:
+            self.discard(pooled)
+            raise
+        return pooled
+
+    def release(self, pooled):
+        pooled.last_used = time.monotonic()
+        self.idle.put(pooled)
+
+    def discard(self, pooled):
+        pooled.close()
+        with self.lock:
+            self.created -= 1
+
+    def close(self):
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    # One pool per process: a forked server worker must not share sockets with its parent
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool()
+                _pool_pid = os.getpid()
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+@contextmanager
+def pooled_connection():
+    pool = get_pool()
+    pooled = pool.acquire()
+    try:
+        yield pooled
+    except CONNECTION_LOST:
+        pool.discard(pooled)
+        raise
+    except Exception:
+        if pooled.cnx.in_transaction:
+            pooled.cnx.rollback()
+        pool.release(pooled)
+        raise
+    except BaseException: # e.g. GeneratorExit from an abandoned stream: state unknown, drop it
+        pool.discard(pooled)
+        raise
+    else:
+        pool.release(pooled)
+
+@contextmanager
+def connection():
+    with pooled_connection() as pooled:
+        yield pooled.cnx
+
+@contextmanager
+def cursor(**kwargs):
+    with pooled_connection() as pooled:
+        cur = pooled.cnx.cursor(**kwargs)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+@contextmanager
+def transaction(**kwargs):
+    with pooled_connection() as pooled:
+        pooled.cnx.start_transaction()
+        cur = pooled.cnx.cursor(**kwargs)
+        try:
+            yield cur
+            pooled.cnx.commit()
+        except Exception:
+            pooled.cnx.rollback()
+            raise
+        finally:
+            cur.close()
+
+def _read(sql, params, prepared):
+    for attempt in range(2):
+        try:
+            with pooled_connection() as pooled:
+                if prepared:
+                    cur = pooled.prepared(sql)
+                    cur.execute(sql, params)
+                    return cur.fetchall()
+                cur = pooled.cnx.cursor()
+                try:
+                    cur.execute(sql, params)
+                    return cur.fetchall()
+                finally:
+                    cur.close()
+        except CONNECTION_LOST:
+            if attempt:
+                raise
+
+def fetchall(sql, params=(), prepared=False):
+    return _read(sql, params, prepared)
+
+def fetchone(sql, params=(), prepared=False):
+    rows = _read(sql, params, prepared)
+    return rows[0] if rows else None
+
+def batches(sql, params=(), batch_size=1000):
+    # Yields lists of up to `batch_size` rows from an unbuffered cursor, so memory stays flat however
+    # large the result is. Holds one pooled connection until the generator is exhausted or closed;
+    # an abandoned stream still has rows on the wire, so its connection is dropped rather than drained.
+    pool = get_pool()
+    pooled = pool.acquire()
+    cur = pooled.cnx.cursor(buffered=False)
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    except BaseException:
+        pool.discard(pooled)
+        raise
+    else:
+        cur.close()
+        pool.release(pooled)
+
+def stream(sql, params=(), batch_size=1000):
+    # Yields rows one at a time, see `batches`
+    for rows in batches(sql, params, batch_size):
+        yield from rows
+
+def execute(sql, params=()):
+    with cursor() as cur:
+        cur.execute(sql, params)
+        return cur.rowcount
+
+def check():
+    # Raises if the database cannot be reached
+    return fetchone("SELECT 1")
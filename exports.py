@@ -0,0 +1,73 @@
+import io
+import csv
+import json
+import zlib
+import history
+
+# Streaming exports of transactions joined to their line items, one output row per line item.
+# Rows come off an unbuffered cursor (`dal.stream`) and are encoded in chunks as they arrive, so a
+# year-long export uses constant memory and the first bytes reach the client straight away.
+# With `cold` (a cold_storage.ColdStorage), archived months come from their files, in date order
+# with the live ranges around them.
+
+COLUMNS = ["transaction_id", "transaction_date", "transaction_time", "cashier_username", "total_amount", "item_name", "ean13", "quantity", "price_per_unit"]
+CHUNK_SIZE = 64 * 1024
+
+def rows(db, filters, timeout_ms=None, cold=None):
+    segments = cold.segments(filters.date_from, filters.date_to) if cold is not None else [(None, filters.date_from, filters.date_to)]
+    for month, date_from, date_to in segments:
+        if month is None:
+            yield from live_rows(db, history.Filters(date_from, date_to, filters.cashier), timeout_ms)
+        else:
+            yield from cold.export_rows(month, date_from, date_to, filters.cashier)
+
+def live_rows(db, filters, timeout_ms=None):
+    where, params = filters.where()
+    # The date range is repeated on `ti` so MySQL prunes the line item partitions too.
+    # Long exports are expected: the optimizer hint lifts the connection's statement timeout for this query
+    hint = f"/*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */ " if timeout_ms else ""
+    return db.stream(f"""SELECT {hint}t.transaction_id, t.transaction_date, t.transaction_time, t.cashier_username, t.total_amount,
+            ti.item_name, ti.ean13, ti.quantity, ti.price_per_unit
+        FROM transactions t JOIN transaction_items ti ON ti.transaction_id = t.transaction_id AND ti.transaction_date = t.transaction_date
+        WHERE {where} AND ti.transaction_date BETWEEN %s AND %s
+        ORDER BY t.transaction_date, t.transaction_id, ti.item_id""", (*params, filters.date_from, filters.date_to))
+
+def _value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value) # time columns arrive as timedelta, Decimal as Decimal
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow([_value(value) for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def jsonl_chunks(rows):
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(COLUMNS, (_value(value) for value in row))), separators=(',', ':')) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+            size = 0
+    yield ''.join(lines).encode('utf-8')
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31) # wbits=31 writes a gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,29 @@
+from conn import CONFIG
+
+# Gunicorn settings for the admin server, taken from config.json:
+#
+#     gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Each worker process imports the app itself (no preload), so MySQL sockets, the session sweeper
+# and the search catalog are never shared across a fork; `dal` opens a separate pool per process.
+
+bind = CONFIG.get('admin_bind', '127.0.0.1:5000')
+workers = int(CONFIG.get('admin_workers', 2))
+worker_class = 'gthread'
+threads = int(CONFIG.get('admin_threads', 4)) # Keep at or below db_pool_size, or threads queue for a connection
+timeout = int(CONFIG.get('admin_timeout', 120)) # A worker stuck for this long is killed and replaced
+graceful_timeout = int(CONFIG.get('admin_graceful_timeout', 30)) # On SIGTERM/SIGHUP in-flight requests get this long to finish
+keepalive = 5
+max_requests = 5000 # Recycle workers now and then so slow leaks cannot grow without bound
+max_requests_jitter = 500
+preload_app = False
+
+def on_starting(server):
+    if workers > 1 and CONFIG.get('session_backend', 'sqlite') == 'lru':
+        server.log.warning("session_backend 'lru' keeps sessions per worker; use 'sqlite' when running more than one worker")
+    if threads > int(CONFIG.get('db_pool_size', 5)):
+        server.log.warning(f"admin_threads ({threads}) is above db_pool_size; requests will wait for database connections")
+
+def worker_exit(server, worker):
+    import dal
+    dal.close_pool()
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+# Transaction history queries for the admin server.
+#
+# Pages use keyset (seek) pagination on (transaction_date, transaction_id), newest first. Each page
+# starts right after the last row of the previous one, so MySQL walks the
+# `transaction_date`/`cashier_date` indexes from that point instead of skipping OFFSET rows:
+# page N costs the same as page 1. Line items are fetched separately, one transaction at a time.
+# Both tables are partitioned by month on transaction_date (migrations/0004), so every query
+# names its dates.
+#
+# With `cold` (a cold_storage.ColdStorage), archived months are read from their files and the
+# rest from MySQL. Segments are walked newest first and each returns its rows in page order, so
+# the page is their concatenation.
+
+DEFAULT_DAYS = 30
+MAX_PAGE_SIZE = 200
+
+class Filters:
+    def __init__(self, date_from=None, date_to=None, cashier=None):
+        self.date_to = date_to or date.today()
+        self.date_from = date_from or self.date_to - timedelta(days=DEFAULT_DAYS)
+        self.cashier = cashier or None
+
+    @classmethod
+    def from_args(cls, args):
+        # Raises ValueError on malformed dates
+        return cls(
+            date.fromisoformat(args['date_from']) if args.get('date_from') else None,
+            date.fromisoformat(args['date_to']) if args.get('date_to') else None,
+            args.get('cashier', '').strip()
+        )
+
+    def where(self, alias="t"):
+        clauses = [f"{alias}.transaction_date BETWEEN %s AND %s"]
+        params = [self.date_from, self.date_to]
+        if self.cashier:
+            clauses.append(f"{alias}.cashier_username = %s")
+            params.append(self.cashier)
+        return " AND ".join(clauses), params
+
+def live_rows(db, filters, before, limit):
+    where, params = filters.where()
+    if before:
+        where += " AND (t.transaction_date < %s OR (t.transaction_date = %s AND t.transaction_id < %s))"
+        params += [before[0], before[0], before[1]]
+    return db.fetchall(f"""SELECT t.transaction_id, t.transaction_date, t.transaction_time, t.total_amount, t.cashier_username
+        FROM transactions t WHERE {where}
+        ORDER BY t.transaction_date DESC, t.transaction_id DESC LIMIT %s""", (*params, limit))
+
+def page(db, filters, before=None, limit=50, cold=None):
+    # `before` is the (transaction_date, transaction_id) of the last row already shown, or None
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    segments = cold.segments(filters.date_from, filters.date_to) if cold is not None else [(None, filters.date_from, filters.date_to)]
+    rows = []
+    for month, date_from, date_to in reversed(segments):
+        if before and date_from > before[0]:
+            continue
+        # One extra row tells whether another page exists without a COUNT(*)
+        wanted = limit + 1 - len(rows)
+        if month is None:
+            rows += live_rows(db, Filters(date_from, date_to, filters.cashier), before, wanted)
+        else:
+            rows += cold.transactions(month, date_from, date_to, filters.cashier, before, wanted)
+        if len(rows) > limit:
+            break
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    transactions = [{
+        "transaction_id": transaction_id,
+        "transaction_date": transaction_date.isoformat() if transaction_date else None,
+        "transaction_time": str(transaction_time) if transaction_time is not None else None,
+        "total_amount": float(total_amount or 0),
+        "cashier_username": cashier_username
+    } for transaction_id, transaction_date, transaction_time, total_amount, cashier_username in rows]
+    next_page = None
+    if has_more:
+        next_page = {"before_date": transactions[-1]["transaction_date"], "before_id": transactions[-1]["transaction_id"]}
+    return {"transactions": transactions, "next": next_page}
+
+def items(db, transaction_id, transaction_date=None, cold=None):
+    archived = cold.months() if cold is not None else []
+    if transaction_date and transaction_date.replace(day=1) in archived:
+        rows = cold.items(transaction_date.replace(day=1), transaction_id)
+    # With the date, MySQL reads one monthly partition instead of probing them all
+    elif transaction_date:
+        rows = db.fetchall("SELECT item_name, quantity, price_per_unit, ean13 FROM transaction_items WHERE transaction_id = %s AND transaction_date = %s ORDER BY item_id", (transaction_id, transaction_date), prepared=True)
+    else:
+        rows = db.fetchall("SELECT item_name, quantity, price_per_unit, ean13 FROM transaction_items WHERE transaction_id = %s ORDER BY item_id", (transaction_id,), prepared=True)
+        for month in reversed(archived):
+            if rows:
+                break
+            rows = cold.items(month, transaction_id)
+    return [{
+        "item_name": item_name,
+        "quantity": quantity,
+        "price_per_unit": float(price_per_unit or 0),
+        "ean13": ean13
+    } for item_name, quantity, price_per_unit, ean13 in rows]
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import threading
+import mysql.connector
+
+# Local append-only sale journal.
+# Every completed sale is written here first, one JSON record per line, so checkout only waits
+# for a local disk write. A background JournalFlusher drains the journal into MySQL in batches.
+#
+# Durability: every append is flushed to the OS straight away, so a crash of the lane process
+# never loses a sale. fsync is batched: it runs once `fsync_batch` records are pending or
+# `fsync_interval` seconds have passed, which bounds what a power cut can lose.
+#
+# The flusher's progress is a byte offset kept in '<journal>.ckpt'. Records past the offset are
+# still pending; records before it are in MySQL and are dropped when the journal is compacted.
+
+# Errors that mean the schema is not what this code expects (a migration not yet run, or running):
+# the sales are fine, so the batch is retried later instead of being rejected
+SCHEMA_ERRORS = (1054, 1146) # Unknown column, unknown table
+
+class SaleJournal:
+    def __init__(self, path, fsync_interval=0.05, fsync_batch=16, compact_size=1024 * 1024):
+        self.path = path
+        self.checkpoint_path = path + '.ckpt'
+        self.rejected_path = path + '.rejected'
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.compact_size = compact_size
+        self.lock = threading.Lock()
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'ab+')
+        self._repair()
+
+    def _repair(self):
+        # A crash in the middle of a write can leave a torn last line; cut it off so the next
+        # append does not get glued onto it.
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        if size == 0:
+            return
+        self.file.seek(max(0, size - 4096))
+        tail = self.file.read()
+        if tail.endswith(b'\n'):
+            return
+        cut = tail.rfind(b'\n')
+        new_size = size - len(tail) + cut + 1 if cut >= 0 else max(0, size - len(tail))
+        self.file.truncate(new_size)
+        os.fsync(self.file.fileno())
+
+    def append(self, sale):
+        line = json.dumps(sale, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            self.file.write(line)
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= self.fsync_batch or time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        if self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r') as checkpoint_file:
+                return int(checkpoint_file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, offset):
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            checkpoint_file.write(str(offset))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+    def pending(self, limit):
+        # Returns up to `limit` unflushed records as a list of (end_offset, record)
+        offset = self.read_checkpoint()
+        records = []
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            if offset > self.file.tell(): # Journal was compacted after the checkpoint was written
+                offset = 0
+            self.file.seek(offset)
+            while len(records) < limit:
+                line = self.file.readline()
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                records.append((offset, json.loads(line)))
+        return records
+
+    def pending_count(self):
+        with self.lock:
+            self.file.seek(self.read_checkpoint())
+            return sum(1 for line in self.file if line.endswith(b'\n'))
+
+    def reject(self, record, error):
+        with open(self.rejected_path, 'a') as rejected_file:
+            rejected_file.write(json.dumps({"error": str(error), "sale": record}) + '\n')
+
+    def compact(self):
+        # Drop the journal once everything in it has reached MySQL
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            size = self.file.tell()
+            if size < self.compact_size or self.read_checkpoint() != size:
+                return False
+            self.file.truncate(0)
+            os.fsync(self.file.fileno())
+            self.write_checkpoint(0)
+        return True
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            self.file.close()
+
+class JournalFlusher(threading.Thread):
+    def __init__(self, journal, connect, batch_size=50, interval=2.0, max_backoff=60.0, on_commit=None, after_commit=None):
+        super().__init__(name="journal-flusher", daemon=True)
+        self.journal = journal
+        self.connect = connect # Callable returning a new MySQL connection
+        self.on_commit = on_commit # Callable(cursor, sales) run inside the commit for newly inserted sales
+        self.after_commit = after_commit # Callable(sales) run once those sales are committed, for in-memory consumers
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.db = None
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.last_error = None
+
+    def wake(self):
+        self.wake_event.set()
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        backoff = self.interval
+        while True:
+            self.wake_event.wait(backoff)
+            self.wake_event.clear()
+            try:
+                self.journal.sync()
+                while self.flush_batch():
+                    pass
+                self.journal.compact()
+                backoff = self.interval
+                self.last_error = None
+            except (mysql.connector.Error, OSError) as e:
+                # Database unreachable: keep the sales in the journal and retry with exponential backoff
+                self.last_error = e
+                self._disconnect()
+                backoff = min(backoff * 2, self.max_backoff)
+                print(f"Unable to flush sale journal, retrying in {backoff:.0f}s")
+                print(e)
+            if self.stop_event.is_set():
+                break
+        self._disconnect()
+
+    def _disconnect(self):
+        if self.db is not None:
+            try:
+                self.db.close()
+            except mysql.connector.Error:
+                pass
+            self.db = None
+
+    def _connection(self):
+        if self.db is None or not self.db.is_connected():
+            self._disconnect()
+            self.db = self.connect()
+        return self.db
+
+    def flush_batch(self):
+        records = self.journal.pending(self.batch_size)
+        if not records:
+            return False
+        db = self._connection()
+        cursor = db.cursor()
+        try:
+            inserted = [sale for end_offset, sale in records if self.write_sale(cursor, sale)]
+            if self.on_commit:
+                self.on_commit(cursor, inserted)
+            db.commit()
+            if self.after_commit and inserted:
+                self.after_commit(inserted)
+        except (mysql.connector.errors.DataError, mysql.connector.errors.IntegrityError, mysql.connector.errors.ProgrammingError) as e:
+            db.rollback()
+            if e.errno in SCHEMA_ERRORS:
+                raise
+            # One bad record must not block the journal: retry the batch one sale at a time
+            # and set aside the ones MySQL refuses.
+            for end_offset, sale in records:
+                try:
+                    inserted = self.write_sale(cursor, sale)
+                    if inserted and self.on_commit:
+                        self.on_commit(cursor, [sale])
+                    db.commit()
+                    if inserted and self.after_commit:
+                        self.after_commit([sale])
+                except (mysql.connector.errors.DataError, mysql.connector.errors.IntegrityError, mysql.connector.errors.ProgrammingError) as e:
+                    db.rollback()
+                    if e.errno in SCHEMA_ERRORS:
+                        raise
+                    self.journal.reject(sale, e)
+        except mysql.connector.Error:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+        self.journal.write_checkpoint(records[-1][0])
+        return len(records) == self.batch_size
+
+    def write_sale(self, cursor, sale):
+        # Idempotent on transaction_id: a sale replayed after a crash is a no-op
+        cursor.execute("INSERT INTO transactions (transaction_id, transaction_date, transaction_time, total_amount, cashier_username) VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE transaction_id = transaction_id", (sale['transaction_id'], sale['transaction_date'], sale.get('transaction_time'), sale['total_amount'], sale['cashier_username']))
+        if cursor.rowcount != 1:
+            return False
+        # Line items carry the sale's date too: both tables are partitioned by month on it
+        item_array = [(item_name, quantity, price_per_unit, ean13, sale['transaction_id'], sale['transaction_date']) for item_name, quantity, price_per_unit, ean13 in sale['items']]
+        cursor.executemany("INSERT INTO transaction_items (item_name, quantity, price_per_unit, ean13, transaction_id, transaction_date) VALUES (%s, %s, %s, %s, %s, %s)", item_array)
+        return True
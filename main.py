@@ -1,51 +1,186 @@
+import time
+STARTUP_STARTED = time.perf_counter()
 import hashlib
-import mysql.connector
 import sys
 import os
-import json
+import threading
 from datetime import datetime, date
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QLineEdit, QTextEdit, QPushButton, QHBoxLayout, QVBoxLayout, QGridLayout, QMessageBox, QSpacerItem, QSizePolicy, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView 
-from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QPoint, pyqtSignal, QDateTime, QDate, QTime
-from PyQt6.QtGui import QColor, QPainter, QBrush, QFont, QPixmap, QShortcut, QKeySequence
+from collections import deque
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QLineEdit, QTextEdit, QPushButton, QHBoxLayout, QVBoxLayout, QGridLayout, QMessageBox, QSpacerItem, QSizePolicy, QTableView, QHeaderView, QAbstractItemView, QDialog, QListWidget, QListWidgetItem, QPlainTextEdit, QInputDialog 
+from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QPoint, pyqtSignal, QDateTime, QDate, QTime, QTimer
+from PyQt6.QtGui import QColor, QPainter, QBrush, QFont, QPixmap, QImage, QShortcut, QKeySequence
 from conn import *
+from catalog import ProductCatalog
+import rollups
+from workers import WorkerExecutor, LatencyTracker
+from txid import TransactionIdGenerator
+from cart import CartModel
+from receipt import ReceiptEngine
+import receipt_archive
+import stock
+from search import ProductSearchIndex
+import metrics
+import top_sellers
 
 APP_PATH = os.path.dirname(__file__)
 ASSET_FOLDER = os.path.join(APP_PATH, 'assets')
 
-# DATABASE CONNECTION 
+# STARTUP
+# The login window comes up before anything touches the database. The database layer (and the
+# MySQL driver it imports), the sale journal, the catalog and the login assets are prepared in the
+# background while the cashier types (see `prewarm`), and every phase is timed for the report.
 
-try:
-    db = mysql.connector.connect(
-        host=r_host,
-        user=r_username,
-        password=r_password,
-        database=r_database
-    )
-    cursor = db.cursor()
-except mysql.connector.errors.DatabaseError: 
-    print(f"Unable to connect to database '{r_database}' on host '{r_host}'")
-    sys.exit(0)
+class StartupPhases:
+    def __init__(self, started):
+        self.started = started
+        self.phases = dict() # Format: {phase : milliseconds}
+        self.failed = set()
+        self.reported = False
+        self.lock = threading.Lock()
+
+    def mark(self, phase, since=None, failed=False):
+        # Duration since `since`, or since launch when omitted; returns milliseconds
+        elapsed = (time.perf_counter() - (self.started if since is None else since)) * 1000
+        with self.lock:
+            self.phases[phase] = elapsed
+            if failed:
+                self.failed.add(phase)
+        return elapsed
+
+    def report(self, expected):
+        # Prints the phase timings once every phase in `expected` has finished
+        with self.lock:
+            if self.reported or not set(expected) <= set(self.phases):
+                return
+            self.reported = True
+            parts = [f"{phase} {'failed after ' if phase in self.failed else ''}{elapsed:.0f}ms" for phase, elapsed in self.phases.items()]
+        print("Startup: " + ", ".join(parts))
+
+startup = StartupPhases(STARTUP_STARTED)
+startup.mark("imports")
+STARTUP_REPORT_PHASES = ("imports", "login_window", "backend", "database", "catalog", "assets")
 
 def hash_password(pword):
     hash_object = hashlib.sha256(pword.encode('utf-8'))
     return hash_object.hexdigest()
 
-#CONFIG FILE 
+# TRANSACTION IDS
 
 try:
-    with open('config.json', 'r') as config_file:
-        CONFIG = json.load(config_file)
-except:
-    print(f"Unable to parse configuration file 'config.json'")
+    txid_generator = TransactionIdGenerator(CONFIG['appinfo']['serial_id'])
+except ValueError as e:
+    print(e)
     sys.exit(0)
 
+# Database queries run on these worker threads, never on the GUI thread. Each query takes its own pooled connection.
+db_executor = WorkerExecutor(max_threads=CONFIG.get('db_worker_threads', 2))
+
+# Product catalog cache, shared by every login on this lane: warmed at startup, then refreshed with deltas.
+# The search index behind "Find item" is kept in step with it.
+catalog = ProductCatalog(search_index=ProductSearchIndex(), reconcile_interval=CONFIG.get('catalog_reconcile_interval', 600))
+catalog_load_lock = threading.Lock()
+
+# SALE JOURNAL AND DATABASE
+# `dal` and `journal` import mysql.connector, the slowest import of the lane, so they are loaded on
+# first use by `load_backend` rather than before the login window can show.
+
+dal = None
+journal = None
+flusher = None
+backend_lock = threading.Lock()
+
+archive_receipts = receipt_archive.archiver(CONFIG)
+
+def commit_sales(cursor, sales):
+    # Runs inside the flusher's commit: rollups, receipt snapshots and stock movements land with the sales themselves
+    rollups.apply(cursor, sales)
+    archive_receipts(cursor, sales)
+    stock.record_sales(cursor, sales)
+
+def load_backend():
+    # Idempotent and thread-safe; returns the `dal` module
+    global dal, journal, flusher
+    with backend_lock:
+        if dal is None:
+            import dal as dal_module
+            from journal import SaleJournal, JournalFlusher
+            journal = SaleJournal(
+                os.path.join(APP_PATH, CONFIG.get('journal_path', 'journal/sales.journal')),
+                fsync_interval=CONFIG.get('journal_fsync_interval_ms', 50) / 1000,
+            )
+            flusher = JournalFlusher(
+                journal,
+                dal_module.connect,
+                batch_size=CONFIG.get('journal_batch_size', 50),
+                interval=CONFIG.get('journal_flush_interval', 2),
+                on_commit=commit_sales,
+                after_commit=lane_top_sellers.add_sales,
+            )
+            lane_top_sellers.load(TOP_SELLERS_PATH, date.today().isoformat())
+            flusher.start() # Sales left in the journal by the last run start draining now, whichever caller got here first
+            dal = dal_module
+    return dal
+
+def load_catalog():
+    # Full load the first time, a delta refresh afterwards; one at a time
+    load_backend()
+    with catalog_load_lock:
+        return catalog.refresh(dal)
+
+# RECEIPTS
+# Receipts are laid out, rendered and spooled/printed on their own worker thread (see receipt.py);
+# the on-screen receipt is shown from the finished layout.
+
+receipt_engine = ReceiptEngine(
+    CONFIG,
+    spool_dir=os.path.join(APP_PATH, CONFIG['receipt_spool_path']) if CONFIG.get('receipt_spool_path') else None,
+    spool_formats=CONFIG.get('receipt_spool_formats', ["text"]),
+    printer=CONFIG.get('receipt_printer') or None,
+    width=CONFIG.get('receipt_width', 42),
+    spool_keep_days=CONFIG.get('receipt_spool_keep_days', 7),
+)
+receipt_executor = WorkerExecutor(max_threads=1)
+
+# METRICS
+# Hot-path histograms and counters, shipped to the admin server's /metrics endpoint (see metrics.py)
+
+lane_metrics = metrics.Registry()
+SCAN_MS = lane_metrics.histogram("lane_scan_ms", "Barcode entered to cart updated, milliseconds")
+LOOKUP_MS = lane_metrics.histogram("lane_product_lookup_ms", "Database lookup for a barcode missing from the catalog, milliseconds")
+PAYMENT_COMMIT_MS = lane_metrics.histogram("lane_payment_commit_ms", "Sale written to the lane journal, milliseconds")
+RECEIPT_MS = lane_metrics.histogram("lane_receipt_render_ms", "Receipt laid out, rendered and spooled, milliseconds")
+LOGIN_MS = lane_metrics.histogram("lane_login_ms", "Login submitted to answered, milliseconds")
+STARTUP_MS = lane_metrics.histogram("lane_startup_ms", "Launch to login window painted, milliseconds")
+SCANS = lane_metrics.counter("lane_scans", "Barcodes scanned")
+CATALOG_MISSES = lane_metrics.counter("lane_catalog_misses", "Scans that had to query the database")
+UNKNOWN_PRODUCTS = lane_metrics.counter("lane_unknown_products", "Scans of barcodes not in the products table")
+SALES = lane_metrics.counter("lane_sales", "Sales completed")
+PAYMENT_ERRORS = lane_metrics.counter("lane_payment_errors", "Sales that could not be journaled")
+LOGIN_FAILURES = lane_metrics.counter("lane_login_failures", "Logins refused or failed")
+
+# Best sellers of the day and of the last hour, fed by the flusher once sales are committed and
+# shipped with the metrics; kept next to the journal across restarts (see top_sellers.py)
+TOP_SELLERS_PATH = os.path.join(APP_PATH, CONFIG.get('top_sellers_path', 'journal/top_sellers.json'))
+lane_top_sellers = lane_metrics.attach("top_sellers", top_sellers.TopSellers())
+
+metrics_shipper = None
+if CONFIG.get('metrics_url'):
+    metrics_shipper = metrics.MetricsShipper(
+        lane_metrics,
+        CONFIG['metrics_url'],
+        txid_generator.lane,
+        interval=CONFIG.get('metrics_ship_interval', 15),
+        token=CONFIG.get('metrics_token')
+    )
+
 # FRONTEND
 # 
 class CashierMainApp(QMainWindow):
     def __init__(self, username, full_name):
         super().__init__()
+        load_backend() # Loaded in the background long before a normal login; benchmarks get here directly
         # Initialize global variables
-        self.CART = dict()
+        self.cart = CartModel()
         self.TOTAL = 0.0
         self.PAID = 0.0
         self.TOGGLE_REMOVE_ITEM = False
@@ -53,8 +188,22 @@ class CashierMainApp(QMainWindow):
         self.USERNAME = username
         self.QDATETIME = QDateTime(QDate(1970, 1, 1), QTime(0,0,1))
         self.TRANSACTION_NO = 0
+        self.LAST_RECEIPT = None # Layout of the last completed sale, for "Reprint Receipt"
+        self.receipt = None
+        self.CART_ID = 0 # Bumped whenever the cart is cleared so late lookups cannot land in the next sale
+        self.pending_scans = deque() # Scans waiting on a database lookup, and those behind them, in scan order
+        self.payment_requested = False # Pay pressed while lookups were pending
+        self.scan_latency = LatencyTracker("Scan", CONFIG.get('scan_latency_budget_ms', 100))
+
+        # Product catalog cache, normally warmed while the cashier logged in (see `prewarm`)
+        self.catalog = catalog
+        if not self.catalog.loaded:
+            db_executor.submit(load_catalog, on_error=self.catalog_error)
+        self.catalog_timer = QTimer(self)
+        self.catalog_timer.timeout.connect(self.refresh_catalog)
+        self.catalog_timer.start(int(CONFIG.get('catalog_refresh_interval', 60)) * 1000)
 
-        # Cart dictionary format -> {item : metadata -> list()}; metadata = [quantity -> int, price_per_unit -> float, ean13 -> string]
+        # Cart lines are kept in a CartModel (see cart.py); receipts get a snapshot -> list of (item_name, quantity, price_per_unit, ean13)
         self.setWindowTitle(CONFIG['app_title'])
         # Main wrapper widget
         wrapper = QWidget()
@@ -75,27 +224,21 @@ class CashierMainApp(QMainWindow):
         self.cart_label = QLabel("Cart:")
         self.cart_label.setFont(QFont("Segoe UI", 20))
         self.column1_layout.addWidget(self.cart_label)
-        self.table = QTableWidget(0,3)
-        self.table.setHorizontalHeaderLabels(["Product Name", "Quantity", "Price (RM)"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers) # Disable user editing of the table directly
+        self.table = QTableView()
+        self.table.setModel(self.cart)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers) # Disable user editing of the table directly
 
+        # Fixed widths instead of ResizeToContents, which re-measures every row on each change
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
-        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Fixed)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Fixed)
+        self.table.setColumnWidth(1, 110)
+        self.table.setColumnWidth(2, 130)
         self.table.setWordWrap(True)
         self.table.verticalHeader().setDefaultSectionSize(50)
         self.table.setFont(QFont("Segoe UI", 12))
         header = self.table.horizontalHeader()
         header.setStyleSheet("""background-color: rgb(31, 224, 99); font-size: 15px; text-align: left; color: black;""")
-
-        # Cell padding-like effect via setting column width and font size idk
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    item.setFont(QFont("Segoe UI", 12))
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
         self.column1_layout.addWidget(self.table)
 
         # Column 2 transaction information
@@ -144,6 +287,16 @@ class CashierMainApp(QMainWindow):
         self.clear_button.clicked.connect(self.clear_cart)
         self.logout_button = QPushButton("Log out")
         self.logout_button.clicked.connect(self.logout)
+        self.find_button = QPushButton("Find item")
+        self.find_button.clicked.connect(self.find_item)
+        self.find_shortcut = QShortcut(QKeySequence("Ctrl+F"), self)
+        self.find_shortcut.activated.connect(self.find_item)
+        self.lookup_receipt_button = QPushButton("Find receipt")
+        self.lookup_receipt_button.clicked.connect(self.lookup_receipt)
+        self.lookup_receipt_shortcut = QShortcut(QKeySequence("Ctrl+R"), self)
+        self.lookup_receipt_shortcut.activated.connect(self.lookup_receipt)
+        self.button_row.addWidget(self.find_button)
+        self.button_row.addWidget(self.lookup_receipt_button)
         self.button_row.addWidget(self.remove_button)
         self.button_row.addWidget(self.clear_button)
         self.button_row.addWidget(self.logout_button)
@@ -365,67 +518,101 @@ class CashierMainApp(QMainWindow):
         self.showMaximized()
 
     def get_product_information(self, ean13):
-        cursor.execute("SELECT product_name, ean13, price FROM products WHERE ean13 = %s", (ean13,))
-        item = cursor.fetchone() # Format: tuple() (product_name, ean13, price)
+        # Runs on the database thread
+        with LOOKUP_MS.time():
+            item = self.catalog.lookup(ean13, dal) # Format: tuple() (product_name, ean13, price)
         if not item:
             return False
         return item
 
+    def refresh_catalog(self):
+        db_executor.submit(load_catalog, on_error=self.catalog_error)
+
+    def catalog_error(self, e):
+        print(f"Unable to load product catalog from database '{r_database}', scans will query the database directly")
+
     def update_cart(self):
         ean13 = self.ean13_input.text()
         self.ean13_input.setText("")
-        rows = self.table.rowCount()
+        started = self.scan_latency.start()
+        SCANS.inc()
         if not self.TOGGLE_REMOVE_ITEM:
-            item_information = self.get_product_information(ean13)
-            if not item_information:
-                self.last_scan.setText("ERROR: Product not found")
-                return
-            if item_information[0] not in self.CART.keys():
-                self.CART[item_information[0]] = [0, item_information[2], ean13]
-            self.CART[item_information[0]][0] += 1
-            current_total = round(float(self.total_input.text()), 2)
-            current_total += item_information[2]
-            self.TOTAL += item_information[2]
-            self.total_input.setText(f"{current_total:.2f}")
-            self.last_scan.setText(item_information[0])
-            self.item_price.setText(f"{item_information[2]:.2f}")
-            for row in range(rows):
-                if self.table.item(row, 0).text() == item_information[0]:
-                    current_quantity = int(self.table.item(row, 1).text())
-                    current_price = round(float(self.table.item(row, 2).text()), 2)
-                    current_quantity += 1
-                    current_price += item_information[2]
-                    self.table.setItem(row, 1, QTableWidgetItem(str(current_quantity)))
-                    self.table.setItem(row, 2, QTableWidgetItem(f"{current_price:.2f}"))
-                    break
+            item_information = self.catalog.get(ean13)
+            if item_information:
+                self.queue_scan({"action": "add", "item": item_information, "started": started, "done": True})
             else:
-                self.table.insertRow(rows)
-                self.table.setItem(rows, 0, QTableWidgetItem(item_information[0]))
-                self.table.setItem(rows, 1, QTableWidgetItem("1"))
-                self.table.setItem(rows, 2, QTableWidgetItem(f"{item_information[2]:.2f}"))
+                # Cache miss: look the barcode up on the database thread and keep accepting scans meanwhile.
+                # Later scans queue behind it, so the cart keeps scan order whichever lookup finishes first.
+                CATALOG_MISSES.inc()
+                scan = {"action": "add", "item": None, "started": started, "done": False}
+                cart_id = self.CART_ID
+                self.pending_scans.append(scan)
+                db_executor.submit(self.get_product_information, ean13,
+                    on_result=lambda item: self.product_lookup_done(scan, item, cart_id),
+                    on_error=lambda e: self.product_lookup_done(scan, None, cart_id, failed=True))
         else:
-            for item_name, item_info in self.CART.items():
-                if ean13 == item_info[2]:
-                    item_info[0] -= 1
-                    self.TOTAL -= item_info[1]
-                    for row in range(self.table.rowCount()):
-                        if self.table.item(row, 0).text() == item_name:
-                            current_quantity = int(self.table.item(row, 1).text())
-                            current_price = float(self.table.item(row, 2).text())
-                            current_quantity -= 1
-                            self.total_input.setText(f"{self.TOTAL:.2f}")
-                            if current_quantity == 0:
-                                self.table.removeRow(row)
-                            else:
-                                current_price -= item_info[1]
-                                self.table.setItem(row, 1, QTableWidgetItem(f"{current_quantity}"))
-                                self.table.setItem(row, 2, QTableWidgetItem(f"{current_price:.2f}"))
-                            break
-                    if item_info[0] == 0:
-                        del self.CART[item_name]
-                    break
+            self.queue_scan({"action": "remove", "ean13": ean13, "started": None, "done": True})
+
+    def queue_scan(self, scan):
+        self.pending_scans.append(scan)
+        self.apply_scans()
+
+    def product_lookup_done(self, scan, item_information, cart_id, failed=False):
+        if cart_id != self.CART_ID:
+            return
+        scan["item"] = item_information
+        scan["failed"] = failed
+        scan["done"] = True
+        self.apply_scans()
+
+    def apply_scans(self):
+        # Applies finished scans from the front of the queue, stopping at the first lookup still running
+        while self.pending_scans and self.pending_scans[0]["done"]:
+            scan = self.pending_scans.popleft()
+            if scan["action"] == "remove":
+                self.remove_from_cart(scan["ean13"])
+                continue
+            if scan.get("failed"):
+                self.last_scan.setText("ERROR: Product lookup failed, scan again")
+            elif not scan["item"]:
+                UNKNOWN_PRODUCTS.inc()
+                self.last_scan.setText("ERROR: Product not found")
+            else:
+                self.add_to_cart(scan["item"])
+            if scan["started"] is not None:
+                SCAN_MS.observe(self.scan_latency.stop(scan["started"]))
+        if not self.pending_scans and self.payment_requested and self.column2_cashier_widget.isVisible():
+            self.payment_requested = False
+            self.payment_widget()
+
+    def find_item(self):
+        # Name search for barcodes that will not scan
+        if not self.column2_cashier_widget.isVisible():
+            return
+        dialog = ProductLookupDialog(self.catalog, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted and dialog.selected:
+            if self.TOGGLE_REMOVE_ITEM:
+                self.queue_scan({"action": "remove", "ean13": dialog.selected[1], "started": None, "done": True})
             else:
-                self.last_scan.setText("Item not in cart")
+                self.queue_scan({"action": "add", "item": dialog.selected, "started": None, "done": True})
+        self.ean13_input.setFocus()
+
+    def add_to_cart(self, item_information):
+        product_name, ean13, price = item_information
+        self.cart.add(ean13, product_name, price)
+        self.TOTAL = self.cart.total
+        self.total_input.setText(f"{self.TOTAL:.2f}")
+        self.last_scan.setText(product_name)
+        self.item_price.setText(f"{price:.2f}")
+        self.table.scrollTo(self.cart.index(self.cart.rows[ean13], 0))
+
+    def remove_from_cart(self, ean13):
+        line = self.cart.remove(ean13)
+        if line is None:
+            self.last_scan.setText("Item not in cart")
+            return
+        self.TOTAL = self.cart.total
+        self.total_input.setText(f"{self.TOTAL:.2f}")
 
     def toggle_remove_item(self):
         if not self.TOGGLE_REMOVE_ITEM:
@@ -445,8 +632,10 @@ class CashierMainApp(QMainWindow):
             dlg_clear_cart = QMessageBox.warning(self, "Warning", "Are you sure you want to clear the cart?", buttons=QMessageBox.StandardButton.Yes|QMessageBox.StandardButton.No)
             if dlg_clear_cart == QMessageBox.StandardButton.No:
                 return
-        self.table.setRowCount(0)
-        self.CART.clear()
+        self.cart.clear()
+        self.CART_ID += 1
+        self.pending_scans.clear()
+        self.payment_requested = False
         self.TOTAL = 0.0
         self.PAID = 0.0
         self.TRANSACTION_NO = 0
@@ -462,11 +651,36 @@ class CashierMainApp(QMainWindow):
         self.ean13_input.setFocus()
     
     def process_payment(self):
+        if self.pending_scans: # Not reachable from the payment screen; never journal a cart still changing
+            return
         self.PAID = float(self.payment_input.text())
         if self.PAID < self.TOTAL:
             dlg_insufficient_amount = QMessageBox.warning(self, "Warning", "Payment insufficient")
             return
-        self.TRANSACTION_NO = int(datetime.now().timestamp())
+        self.TRANSACTION_NO = txid_generator.next_id()
+        now = datetime.now()
+        # The sale goes to the local journal; the flusher thread drains it into the database
+        sale = {
+            "transaction_id": self.TRANSACTION_NO,
+            "transaction_date": now.strftime("%Y-%m-%d"),
+            "transaction_time": now.strftime("%H:%M:%S"),
+            "total_amount": self.TOTAL,
+            "cashier_username": self.USERNAME,
+            "cashier_name": self.FULL_NAME, # For the receipt archive
+            "amount_paid": self.PAID,
+            "items": self.cart.snapshot()
+        }
+        try:
+            with PAYMENT_COMMIT_MS.time():
+                journal.append(sale)
+        except OSError as e:
+            PAYMENT_ERRORS.inc()
+            print(f"Unable to write sale #{self.TRANSACTION_NO} to journal '{journal.path}'")
+            print(e)
+            QMessageBox.critical(self, "Error", "Unable to record the sale on this lane. Please call a supervisor.")
+            return
+        flusher.wake()
+        SALES.inc()
         self.column2_payment_widget.hide()
         self.column2_complete_widget.show()
         self.QDATETIME = QDateTime.currentDateTime()
@@ -476,22 +690,63 @@ class CashierMainApp(QMainWindow):
         self.total_label_value.setText(f"RM {self.TOTAL:.2f}")
         self.amount_paid_value.setText(f"RM {self.PAID:.2f}")
         self.balance_value.setText(f"RM {(self.PAID - self.TOTAL):.2f}")        
-        try:
-            sql_date = date.today().strftime("%Y-%m-%d")
-            item_array = [(item_name,  data[0], data[1], data[2], self.TRANSACTION_NO) for item_name, data in self.CART.items()]
-            cursor.execute("INSERT INTO transactions (transaction_id, transaction_date, total_amount, cashier_username) VALUES (%s, %s, %s, %s)", (str(self.TRANSACTION_NO), sql_date, self.TOTAL, self.USERNAME))
-            cursor.executemany("INSERT INTO transaction_items (item_name, quantity, price_per_unit, ean13, transaction_id) VALUES (%s, %s, %s, %s, %s)", item_array)
-            db.commit()
-        except Exception as e:
-            print(f"An error occured while accessing database '{r_database}'")
-            print(e)
-        self.print_receipt()
+        self.LAST_RECEIPT = None
+        receipt_executor.submit(produce_receipt, sale, self.PAID, self.FULL_NAME, on_result=self.receipt_ready, on_error=self.receipt_error)
         self.new.setFocus()
-    
-    def print_receipt(self):
-        self.receipt = ReceiptWidget(self.CART, self.TOTAL, self.PAID, self.FULL_NAME, self.QDATETIME, self.TRANSACTION_NO)
+
+    def receipt_ready(self, receipt):
+        if receipt.transaction_id != self.TRANSACTION_NO: # The cashier has already moved on
+            return
+        self.LAST_RECEIPT = receipt
+        self.show_receipt(receipt)
+
+    def receipt_error(self, error):
+        QMessageBox.warning(self, "Warning", "Unable to produce the receipt. Use \"Reprint Receipt\" to try again.")
+
+    def show_receipt(self, receipt):
+        if self.receipt is not None:
+            self.receipt.close()
+        self.receipt = ReceiptWidget(receipt)
         self.receipt.show()
 
+    def print_receipt(self):
+        # Reprint from the cached layout; printing goes to the receipt worker
+        receipt = self.LAST_RECEIPT or receipt_engine.get(self.TRANSACTION_NO)
+        if receipt is None:
+            return # Still being produced, it shows up by itself
+        self.reprint_receipt(receipt)
+
+    def lookup_receipt(self):
+        # Any archived receipt by number; this lane's recent ones come from the engine's cache
+        transaction_id, accepted = QInputDialog.getText(self, "Find receipt", "Receipt #:")
+        transaction_id = transaction_id.strip().upper()
+        if not accepted or not transaction_id:
+            return
+        receipt = receipt_engine.get(transaction_id)
+        if receipt is not None:
+            self.reprint_receipt(receipt)
+            return
+        db_executor.submit(
+            receipt_archive.fetch, dal, transaction_id,
+            on_result=lambda receipt: self.archived_receipt_found(transaction_id, receipt),
+            on_error=self.archived_receipt_error
+        )
+
+    def archived_receipt_found(self, transaction_id, receipt):
+        if receipt is None:
+            QMessageBox.information(self, "Find receipt", f"Receipt #{transaction_id} was not found. Sales reach the archive a few seconds after payment.")
+            return
+        self.reprint_receipt(receipt)
+
+    def archived_receipt_error(self, error):
+        print("Unable to fetch receipt from the archive")
+        print(error)
+        QMessageBox.warning(self, "Warning", "Unable to reach the receipt archive.")
+
+    def reprint_receipt(self, receipt):
+        self.show_receipt(receipt)
+        receipt_executor.submit(receipt_engine.reprint, receipt, on_error=self.receipt_error)
+
     def exact_amout_payment(self):
         self.payment_input.setText(f"{self.TOTAL}")
         self.process_payment()
@@ -500,6 +755,11 @@ class CashierMainApp(QMainWindow):
         self.payment_input.setText("0.00")
 
     def payment_widget(self):
+        if self.pending_scans:
+            # The total is not final until every lookup is back; payment opens by itself once they are
+            self.payment_requested = True
+            self.last_scan.setText(f"Looking up {sum(not scan['done'] for scan in self.pending_scans)} item(s)...")
+            return
         if self.TOTAL == 0.0:
             return
         self.amount_label.setText(f"Total: RM {self.TOTAL:.2f}")
@@ -566,16 +826,36 @@ class CashierMainApp(QMainWindow):
             self.close()
 
 class LoginContainer(QWidget):
+    painted = pyqtSignal() # Emitted after the first paint, when the cashier can see the window
     def __init__(self):
         super().__init__()
         self.setWindowTitle(CONFIG['login_instance_title'])
         self.resize(800, 700)
+        self.background = None # QPixmap, set by `set_assets` once loaded in the background
+        self.first_paint = True
         self.login = LoginPage()
         self.login.login_success.connect(self.login_auth)        
         layout = QVBoxLayout(self)
         layout.addWidget(self.login, 0, Qt.AlignmentFlag.AlignCenter)
-        self.setAttribute(Qt.WidgetAttribute.WA_StyledBackground)
-        self.setStyleSheet("LoginContainer{background-image: url('assets/BACKGROUNDLINK');background-position: center;}")
+
+    def set_assets(self, images):
+        # `images` comes from `load_login_assets`; QImage loads off the GUI thread, QPixmap is made here
+        if images.get("background") is not None:
+            self.background = QPixmap.fromImage(images["background"])
+            self.update()
+        if images.get("icon") is not None:
+            self.login.set_logo(QPixmap.fromImage(images["icon"]))
+
+    def paintEvent(self, event):
+        if self.background is not None:
+            painter = QPainter(self)
+            scaled = self.background.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatioByExpanding, Qt.TransformationMode.SmoothTransformation)
+            painter.drawPixmap((self.width() - scaled.width()) // 2, (self.height() - scaled.height()) // 2, scaled)
+            painter.end()
+        super().paintEvent(event)
+        if self.first_paint:
+            self.first_paint = False
+            QTimer.singleShot(0, self.painted.emit)
     def login_auth(self, username, full_name):
         self.main_app = CashierMainApp(username, full_name)
         self.main_app.show()
@@ -606,9 +886,7 @@ class LoginPage(QWidget):
         self.title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.logo_holder = QLabel()
         self.logo_holder.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        logo = QPixmap(os.path.join(ASSET_FOLDER, CONFIG['login_instance_icon']))
-        self.logo = logo.scaled(128,128)
-        self.logo_holder.setPixmap(self.logo)
+        self.logo_holder.setFixedHeight(128) # The logo is loaded in the background, see `set_logo`
         self.username_field = AnimatedInputField("Username")
         self.username_field.setPlaceholderText("")
         self.password_field = AnimatedInputField("Password")
@@ -665,6 +943,14 @@ class LoginPage(QWidget):
             }
         """)
     
+    def set_logo(self, logo):
+        self.logo = logo.scaled(128,128)
+        self.logo_holder.setPixmap(self.logo)
+
+    def database_unavailable(self):
+        if self.login_btn.isEnabled(): # Not while a login is being answered
+            self.login_result.setText("Unable to reach database")
+
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
@@ -677,16 +963,35 @@ class LoginPage(QWidget):
 
     # Backend processing
     def login(self):
+        if not self.login_btn.isEnabled(): # A login query is already in flight
+            return
         username = self.username_field.text()
         password = self.password_field.text()
         if len(username) == 0 or len(password) == 0:
             self.login_result.setText("Fields cannot be empty")
             return
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username, ))
-        result = cursor.fetchone()
+        self.login_btn.setEnabled(False)
+        self.login_started = time.perf_counter()
+        db_executor.submit(self.fetch_user, username, on_result=lambda result: self.login_done(result, password), on_error=self.login_error)
+
+    def fetch_user(self, username):
+        # Runs on the database thread; the backend may still be loading if the cashier was quick
+        load_backend()
+        return dal.fetchone("SELECT * FROM users WHERE username = %s", (username, ), prepared=True)
+
+    def login_error(self, e):
+        LOGIN_MS.observe((time.perf_counter() - self.login_started) * 1000)
+        LOGIN_FAILURES.inc()
+        self.login_btn.setEnabled(True)
+        self.login_result.setText("Unable to reach database")
+
+    def login_done(self, result, password):
+        self.login_btn.setEnabled(True)
         if not result:
+            LOGIN_FAILURES.inc()
             self.login_result.setText("No username found!")
         elif result[2] != hash_password(password):
+            LOGIN_FAILURES.inc()
             self.login_result.setText("Password is incorrect")
         else:
             self.login_result.setText("Login successful")
@@ -694,6 +999,7 @@ class LoginPage(QWidget):
             self.full_name = result[4]
             self.login_result.setStyleSheet("QLabel{ color : white; font-size: 15px; }")
             self.login_success.emit(self.username, self.full_name)
+        LOGIN_MS.observe((time.perf_counter() - self.login_started) * 1000)
 
 class AnimatedInputField(QLineEdit):
     def __init__(self, label_text):
@@ -799,174 +1105,73 @@ class EAN13Input(QLineEdit):
         else:
             super().keyPressEvent(event)
 
+class ProductLookupDialog(QDialog):
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.selected = None # Format: tuple() (product_name, ean13, price)
+        self.setWindowTitle("Find item")
+        self.setMinimumSize(520, 420)
+        layout = QVBoxLayout(self)
+        self.query_input = QLineEdit()
+        self.query_input.setPlaceholderText("Type a product name or barcode digits")
+        self.query_input.setFont(QFont("Segoe UI", 13))
+        self.query_input.textChanged.connect(self.update_results)
+        self.results = QListWidget()
+        self.results.setFont(QFont("Segoe UI", 12))
+        self.results.itemActivated.connect(self.choose)
+        layout.addWidget(self.query_input)
+        layout.addWidget(self.results)
+        if not len(catalog):
+            self.results.addItem("Product catalog is still loading...")
+
+    def update_results(self, text):
+        self.results.clear()
+        for product_name, ean13, price, score in self.catalog.search(text, limit=20):
+            entry = QListWidgetItem(f"{product_name}  -  RM {price:.2f}  ({ean13})")
+            entry.setData(Qt.ItemDataRole.UserRole, (product_name, ean13, price))
+            self.results.addItem(entry)
+        if self.results.count():
+            self.results.setCurrentRow(0)
+
+    def choose(self, entry):
+        product = entry.data(Qt.ItemDataRole.UserRole)
+        if product:
+            self.selected = product
+            self.accept()
+
+    def keyPressEvent(self, event):
+        # Arrow keys move through the results while typing; Enter picks the highlighted one
+        if event.key() in (Qt.Key.Key_Up, Qt.Key.Key_Down):
+            row = self.results.currentRow() + (1 if event.key() == Qt.Key.Key_Down else -1)
+            if 0 <= row < self.results.count():
+                self.results.setCurrentRow(row)
+        elif event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            if self.results.currentItem():
+                self.choose(self.results.currentItem())
+        else:
+            super().keyPressEvent(event)
+
 class ReceiptWidget(QWidget):
-    def __init__(self, cart, total, amount_paid, cashier, qdatetime, receipt_no):
+    # Shows the text rendering of a receipt; layout and rendering happen in receipt.py
+    def __init__(self, receipt):
         super().__init__()
-        self.setWindowTitle(f"Receipt #{receipt_no}. Press Enter to close")
+        self.setWindowTitle(f"Receipt #{receipt.transaction_id}. Press Enter to close")
         self.setFixedSize(500, 700)
-        self.cart = cart
-        self.total = total
-        self.amount_paid = amount_paid
-        self.cashier = cashier
-        self.qdatetime = qdatetime
-        self.receipt_no = receipt_no
-        self.setup_ui()       
+        self.receipt = receipt
+        self.setup_ui()
 
     def setup_ui(self):
-        # Main layout
         layout = QVBoxLayout(self)
         layout.setContentsMargins(20, 20, 20, 20)
-        layout.setSpacing(15)
-        
-        # Receipt container
-        receipt_container = QWidget()
-        receipt_container.setStyleSheet("""
-            border-radius: 5px;
-        """)
-        receipt_layout = QVBoxLayout(receipt_container)
-        receipt_layout.setContentsMargins(20, 20, 20, 20)
-        receipt_layout.setSpacing(15)
-        
-        # Store name
-        store_label = QLabel("Store Name")
-        store_label.setFont(QFont("Arial", 17, QFont.Weight.Bold))
-        store_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        receipt_layout.addWidget(store_label)
-
-        address_label = QLabel("Store Address Sample Text")
-        address_label.setFont(QFont("Arial", 11))
-        address_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        address_label.setStyleSheet("margin-bottom: 10px;")
-        receipt_layout.addWidget(address_label)
-        
-        # Receipt info
-        info_widget = QWidget()
-        info_layout = QVBoxLayout(info_widget)
-        info_layout.setContentsMargins(0, 0, 0, 0)
-        info_layout.setSpacing(5)
-        
-        info_date = f"Date: {self.qdatetime.date().day()}-{self.qdatetime.date().month()}-{self.qdatetime.date().year()}" 
-        info_receipt_number = f"Receipt #: {self.receipt_no}"
-        info_cashier = f"Cashier: {self.cashier}"
-        info_labels = [
-            QLabel(info_date),
-            QLabel(info_receipt_number),
-            QLabel(info_cashier)
-        ]
-        
-        for label in info_labels:
-            label.setStyleSheet("font-size: 14px;")
-            info_layout.addWidget(label)
-        
-        receipt_layout.addWidget(info_widget)
-        
-        # Items table
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Item", "Qty", "Price (RM)"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.verticalHeader().setVisible(False)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.table.setShowGrid(False)
-
-        # Enable text wrapping
-        self.table.setWordWrap(True)
-        self.table.setTextElideMode(Qt.TextElideMode.ElideNone)  # Show full text, no ellipsis
-        self.table.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
 
-        # Style the table with wrapping support
-        self.table.setStyleSheet("""
-            QTableWidget {
-                border: none;
-                font-size: 14px;
-            }
-            QHeaderView::section {
-                background-color: transparent;
-                border: none;
-                padding-bottom: 8px;
-            }
-            QTableWidget::item {
-                border-bottom: 1px solid #eee;
-                padding: 8px 0;
-            }
-        """)
-
-        item_row = len(self.cart)
-        self.table.setRowCount(item_row)
-        row = 0
-        for name, (qty, price_per_unit, ean13) in self.cart.items():
-            name_item = QTableWidgetItem(name)
-            name_item.setFlags(name_item.flags() | Qt.ItemFlag.ItemIsAutoTristate)
-            
-            qty_item = QTableWidgetItem(str(qty))
-            qty_item.setFlags(qty_item.flags() | Qt.ItemFlag.ItemIsAutoTristate)
-            
-            price_item = QTableWidgetItem(f"{(price_per_unit * qty):.2f}")
-            price_item.setFlags(price_item.flags() | Qt.ItemFlag.ItemIsAutoTristate)
-            
-            self.table.setItem(row, 0, name_item)
-            self.table.setItem(row, 1, qty_item)
-            self.table.setItem(row, 2, price_item)
-            
-            # Center quantity column
-            self.table.item(row, 1).setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            # Right align price column
-            self.table.item(row, 2).setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-            row += 1
-
-        # Configure row height resizing
-        self.table.verticalHeader().setDefaultSectionSize(24) 
-        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-
-        # Empty row for spacing 
-        self.table.insertRow(item_row)
-
-        # Total row
-        self.table.insertRow(item_row+1)
-        total_item = QTableWidgetItem("Total")
-        total_item.setFont(QFont("Arial", 13, QFont.Weight.Bold))
-        self.table.setItem(item_row+1, 0, total_item)        
-        self.table.setSpan(item_row+1, 0, 1, 2)
-
-        total_price = QTableWidgetItem(f"RM{self.total:.2f}")
-        total_price.setFont(QFont("Arial", 13, QFont.Weight.Bold))
-        total_price.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-        self.table.setItem(item_row+1, 2, total_price)
-
-        # Amount Paid row
-        self.table.insertRow(item_row+2)
-        amount_paid_label = QTableWidgetItem("Amount Paid")
-        amount_paid_label.setFont(QFont("Arial"))
-        self.table.setItem(item_row+2, 0, amount_paid_label)
-        self.table.setSpan(item_row+2, 0, 1, 2)
-
-        amount_paid = QTableWidgetItem(f"RM{self.amount_paid:.2f}")
-        amount_paid.setFont(QFont("Arial"))
-        amount_paid.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-        self.table.setItem(item_row+2, 2, amount_paid)
-
-        self.table.insertRow(item_row+3)
-        change_label = QTableWidgetItem("Balance")
-        change_label.setFont(QFont("Arial"))
-        self.table.setItem(item_row+3, 0, change_label)
-        self.table.setSpan(item_row+3, 0, 1, 2)
-
-        change = QTableWidgetItem(f"RM{(self.amount_paid - self.total):.2f}")
-        change.setFont(QFont("Arial"))
-        change.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-        self.table.setItem(item_row+3, 2, change)
-
-        receipt_layout.addWidget(self.table)
-        
-        footer_label = QLabel("All prices are inclusive to 6% service tax\nThank you for your purchase!")
-        footer_label.setStyleSheet("""
-            font-size: 14px;
-            color: #888;
-        """)
-        footer_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        receipt_layout.addWidget(footer_label)
-        
-        layout.addWidget(receipt_container)
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFont("Courier New", 11))
+        self.text.setStyleSheet("border: none;")
+        self.text.setFocusPolicy(Qt.FocusPolicy.NoFocus) # Enter goes to the window, which closes
+        self.text.setPlainText(self.receipt.render("text", receipt_engine.width))
+        layout.addWidget(self.text)
 
     def keyPressEvent(self, event):
         if event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
@@ -974,8 +1179,91 @@ class ReceiptWidget(QWidget):
         else:
             super().keyPressEvent(event)
 
+def produce_receipt(sale, amount_paid, cashier):
+    # Runs on the receipt worker
+    with RECEIPT_MS.time():
+        return receipt_engine.produce(sale, amount_paid, cashier)
+
+# STARTUP PREWARM
+# Started once the login window is painted. Two chains run side by side on the database workers:
+#     backend (import dal/journal, open the journal) -> database (first pooled connection) -> catalog
+#     assets (login icon and background decoded into QImages)
+
+def load_login_assets():
+    # Runs on a worker thread
+    images = dict()
+    for name, key in (("icon", 'login_instance_icon'), ("background", 'login_instance_background')):
+        if CONFIG.get(key):
+            image = QImage(os.path.join(ASSET_FOLDER, CONFIG[key]))
+            images[name] = None if image.isNull() else image
+    return images
+
+def warm_database():
+    # Runs on a worker thread
+    started = time.perf_counter()
+    try:
+        load_backend().check()
+    except Exception:
+        startup.mark("database", started, failed=True)
+        startup.mark("catalog", started, failed=True)
+        raise
+    startup.mark("database", started)
+    started = time.perf_counter()
+    try:
+        load_catalog()
+    finally:
+        startup.mark("catalog", started, failed=not catalog.loaded)
+
+def warm_backend():
+    # Runs on a worker thread
+    started = time.perf_counter()
+    load_backend()
+    return started
+
+def prewarm(login_window):
+    def backend_ready(started):
+        startup.mark("backend", started)
+        db_executor.submit(warm_database, on_result=lambda result: finished(), on_error=database_error)
+    def backend_error(e):
+        print(f"Unable to open the sale journal or the database layer: {e}")
+        for phase in ("backend", "database", "catalog"):
+            startup.mark(phase, backend_started, failed=True)
+        login_window.login.database_unavailable()
+        finished()
+    def database_error(e):
+        print(f"Unable to connect to database '{r_database}' on host '{r_host}'")
+        login_window.login.database_unavailable()
+        finished()
+    def assets_ready(images, started):
+        login_window.set_assets(images)
+        startup.mark("assets", started)
+        finished()
+    def finished():
+        startup.report(STARTUP_REPORT_PHASES)
+    backend_started = assets_started = time.perf_counter()
+    db_executor.submit(warm_backend, on_result=backend_ready, on_error=backend_error)
+    db_executor.submit(load_login_assets, on_result=lambda images: assets_ready(images, assets_started), on_error=lambda e: assets_ready({}, assets_started))
+
+def stop_backend():
+    if flusher is not None:
+        flusher.stop()
+        try:
+            lane_top_sellers.save(TOP_SELLERS_PATH)
+        except OSError as e:
+            print(f"Unable to save best sellers to '{TOP_SELLERS_PATH}'")
+            print(e)
+
+def login_window_painted(login_window):
+    STARTUP_MS.observe(startup.mark("login_window"))
+    prewarm(login_window)
+
 if __name__ == "__main__":
     app = QApplication([])
+    app.aboutToQuit.connect(stop_backend)
+    if metrics_shipper is not None:
+        metrics_shipper.start()
+        app.aboutToQuit.connect(metrics_shipper.stop)
     login_window = LoginContainer()
+    login_window.painted.connect(lambda: login_window_painted(login_window))
     login_window.show()
     app.exec()
\ No newline at end of file
@@ -0,0 +1,260 @@
+import re
+import json
+import math
+import time
+import bisect
+import threading
+from datetime import datetime
+
+# Lightweight hot-path metrics for the lanes, exposed by the admin server.
+#
+# - `Histogram` keeps fixed latency buckets (milliseconds): `observe` is one bisect and two adds
+#   under a lock, with no allocation, so it can sit on the scan path.
+# - `Counter` is a single integer.
+# - Each lane's `MetricsShipper` POSTs a JSON snapshot of its registry to the admin server every
+#   `metrics_ship_interval` seconds. Snapshots are cumulative since the lane started, so a lost
+#   POST loses nothing and the admin server only has to keep the latest one per lane.
+# - `render_prometheus` turns the per-lane snapshots into the Prometheus text format for `/metrics`;
+#   `quantile` estimates percentiles from the buckets for the dashboard.
+# - Other lane state the admin server needs (e.g. top_sellers' sketches) rides along under "sketches":
+#   anything with a `snapshot()` returning JSON can be `attach`ed to the registry.
+# - The admin server keeps the latest snapshot per lane in `lane_metrics`, so every server worker
+#   sees all lanes; `load_lanes`/`store_lane` read and write it.
+
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+NAME_PATTERN = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS_MS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot counts values above the top bucket
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        # with histogram.time(): ... observes the block's duration in milliseconds
+        return _Timer(self)
+
+    def snapshot(self):
+        with self.lock:
+            return {"help": self.help, "buckets": list(self.buckets), "counts": list(self.counts), "sum": round(self.sum, 3), "count": self.count}
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe((time.perf_counter() - self.started) * 1000)
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {"help": self.help, "value": self.value}
+
+class Registry:
+    def __init__(self):
+        self.histograms = dict() # Format: {name : Histogram}
+        self.counters = dict() # Format: {name : Counter}
+        self.sketches = dict() # Format: {name : object with snapshot()}
+        self.started = time.time()
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS_MS):
+        return self.histograms.setdefault(name, Histogram(name, help_text, buckets))
+
+    def counter(self, name, help_text):
+        return self.counters.setdefault(name, Counter(name, help_text))
+
+    def attach(self, name, sketch):
+        self.sketches[name] = sketch
+        return sketch
+
+    def snapshot(self):
+        return {
+            "started": self.started,
+            "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            "counters": {name: counter.snapshot() for name, counter in self.counters.items()},
+            "sketches": {name: sketch.snapshot() for name, sketch in self.sketches.items()}
+        }
+
+class MetricsShipper(threading.Thread):
+    def __init__(self, registry, url, lane, interval=15.0, token=None):
+        super().__init__(name="metrics-shipper", daemon=True)
+        self.registry = registry
+        self.url = url.rstrip('/') + '/' + lane
+        self.lane = lane
+        self.interval = interval
+        self.token = token
+        self.stop_event = threading.Event()
+        self.failing = False
+
+    def stop(self):
+        self.stop_event.set()
+
+    def ship(self):
+        import urllib.request # Only needed once the first snapshot is due, so it stays off the lane's startup path
+        body = json.dumps({"lane": self.lane, "sent_at": time.time(), "metrics": self.registry.snapshot()}).encode('utf-8')
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["X-Metrics-Token"] = self.token
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.ship()
+                self.failing = False
+            except Exception as e:
+                if not self.failing: # Report once per outage, not every interval
+                    print(f"Unable to send lane metrics to '{self.url}': {e}")
+                self.failing = True
+
+# Admin side
+
+def store_lane(db, lane, snapshot):
+    db.execute("INSERT INTO lane_metrics (lane, payload, received_at) VALUES (%s, %s, NOW()) ON DUPLICATE KEY UPDATE payload = VALUES(payload), received_at = VALUES(received_at)", (lane, json.dumps(snapshot, separators=(',', ':'))))
+
+def load_lanes(db):
+    # Returns {lane : (snapshot, received_at unix time)}
+    return {lane: (json.loads(payload), received_at.timestamp()) for lane, payload, received_at in db.fetchall("SELECT lane, payload, received_at FROM lane_metrics")}
+
+def validate(snapshot):
+    # Raises ValueError unless `snapshot` looks like Registry.snapshot() output, down to every entry's
+    # types, so nothing render_prometheus or the dashboard reads can fail on a lane's payload
+    if not isinstance(snapshot, dict):
+        raise ValueError("metrics must be an object")
+    histograms, counters = snapshot.get("histograms", {}), snapshot.get("counters", {})
+    if not isinstance(histograms, dict) or not isinstance(counters, dict):
+        raise ValueError("histograms and counters must be objects")
+    for name, histogram in histograms.items():
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"invalid metric name '{name}'")
+        if not isinstance(histogram, dict) or not isinstance(histogram.get("help", ""), str):
+            raise ValueError(f"invalid histogram '{name}'")
+        buckets, counts = histogram.get("buckets"), histogram.get("counts")
+        if not isinstance(buckets, list) or not isinstance(counts, list) or len(counts) != len(buckets) + 1:
+            raise ValueError(f"histogram '{name}' has mismatched buckets and counts")
+        if not all(_numeric(value) for value in buckets + counts + [histogram.get("sum"), histogram.get("count")]):
+            raise ValueError(f"histogram '{name}' has non-numeric values")
+    for name, counter in counters.items():
+        if not NAME_PATTERN.match(name) or not isinstance(counter, dict) or not isinstance(counter.get("help", ""), str) or not _numeric(counter.get("value")):
+            raise ValueError(f"invalid counter '{name}'")
+    sketches = snapshot.get("sketches", {})
+    if not isinstance(sketches, dict) or not all(NAME_PATTERN.match(name) and isinstance(sketch, dict) for name, sketch in sketches.items()):
+        raise ValueError("sketches must be an object of named objects")
+
+def _numeric(value):
+    # bool is an int to isinstance, but not a sample value; NaN and infinities are not valid JSON either
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def quantile(histogram, q):
+    # Estimated from the buckets with linear interpolation, as Prometheus' histogram_quantile does
+    total = histogram["count"]
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(histogram["buckets"] + [math.inf], histogram["counts"]):
+        if count and cumulative + count >= rank:
+            if bound == math.inf:
+                return lower # Above the top bucket: the best estimate is its bound
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return lower
+
+def lane_summary(lanes, stale_after=120):
+    # Rows for the dashboard panel; latencies formatted in ms, "-" when a lane has no samples yet
+    def p(snapshot, name, q):
+        histogram = snapshot.get("histograms", {}).get(name)
+        value = quantile(histogram, q) if histogram else None
+        return "-" if value is None else f"{value:.1f} ms"
+    def total(snapshot, name):
+        return int(snapshot.get("counters", {}).get(name, {}).get("value", 0))
+    rows = []
+    now = time.time()
+    for lane, (snapshot, received_at) in sorted(lanes.items()):
+        rows.append({
+            "lane": lane,
+            "received_at": datetime.fromtimestamp(received_at),
+            "stale": now - received_at > stale_after,
+            "scans": total(snapshot, "lane_scans"),
+            "scan_p50": p(snapshot, "lane_scan_ms", 0.5),
+            "scan_p95": p(snapshot, "lane_scan_ms", 0.95),
+            "lookup_p95": p(snapshot, "lane_product_lookup_ms", 0.95),
+            "payment_p95": p(snapshot, "lane_payment_commit_ms", 0.95),
+            "receipt_p95": p(snapshot, "lane_receipt_render_ms", 0.95),
+            "login_p95": p(snapshot, "lane_login_ms", 0.95),
+            "sales": total(snapshot, "lane_sales")
+        })
+    return rows
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _escape_help(value):
+    # HELP text escapes only backslash and line feed; a raw newline would end the line mid-text
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus(lanes):
+    # `lanes` is {lane : (snapshot, received_at unix time)}; returns the text exposition format
+    histograms = dict() # Format: {name : [(lane, histogram)]}
+    counters = dict() # Format: {name : [(lane, counter)]}
+    for lane, (snapshot, received_at) in sorted(lanes.items()):
+        for name, histogram in snapshot.get("histograms", {}).items():
+            histograms.setdefault(name, []).append((lane, histogram))
+        for name, counter in snapshot.get("counters", {}).items():
+            counters.setdefault(name, []).append((lane, counter))
+    lines = []
+    for name, series in sorted(histograms.items()):
+        lines.append(f"# HELP {name} {_escape_help(series[0][1].get('help', ''))}")
+        lines.append(f"# TYPE {name} histogram")
+        for lane, histogram in series:
+            label = f'lane="{_escape(lane)}"'
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{_number(bound)}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {cumulative + histogram["counts"][-1]}')
+            lines.append(f"{name}_sum{{{label}}} {_number(histogram['sum'])}")
+            lines.append(f"{name}_count{{{label}}} {histogram['count']}")
+    for name, series in sorted(counters.items()):
+        lines.append(f"# HELP {name}_total {_escape_help(series[0][1].get('help', ''))}")
+        lines.append(f"# TYPE {name}_total counter")
+        for lane, counter in series:
+            lines.append(f'{name}_total{{lane="{_escape(lane)}"}} {_number(counter["value"])}')
+    lines.append("# HELP lane_metrics_last_received_seconds Unix time of the last metrics snapshot from the lane")
+    lines.append("# TYPE lane_metrics_last_received_seconds gauge")
+    for lane, (snapshot, received_at) in sorted(lanes.items()):
+        lines.append(f'lane_metrics_last_received_seconds{{lane="{_escape(lane)}"}} {received_at:.0f}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,299 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import importlib.util
+from datetime import date
+
+# Versioned schema migrations.
+#
+# Each file in migrations/ is named NNNN_description.py and defines `upgrade(schema)`, where
+# `schema` is a `Schema` bound to one connection. Applied versions are recorded in
+# `schema_migrations`, so running the upgrade again only applies what is new:
+#
+#     python migrate.py status                     applied and pending versions
+#     python migrate.py upgrade                    apply everything pending (a fresh database starts at 0001)
+#     python migrate.py upgrade --to 3             stop after version 3
+#     python migrate.py partitions --months-ahead 3  add next months' partitions (run monthly, e.g. from cron)
+#
+# MySQL commits every DDL statement on its own, so a migration cannot be rolled back as a whole.
+# Instead every step checks whether it has already been done (`has_index`, `has_column`, ...),
+# and a migration that stopped half way is simply run again. Large data changes go through
+# `backfill`, which updates in short primary key ranges with a pause in between, so lanes keep
+# committing sales while it runs. Lanes write to their journal first, so a table rebuild that
+# blocks writes for a while only delays their flush; no sale is lost.
+
+MIGRATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{4})_(\w+)\.py$")
+MIGRATION_LOCK = "schema_migrations"
+HISTORY_DDL = """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version int NOT NULL,
+    name varchar(255) NOT NULL,
+    checksum char(40) NOT NULL,
+    applied_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms int NOT NULL,
+    PRIMARY KEY (version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci"""
+PARTITION_PAST = "p_past"
+PARTITION_FUTURE = "p_future"
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'rb') as migration_file:
+            self.checksum = hashlib.sha1(migration_file.read()).hexdigest()
+
+    def load(self):
+        spec = importlib.util.spec_from_file_location(f"migration_{self.version:04d}", self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+def discover(path=MIGRATIONS_PATH):
+    migrations = []
+    for filename in sorted(os.listdir(path)):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(path, filename)))
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in '{path}'")
+    return migrations
+
+class Schema:
+    def __init__(self, cnx, batch_size=5000, pause=0.05, verbose=True):
+        self.cnx = cnx
+        self.batch_size = batch_size
+        self.pause = pause # Seconds between backfill batches, to leave room for the lanes' commits
+        self.verbose = verbose
+
+    def log(self, message):
+        if self.verbose:
+            print(f"  {message}", flush=True)
+
+    def execute(self, sql, params=()):
+        # Runs and commits one statement; returns the affected row count
+        cur = self.cnx.cursor()
+        try:
+            cur.execute(sql, params)
+            rowcount = cur.rowcount
+        finally:
+            cur.close()
+        self.cnx.commit()
+        return rowcount
+
+    def query(self, sql, params=()):
+        cur = self.cnx.cursor()
+        try:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        self.cnx.commit() # Ends the read snapshot, so the next step sees the latest rows
+        return rows
+
+    def scalar(self, sql, params=()):
+        rows = self.query(sql, params)
+        return rows[0][0] if rows else None
+
+    # Introspection, against the connection's current database
+
+    def has_table(self, table):
+        return bool(self.scalar("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", (table,)))
+
+    def column_type(self, table, column):
+        # e.g. "float", "decimal(12,2)"; None when the column does not exist
+        return self.scalar("SELECT column_type FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s", (table, column))
+
+    def has_column(self, table, column):
+        return self.column_type(table, column) is not None
+
+    def is_nullable(self, table, column):
+        return self.scalar("SELECT is_nullable FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s", (table, column)) == "YES"
+
+    def index_columns(self, table, index):
+        rows = self.query("SELECT column_name FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s ORDER BY seq_in_index", (table, index))
+        return [column for (column,) in rows]
+
+    def has_index(self, table, index):
+        return bool(self.index_columns(table, index))
+
+    def has_foreign_key(self, table, name):
+        return bool(self.scalar("SELECT COUNT(*) FROM information_schema.table_constraints WHERE table_schema = DATABASE() AND table_name = %s AND constraint_name = %s AND constraint_type = 'FOREIGN KEY'", (table, name)))
+
+    def partitions(self, table):
+        # Returns [(partition_name, less_than)] in order, [] for a table that is not partitioned
+        return self.query("""SELECT partition_name, partition_description FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL ORDER BY partition_ordinal_position""", (table,))
+
+    # Steps, each a no-op when already done
+
+    def add_index(self, table, index, columns):
+        if self.has_index(table, index):
+            return
+        self.log(f"adding index {table}.{index} ({', '.join(columns)})")
+        # INPLACE/LOCK=NONE builds the index while the table keeps taking reads and writes
+        self.execute(f"ALTER TABLE `{table}` ADD INDEX `{index}` ({', '.join(f'`{column}`' for column in columns)}), ALGORITHM=INPLACE, LOCK=NONE")
+
+    def drop_index(self, table, index):
+        if self.has_index(table, index):
+            self.log(f"dropping index {table}.{index}")
+            self.execute(f"ALTER TABLE `{table}` DROP INDEX `{index}`, ALGORITHM=INPLACE, LOCK=NONE")
+
+    def add_column(self, table, column, definition):
+        if not self.has_column(table, column):
+            self.log(f"adding column {table}.{column}")
+            self.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+
+    def backfill(self, table, key, assignment, where=None):
+        # UPDATE `table` SET <assignment> [WHERE <where>] in ranges of `batch_size` keys along the
+        # single-column key `key`, one commit per range. Rows locked at a time stay few and short.
+        condition = f" AND ({where})" if where else ""
+        last = None
+        updated = 0
+        started = time.perf_counter()
+        while True:
+            if last is None:
+                upper = self.scalar(f"SELECT `{key}` FROM `{table}` WHERE 1 = 1{condition} ORDER BY `{key}` LIMIT %s, 1", (self.batch_size - 1,))
+            else:
+                upper = self.scalar(f"SELECT `{key}` FROM `{table}` WHERE `{key}` > %s{condition} ORDER BY `{key}` LIMIT %s, 1", (last, self.batch_size - 1))
+            bounds = []
+            params = []
+            if last is not None:
+                bounds.append(f"`{key}` > %s")
+                params.append(last)
+            if upper is not None:
+                bounds.append(f"`{key}` <= %s")
+                params.append(upper)
+            range_condition = " AND ".join(bounds) or "1 = 1"
+            updated += max(0, self.execute(f"UPDATE `{table}` SET {assignment} WHERE {range_condition}{condition}", params))
+            if upper is None: # That was the last, partial range
+                break
+            last = upper
+            if self.pause:
+                time.sleep(self.pause)
+        self.log(f"backfilled {updated} rows of {table} in {time.perf_counter() - started:.1f}s")
+        return updated
+
+    def partition_by_month(self, table, column, first_month, months_ahead=3):
+        # Rebuilds `table` as RANGE COLUMNS(`column`) partitions: `p_past` for anything before
+        # `first_month`, one per month up to `months_ahead` months from now, and a catch-all
+        # `p_future`. The table is copied: writes wait until it is done.
+        if self.partitions(table):
+            return
+        first_month = month_start(first_month)
+        bounds = month_bounds(first_month, add_months(month_start(date.today()), months_ahead + 1))
+        definitions = [f"PARTITION {PARTITION_PAST} VALUES LESS THAN ('{first_month.isoformat()}')"]
+        definitions += [f"PARTITION {partition_name(start)} VALUES LESS THAN ('{end.isoformat()}')" for start, end in bounds]
+        definitions.append(f"PARTITION {PARTITION_FUTURE} VALUES LESS THAN (MAXVALUE)")
+        self.log(f"partitioning {table} by month on {column} ({len(bounds)} months + {PARTITION_FUTURE})")
+        self.execute(f"ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS(`{column}`) ({', '.join(definitions)})")
+
+    def extend_partitions(self, table, months_ahead=3):
+        # Splits the next months out of `p_future` so new sales never land in the catch-all
+        partitions = self.partitions(table)
+        if not partitions or partitions[-1][0] != PARTITION_FUTURE:
+            return 0
+        last_bound = date.fromisoformat(partitions[-2][1].strip("'")) if len(partitions) > 1 else month_start(date.today())
+        target = add_months(month_start(date.today()), months_ahead + 1)
+        bounds = month_bounds(last_bound, target)
+        if not bounds:
+            return 0
+        definitions = [f"PARTITION {partition_name(start)} VALUES LESS THAN ('{end.isoformat()}')" for start, end in bounds]
+        definitions.append(f"PARTITION {PARTITION_FUTURE} VALUES LESS THAN (MAXVALUE)")
+        self.log(f"adding {len(bounds)} monthly partitions to {table}")
+        # Only `p_future` is reorganized; it holds no rows as long as this runs ahead of time
+        self.execute(f"ALTER TABLE `{table}` REORGANIZE PARTITION {PARTITION_FUTURE} INTO ({', '.join(definitions)})")
+        return len(bounds)
+
+def month_start(day):
+    return day.replace(day=1)
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+def month_bounds(start, end):
+    # [(first day of month, first day of next month)] for every month from `start` up to `end`
+    bounds = []
+    month = month_start(start)
+    while month < end:
+        bounds.append((month, add_months(month, 1)))
+        month = add_months(month, 1)
+    return bounds
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+# Runner
+
+def applied_versions(schema):
+    schema.execute(HISTORY_DDL)
+    rows = schema.query("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {version: (name, checksum, applied_at) for version, name, checksum, applied_at in rows}
+
+def upgrade(schema, migrations, target=None):
+    applied = applied_versions(schema)
+    for migration in migrations:
+        if target is not None and migration.version > target:
+            break
+        if migration.version in applied:
+            if applied[migration.version][1] != migration.checksum:
+                print(f"Warning: migration {migration.version:04d}_{migration.name} changed after it was applied")
+            continue
+        print(f"Applying {migration.version:04d}_{migration.name}", flush=True)
+        started = time.perf_counter()
+        migration.load().upgrade(schema)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        schema.execute("INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)", (migration.version, migration.name, migration.checksum, duration_ms))
+        print(f"Applied {migration.version:04d}_{migration.name} in {duration_ms / 1000:.1f}s", flush=True)
+
+def status(schema, migrations):
+    applied = applied_versions(schema)
+    for migration in migrations:
+        if migration.version in applied:
+            name, checksum, applied_at = applied[migration.version]
+            changed = " (changed since)" if checksum != migration.checksum else ""
+            print(f"{migration.version:04d}_{migration.name:<40} applied {applied_at}{changed}")
+        else:
+            print(f"{migration.version:04d}_{migration.name:<40} pending")
+
+PARTITIONED_TABLES = ("transactions", "transaction_items")
+
+def extend_all_partitions(schema, months_ahead):
+    for table in PARTITIONED_TABLES:
+        schema.extend_partitions(table, months_ahead)
+
+if __name__ == "__main__":
+    import dal
+    parser = argparse.ArgumentParser(description="Upgrade the database schema in place")
+    parser.add_argument("command", choices=["status", "upgrade", "partitions"])
+    parser.add_argument("--to", dest="target", type=int, help="Stop after this version")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per backfill batch")
+    parser.add_argument("--pause", type=float, default=0.05, help="Seconds to wait between backfill batches")
+    parser.add_argument("--months-ahead", type=int, default=3, help="Monthly partitions to keep ready ahead of today")
+    args = parser.parse_args()
+
+    cnx = dal.connect()
+    schema = Schema(cnx, batch_size=args.batch_size, pause=args.pause)
+    # One runner at a time: a second one waits for nothing and leaves
+    if not schema.scalar("SELECT GET_LOCK(%s, 0)", (MIGRATION_LOCK,)):
+        print("Another migration is running")
+        sys.exit(1)
+    try:
+        migrations = discover()
+        if args.command == "status":
+            status(schema, migrations)
+        elif args.command == "upgrade":
+            upgrade(schema, migrations, args.target)
+            extend_all_partitions(schema, args.months_ahead)
+            print(f"Database is at version {max([0] + list(applied_versions(schema)))}")
+        else:
+            extend_all_partitions(schema, args.months_ahead)
+    finally:
+        schema.scalar("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cnx.close()
@@ -0,0 +1,112 @@
+# The schema as it stood before versioned migrations. Every statement is CREATE TABLE IF NOT
+# EXISTS, so on an empty database it creates the tables the later migrations build on.
+#
+# A live database may predate some of it: one created from the original tables_structure.sql has
+# no products.updated_at (catalog delta refresh), no transactions.transaction_time and no date
+# indexes. COLUMNS and INDEXES add whatever is missing, in place, before 0002 onwards run.
+
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS `users` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `username` varchar(255) NOT NULL,
+  `pword` varchar(255) NOT NULL,
+  `clearance` int NOT NULL,
+  `full_name` varchar(255) NOT NULL,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `products` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `product_name` varchar(255) NOT NULL,
+  `ean13` varchar(15) NOT NULL,
+  `price` float NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `ean13` (`ean13`),
+  KEY `updated_at` (`updated_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `transactions` (
+  `transaction_id` varchar(16) NOT NULL,
+  `total_amount` float DEFAULT NULL,
+  `cashier_username` varchar(255) NOT NULL,
+  `transaction_date` date DEFAULT NULL,
+  `transaction_time` time DEFAULT NULL,
+  PRIMARY KEY (`transaction_id`),
+  KEY `transaction_date` (`transaction_date`,`transaction_id`),
+  KEY `cashier_date` (`cashier_username`,`transaction_date`,`transaction_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `transaction_items` (
+  `item_id` int NOT NULL AUTO_INCREMENT,
+  `transaction_id` varchar(16) DEFAULT NULL,
+  `item_name` varchar(255) DEFAULT NULL,
+  `quantity` int DEFAULT NULL,
+  `price_per_unit` float DEFAULT NULL,
+  `ean13` varchar(16) DEFAULT NULL,
+  PRIMARY KEY (`item_id`),
+  KEY `transaction_id` (`transaction_id`),
+  CONSTRAINT `transaction_items_ibfk_1` FOREIGN KEY (`transaction_id`) REFERENCES `transactions` (`transaction_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `sales_daily` (
+  `sales_date` date NOT NULL,
+  `transaction_count` int NOT NULL DEFAULT '0',
+  `item_count` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`sales_date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `sales_hourly` (
+  `sales_date` date NOT NULL,
+  `sales_hour` tinyint NOT NULL,
+  `transaction_count` int NOT NULL DEFAULT '0',
+  `item_count` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`sales_date`,`sales_hour`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `sales_by_cashier` (
+  `sales_date` date NOT NULL,
+  `cashier_username` varchar(255) NOT NULL,
+  `transaction_count` int NOT NULL DEFAULT '0',
+  `item_count` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`sales_date`,`cashier_username`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `sales_by_product` (
+  `sales_date` date NOT NULL,
+  `ean13` varchar(16) NOT NULL,
+  `item_name` varchar(255) DEFAULT NULL,
+  `quantity` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`sales_date`,`ean13`),
+  KEY `sales_date_quantity` (`sales_date`,`quantity`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `lane_metrics` (
+  `lane` varchar(16) NOT NULL,
+  `payload` mediumtext NOT NULL,
+  `received_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`lane`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    """CREATE TABLE IF NOT EXISTS `receipt_archive` (
+  `transaction_id` varchar(16) NOT NULL,
+  `receipt_date` date NOT NULL,
+  `snapshot` blob NOT NULL,
+  PRIMARY KEY (`transaction_id`),
+  KEY `receipt_date` (`receipt_date`,`transaction_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+]
+
+COLUMNS = [
+    ("products", "updated_at", "timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    ("transactions", "transaction_time", "time DEFAULT NULL"),
+]
+INDEXES = [
+    ("products", "updated_at", ["updated_at"]),
+    ("transactions", "transaction_date", ["transaction_date", "transaction_id"]),
+    ("transactions", "cashier_date", ["cashier_username", "transaction_date", "transaction_id"]),
+]
+
+def upgrade(schema):
+    for ddl in TABLES:
+        schema.execute(ddl)
+    for table, column, definition in COLUMNS:
+        schema.add_column(table, column, definition)
+    for table, index, columns in INDEXES:
+        schema.add_index(table, index, columns)
@@ -0,0 +1,43 @@
+# Money columns from FLOAT (single precision: 14.16 is stored as 14.1599998) to fixed-point DECIMAL.
+#
+# Online, per column:
+#   1. add a nullable shadow column `<column>_decimal` of the final type (instant in MySQL 8.0)
+#   2. triggers keep it in step for rows written while the migration runs
+#   3. batched backfill of the existing rows, ROUND(<column>, 2)
+#   4. one ALTER swaps the shadow in under the old name: a rename and at most NOT NULL, which
+#      MySQL does in place (reads and writes continue); it cannot change a column's type in place
+#   5. the triggers are dropped
+# A write landing between 4 and 5 fails on the dropped column, so run it while no product import
+# or edit is under way.
+
+COLUMNS = [
+    # (table, column, key, shadow type, definition after the swap)
+    ("products", "price", "id", "decimal(10,2)", "decimal(10,2) NOT NULL"),
+    ("transactions", "total_amount", "transaction_id", "decimal(12,2)", "decimal(12,2) DEFAULT NULL"),
+    ("transaction_items", "price_per_unit", "item_id", "decimal(10,2)", "decimal(10,2) DEFAULT NULL"),
+]
+
+def drop_triggers(schema, table, shadow):
+    for event in ("INSERT", "UPDATE"):
+        schema.execute(f"DROP TRIGGER IF EXISTS `{table}_{shadow}_{event.lower()}`")
+
+def upgrade(schema):
+    for table, column, key, shadow_type, definition in COLUMNS:
+        shadow = f"{column}_decimal"
+        if (schema.column_type(table, column) or "").startswith("decimal"):
+            continue
+        current = schema.column_type(table, shadow)
+        if current is not None and current != shadow_type:
+            # Left by an earlier run with another type: start this column over
+            schema.log(f"dropping {table}.{shadow} ({current})")
+            drop_triggers(schema, table, shadow)
+            schema.execute(f"ALTER TABLE `{table}` DROP COLUMN `{shadow}`")
+        schema.add_column(table, shadow, f"{shadow_type} DEFAULT NULL")
+        for event in ("INSERT", "UPDATE"):
+            trigger = f"{table}_{shadow}_{event.lower()}"
+            schema.execute(f"DROP TRIGGER IF EXISTS `{trigger}`")
+            schema.execute(f"CREATE TRIGGER `{trigger}` BEFORE {event} ON `{table}` FOR EACH ROW SET NEW.`{shadow}` = ROUND(NEW.`{column}`, 2)")
+        schema.backfill(table, key, f"`{shadow}` = ROUND(`{column}`, 2)", where=f"`{shadow}` IS NULL AND `{column}` IS NOT NULL")
+        schema.log(f"swapping {table}.{column} to {definition}")
+        schema.execute(f"ALTER TABLE `{table}` DROP COLUMN `{column}`, CHANGE COLUMN `{shadow}` `{column}` {definition}, ALGORITHM=INPLACE, LOCK=NONE")
+        drop_triggers(schema, table, shadow)
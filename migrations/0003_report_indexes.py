@@ -0,0 +1,26 @@
+# Covering indexes for the hot admin and lane queries, built in place without blocking writes.
+#
+#   history.page         transactions by date range (optionally one cashier), newest first
+#   history.items        a transaction's line items in scan order; exports join on the same index
+#   LoginPage.fetch_user users by username
+#
+# The old `transaction_date` and `cashier_date` indexes are prefixes of the new ones and are
+# dropped once those exist, as is the single-column `transaction_id` index on transaction_items.
+
+INDEXES = [
+    ("transactions", "date_report", ["transaction_date", "transaction_id", "cashier_username", "transaction_time", "total_amount"]),
+    ("transactions", "cashier_date_report", ["cashier_username", "transaction_date", "transaction_id", "transaction_time", "total_amount"]),
+    ("transaction_items", "transaction_lines", ["transaction_id", "item_id", "item_name", "quantity", "price_per_unit", "ean13"]),
+    ("users", "username", ["username"]),
+]
+REPLACED = [
+    ("transactions", "transaction_date"),
+    ("transactions", "cashier_date"),
+    ("transaction_items", "transaction_id"), # The foreign key now uses `transaction_lines`
+]
+
+def upgrade(schema):
+    for table, index, columns in INDEXES:
+        schema.add_index(table, index, columns)
+    for table, index in REPLACED:
+        schema.drop_index(table, index)
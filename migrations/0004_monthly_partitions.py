@@ -0,0 +1,45 @@
+from datetime import date
+
+# Monthly RANGE COLUMNS partitions on transaction_date for transactions and transaction_items, so
+# a date-range report or export only reads the months it asks for.
+#
+# MySQL requires the partitioning column in every unique key and allows no foreign keys on
+# partitioned tables, so:
+#   - the transaction_items -> transactions foreign key is dropped (the journal flusher writes both
+#     in one transaction; transaction IDs are unique by construction, see txid.py)
+#   - transaction_items gets its own transaction_date, backfilled in batches; a trigger fills it
+#     for lanes still running code that does not write it
+#   - the primary keys become (transaction_id, transaction_date) and (item_id, transaction_date)
+# The primary key change and the partitioning rebuild each table, which blocks writes until done:
+# run this outside opening hours. Lanes keep selling from their journals meanwhile.
+# `python migrate.py partitions` (monthly) keeps the next months' partitions ready.
+
+UNDATED = '1970-01-01' # Sales recorded without a date (the column used to be nullable)
+
+def upgrade(schema):
+    if schema.has_foreign_key("transaction_items", "transaction_items_ibfk_1"):
+        schema.log("dropping foreign key transaction_items_ibfk_1")
+        schema.execute("ALTER TABLE transaction_items DROP FOREIGN KEY transaction_items_ibfk_1")
+
+    if schema.is_nullable("transactions", "transaction_date"):
+        schema.backfill("transactions", "transaction_id", f"transaction_date = '{UNDATED}'", where="transaction_date IS NULL")
+
+    schema.add_column("transaction_items", "transaction_date", "date DEFAULT NULL")
+    schema.execute("DROP TRIGGER IF EXISTS transaction_items_date")
+    schema.execute("""CREATE TRIGGER transaction_items_date BEFORE INSERT ON transaction_items FOR EACH ROW
+        SET NEW.transaction_date = COALESCE(NEW.transaction_date, (SELECT t.transaction_date FROM transactions t WHERE t.transaction_id = NEW.transaction_id LIMIT 1), CURDATE())""")
+    schema.backfill("transaction_items", "item_id",
+        f"transaction_date = COALESCE((SELECT t.transaction_date FROM transactions t WHERE t.transaction_id = transaction_items.transaction_id LIMIT 1), '{UNDATED}')",
+        where="transaction_date IS NULL")
+
+    if schema.index_columns("transactions", "PRIMARY") != ["transaction_id", "transaction_date"]:
+        schema.log("rebuilding transactions with primary key (transaction_id, transaction_date)")
+        schema.execute("ALTER TABLE transactions MODIFY transaction_date date NOT NULL, DROP PRIMARY KEY, ADD PRIMARY KEY (transaction_id, transaction_date)")
+    if schema.index_columns("transaction_items", "PRIMARY") != ["item_id", "transaction_date"]:
+        schema.log("rebuilding transaction_items with primary key (item_id, transaction_date)")
+        schema.execute("ALTER TABLE transaction_items MODIFY transaction_date date NOT NULL, DROP PRIMARY KEY, ADD PRIMARY KEY (item_id, transaction_date)")
+
+    # Older and undated sales go to `p_past`
+    first_day = schema.scalar(f"SELECT MIN(transaction_date) FROM transactions WHERE transaction_date > '{UNDATED}'") or date.today()
+    for table in ("transactions", "transaction_items"):
+        schema.partition_by_month(table, "transaction_date", first_day)
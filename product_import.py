@@ -0,0 +1,178 @@
+import csv
+import sys
+import time
+import argparse
+import numpy as np
+
+# Bulk product import: streams a CSV with `product_name,ean13,price` columns into `products`.
+#
+# - The file is read in batches, never loaded whole.
+# - Each batch is validated with NumPy: EAN-13 check digits, prices and names are checked for the
+#   whole batch at once, and bad rows are reported with their line number and reason.
+# - Valid rows are upserted with multi-row `INSERT ... ON DUPLICATE KEY UPDATE` statements, and a
+#   commit is issued every `transaction_rows` rows so no transaction grows without bound.
+#
+# Usage:
+#     python product_import.py catalog.csv --rejects rejects.csv
+
+REQUIRED_COLUMNS = ("product_name", "ean13", "price")
+EAN13_WEIGHTS = np.array([1, 3] * 6, dtype=np.int32)
+MAX_NAME_LENGTH = 255
+MAX_PRICE = 1e7
+
+UPSERT_PREFIX = "INSERT INTO products (product_name, ean13, price) VALUES "
+UPSERT_SUFFIX = " ON DUPLICATE KEY UPDATE product_name = VALUES(product_name), price = VALUES(price)"
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejects = [] # Format: list of (line_no, ean13, reason)
+        self.committed = 0 # Valid rows written by committed transactions
+        self.seconds = 0.0
+
+    def summary(self):
+        return f"{self.rows} rows in {self.seconds:.2f}s: {self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, {len(self.rejects)} rejected"
+
+def read_batches(text_stream, batch_size):
+    # Yields lists of (line_no, product_name, ean13, price_text)
+    reader = csv.DictReader(text_stream)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, (row['product_name'] or '').strip(), (row['ean13'] or '').strip(), (row['price'] or '').strip()))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def parse_prices(price_texts):
+    try:
+        return np.asarray(price_texts, dtype=np.str_).astype(np.float64)
+    except ValueError:
+        # At least one price is not a number: fall back to parsing one by one and mark those NaN
+        prices = np.empty(len(price_texts), dtype=np.float64)
+        for i, text in enumerate(price_texts):
+            try:
+                prices[i] = float(text)
+            except ValueError:
+                prices[i] = np.nan
+        return prices
+
+def validate(batch):
+    # Returns (valid rows as [(product_name, ean13, price)], rejects as [(line_no, ean13, reason)])
+    line_numbers = [row[0] for row in batch]
+    names = np.array([row[1] for row in batch], dtype=object)
+    eans = np.array([row[2] for row in batch], dtype=np.str_)
+    prices = parse_prices([row[3] for row in batch])
+
+    reasons = np.full(len(batch), '', dtype=object)
+
+    # isdigit() also accepts other scripts' digits ('١', '５'); only ASCII 0-9 make an EAN-13
+    ascii_ok = np.fromiter((ean.isascii() for ean in eans.tolist()), dtype=bool, count=len(eans))
+    ean_shape_ok = (np.char.str_len(eans) == 13) & ascii_ok & np.char.isdigit(eans)
+    check_ok = np.zeros(len(batch), dtype=bool)
+    if ean_shape_ok.any():
+        well_formed = eans[ean_shape_ok]
+        digits = (np.frombuffer(''.join(well_formed).encode('ascii'), dtype=np.uint8) - ord('0')).reshape(-1, 13).astype(np.int32)
+        expected = (10 - (digits[:, :12] @ EAN13_WEIGHTS) % 10) % 10
+        check_ok[ean_shape_ok] = expected == digits[:, 12]
+    reasons[~check_ok] = "invalid EAN-13 check digit"
+    reasons[~ean_shape_ok] = "EAN-13 must be 13 digits"
+
+    price_ok = np.isfinite(prices) & (prices >= 0) & (prices <= MAX_PRICE)
+    reasons[(reasons == '') & ~price_ok] = "invalid price"
+
+    name_lengths = np.fromiter((len(name) for name in names), dtype=np.int64, count=len(names))
+    name_ok = (name_lengths > 0) & (name_lengths <= MAX_NAME_LENGTH)
+    reasons[(reasons == '') & ~name_ok] = "product name must be 1 to 255 characters"
+
+    ok = reasons == ''
+    rounded = np.round(prices, 2)
+    valid = [(names[i], str(eans[i]), float(rounded[i])) for i in np.flatnonzero(ok)]
+    rejects = [(line_numbers[i], batch[i][2], reasons[i]) for i in np.flatnonzero(~ok)]
+    return valid, rejects
+
+def upsert(cursor, rows, report, statement_rows=500):
+    for start in range(0, len(rows), statement_rows):
+        chunk = list({row[1] : row for row in rows[start:start + statement_rows]}.values()) # Last row wins for a repeated EAN
+        eans = [row[1] for row in chunk]
+        # Index lookup on the unique `ean13` key, so the report can tell new products from updates
+        cursor.execute("SELECT COUNT(*) FROM products WHERE ean13 IN (" + ", ".join(["%s"] * len(eans)) + ")", eans)
+        existing = cursor.fetchone()[0]
+        sql = UPSERT_PREFIX + ", ".join(["(%s, %s, %s)"] * len(chunk)) + UPSERT_SUFFIX
+        cursor.execute(sql, [value for row in chunk for value in row])
+        # MySQL counts 1 per inserted row and 2 per updated row; unchanged rows count 0
+        inserted = len(chunk) - existing
+        updated = max(0, cursor.rowcount - inserted) // 2
+        report.inserted += inserted
+        report.updated += updated
+        report.unchanged += existing - updated
+
+def import_products(text_stream, connection, batch_size=2000, transaction_rows=10000, report=None):
+    # Pass a `report` to still have it when the import fails part way: earlier transactions stay
+    # committed, and its counts are brought back to what they hold
+    report = report if report is not None else ImportReport()
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    pending = 0
+    committed_counts = (report.inserted, report.updated, report.unchanged)
+    try:
+        connection.start_transaction()
+        for batch in read_batches(text_stream, batch_size):
+            report.rows += len(batch)
+            valid, rejects = validate(batch)
+            report.rejects.extend(rejects)
+            if valid:
+                upsert(cursor, valid, report)
+                pending += len(valid)
+            if pending >= transaction_rows:
+                connection.commit()
+                report.committed += pending
+                committed_counts = (report.inserted, report.updated, report.unchanged)
+                connection.start_transaction()
+                pending = 0
+        connection.commit()
+        report.committed += pending
+    except Exception:
+        connection.rollback()
+        report.inserted, report.updated, report.unchanged = committed_counts
+        raise
+    finally:
+        cursor.close()
+        report.seconds = time.perf_counter() - started
+    return report
+
+def write_rejects(report, path):
+    with open(path, 'w', newline='') as rejects_file:
+        writer = csv.writer(rejects_file)
+        writer.writerow(["line", "ean13", "reason"])
+        writer.writerows(report.rejects)
+
+if __name__ == "__main__":
+    import dal
+    parser = argparse.ArgumentParser(description="Bulk import products from a CSV file (columns: product_name, ean13, price)")
+    parser.add_argument("csv_file")
+    parser.add_argument("--rejects", help="Write rejected rows to this CSV file")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--transaction-rows", type=int, default=10000)
+    args = parser.parse_args()
+    with open(args.csv_file, 'r', newline='', encoding='utf-8-sig') as csv_file, dal.connection() as connection:
+        try:
+            report = import_products(csv_file, connection, args.batch_size, args.transaction_rows)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+    print(report.summary())
+    if args.rejects:
+        write_rejects(report, args.rejects)
+    else:
+        for line_no, ean13, reason in report.rejects[:20]:
+            print(f"  line {line_no}: {ean13 or '(empty)'} - {reason}")
+        if len(report.rejects) > 20:
+            print(f"  ... {len(report.rejects) - 20} more, use --rejects to save them all")
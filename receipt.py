@@ -0,0 +1,271 @@
+import os
+import time
+import socket
+import threading
+from collections import OrderedDict
+
+# Receipt rendering engine.
+#
+# A completed sale is turned once into a `Receipt` layout: plain values only, no Qt. The layout is
+# kept in a small LRU cache by transaction ID and rendered on demand into
+#
+#     text      fixed-width lines, for the on-screen receipt and the archive
+#     escpos    ESC/POS bytes for thermal printers (initialise, bold/double-height header, partial cut)
+#     pdf       a one-page PDF in the built-in Courier font, no extra dependency
+#
+# Each rendering is memoised on the layout, so a reprint costs nothing. `ReceiptEngine.produce`
+# does the whole job (layout, renderings, spooling) and is meant to run on a worker thread, so
+# checkout goes straight back to scanning. The on-screen ReceiptWidget is one consumer of the
+# result; the printer and the spool directory are others. Every sale's receipt is also in the
+# receipt archive, so spool files older than `spool_keep_days` are deleted, at the first receipt
+# after the lane starts and hourly after that.
+
+ESC = b"\x1b"
+GS = b"\x1d"
+ESCPOS_INIT = ESC + b"@"
+ESCPOS_CENTER = ESC + b"a\x01"
+ESCPOS_LEFT = ESC + b"a\x00"
+ESCPOS_BOLD_ON = ESC + b"E\x01"
+ESCPOS_BOLD_OFF = ESC + b"E\x00"
+ESCPOS_DOUBLE_HEIGHT = GS + b"!\x01"
+ESCPOS_NORMAL_SIZE = GS + b"!\x00"
+ESCPOS_FEED_AND_CUT = GS + b"V\x42\x03" # Feed 3 lines, then partial cut
+
+class Receipt:
+    __slots__ = ("transaction_id", "issued_at", "cashier", "store_name", "store_address", "currency", "lines",
+        "total", "amount_paid", "footer", "outputs")
+
+    def __init__(self, transaction_id, issued_at, cashier, store_name, store_address, currency, lines, total, amount_paid, footer):
+        self.transaction_id = transaction_id
+        self.issued_at = issued_at # "YYYY-MM-DD HH:MM:SS"
+        self.cashier = cashier
+        self.store_name = store_name
+        self.store_address = store_address # Format: list of lines
+        self.currency = currency
+        self.lines = lines # Format: list of (item_name, quantity, price_per_unit, ean13)
+        self.total = total
+        self.amount_paid = amount_paid
+        self.footer = footer # Format: list of lines
+        self.outputs = dict() # Format: {format : rendered str or bytes}
+
+    @property
+    def balance(self):
+        return self.amount_paid - self.total
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != "outputs"}
+
+    @classmethod
+    def from_dict(cls, values):
+        values = dict(values)
+        values["lines"] = [tuple(line) for line in values["lines"]]
+        return cls(**values)
+
+    def render(self, output_format, width=42):
+        key = (output_format, width)
+        if key not in self.outputs:
+            self.outputs[key] = RENDERERS[output_format](self, width)
+        return self.outputs[key]
+
+def layout(sale, amount_paid, cashier, config):
+    # `sale` is the journal record built by process_payment
+    return Receipt(
+        transaction_id=sale["transaction_id"],
+        issued_at=f"{sale['transaction_date']} {sale.get('transaction_time') or ''}".strip(),
+        cashier=cashier,
+        store_name=config.get("company_name", ""),
+        store_address=config.get("company_address", "").split("\n"),
+        currency=config.get("currency_code", ""),
+        lines=[tuple(line) for line in sale["items"]],
+        total=round(sale["total_amount"], 2),
+        amount_paid=round(amount_paid, 2),
+        footer=config.get("receipt_footer", "All prices are inclusive to 6% service tax\nThank you for your purchase!").split("\n")
+    )
+
+# Renderers
+
+def _wrap(text, width):
+    words = text.split()
+    lines = [""]
+    for word in words:
+        while len(word) > width: # A single word longer than the line is cut
+            if lines[-1]:
+                lines.append("")
+            lines[-1] = word[:width]
+            word = word[width:]
+            lines.append("")
+        if not lines[-1]:
+            lines[-1] = word
+        elif len(lines[-1]) + 1 + len(word) <= width:
+            lines[-1] += " " + word
+        else:
+            lines.append(word)
+    return [line for line in lines if line] or [""]
+
+def _columns(left, right, width):
+    return left[:max(0, width - len(right) - 1)].ljust(width - len(right)) + right
+
+def _text_sections(receipt, width):
+    # Returns (header lines, body lines, totals lines, footer lines); shared by every renderer
+    header = [receipt.store_name.center(width).rstrip()] + [line.center(width).rstrip() for line in receipt.store_address if line]
+    body = [
+        f"Date: {receipt.issued_at}",
+        f"Receipt #: {receipt.transaction_id}",
+        f"Cashier: {receipt.cashier}",
+        "-" * width,
+        _columns("Item", f"Qty {'Amount':>10}", width),
+    ]
+    for item_name, quantity, price_per_unit, ean13 in receipt.lines:
+        amount = f"{quantity:>3} {quantity * price_per_unit:>10.2f}"
+        name_lines = _wrap(item_name, width - len(amount) - 1)
+        body.append(_columns(name_lines[0], amount, width))
+        body.extend("  " + line for line in name_lines[1:])
+    body.append("-" * width)
+    totals = [
+        _columns("Total", f"{receipt.currency}{receipt.total:.2f}", width),
+        _columns("Amount Paid", f"{receipt.currency}{receipt.amount_paid:.2f}", width),
+        _columns("Balance", f"{receipt.currency}{receipt.balance:.2f}", width),
+    ]
+    footer = [line.center(width).rstrip() for line in receipt.footer if line]
+    return header, body, totals, footer
+
+def render_text(receipt, width=42):
+    header, body, totals, footer = _text_sections(receipt, width)
+    return "\n".join(header + [""] + body + totals + [""] + footer) + "\n"
+
+def render_escpos(receipt, width=42):
+    header, body, totals, footer = _text_sections(receipt, width)
+    def encode(lines):
+        return "".join(line + "\n" for line in lines).encode("cp437", errors="replace")
+    return b"".join([
+        ESCPOS_INIT,
+        ESCPOS_CENTER, ESCPOS_BOLD_ON, ESCPOS_DOUBLE_HEIGHT, encode(header[:1]), ESCPOS_NORMAL_SIZE, ESCPOS_BOLD_OFF,
+        encode(header[1:] + [""]),
+        ESCPOS_LEFT, encode(body),
+        ESCPOS_BOLD_ON, encode(totals[:1]), ESCPOS_BOLD_OFF, encode(totals[1:] + [""]),
+        ESCPOS_CENTER, encode(footer),
+        ESCPOS_FEED_AND_CUT,
+    ])
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def render_pdf(receipt, width=42):
+    # One page sized to the receipt: 80 mm wide, 9 pt Courier (5.4 pt per character)
+    lines = render_text(receipt, width).rstrip("\n").split("\n")
+    font_size, leading, margin = 9, 11, 14
+    page_width = max(227, int(width * font_size * 0.6) + 2 * margin) # 227 pt = 80 mm
+    page_height = len(lines) * leading + 2 * margin
+    text = [f"BT /F1 {font_size} Tf {leading} TL {margin} {page_height - margin - font_size} Td"]
+    for line in lines:
+        text.append(f"({_pdf_escape(line)}) Tj T*")
+    text.append("ET")
+    stream = "\n".join(text).encode("latin-1", errors="replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width} {page_height}] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>".encode(),
+        f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+RENDERERS = {"text": render_text, "escpos": render_escpos, "pdf": render_pdf}
+
+# Output
+
+def send_to_printer(data, printer):
+    # `printer` is a device or file path (/dev/usb/lp0, \\\\host\\share) or tcp://host:port (raw port 9100)
+    if printer.startswith("tcp://"):
+        host, _, port = printer[len("tcp://"):].partition(":")
+        with socket.create_connection((host, int(port or 9100)), timeout=5) as connection:
+            connection.sendall(data)
+    else:
+        with open(printer, "wb") as device:
+            device.write(data)
+
+class ReceiptEngine:
+    def __init__(self, config, spool_dir=None, spool_formats=("text",), printer=None, width=42, cache_size=50, spool_keep_days=7):
+        self.config = config
+        self.spool_dir = spool_dir
+        self.spool_formats = tuple(spool_formats)
+        self.spool_keep_days = spool_keep_days
+        self.spool_pruned_at = None # time.monotonic() of the last prune_spool
+        self.printer = printer
+        self.width = width
+        self.cache_size = cache_size
+        self.cache = OrderedDict() # Format: {transaction_id : Receipt}, least recently used first
+        self.lock = threading.Lock()
+
+    def remember(self, receipt):
+        with self.lock:
+            self.cache[receipt.transaction_id] = receipt
+            self.cache.move_to_end(receipt.transaction_id)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def get(self, transaction_id):
+        with self.lock:
+            receipt = self.cache.get(transaction_id)
+            if receipt is not None:
+                self.cache.move_to_end(transaction_id)
+            return receipt
+
+    def spool(self, receipt):
+        extensions = {"text": "txt", "escpos": "bin", "pdf": "pdf"}
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            for output_format in self.spool_formats:
+                data = receipt.render(output_format, self.width)
+                path = os.path.join(self.spool_dir, f"{receipt.transaction_id}.{extensions[output_format]}")
+                with open(path, "w" if isinstance(data, str) else "wb") as spool_file:
+                    spool_file.write(data)
+        if self.printer:
+            send_to_printer(receipt.render("escpos", self.width), self.printer)
+
+    def prune_spool(self):
+        # Returns the number of spool files deleted
+        cutoff = time.time() - self.spool_keep_days * 86400
+        deleted = 0
+        with os.scandir(self.spool_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith((".txt", ".bin", ".pdf")) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    deleted += 1
+        return deleted
+
+    def produce(self, sale, amount_paid, cashier):
+        # Runs on a worker thread: layout, text for the screen, then spool and print
+        receipt = layout(sale, amount_paid, cashier, self.config)
+        receipt.render("text", self.width)
+        self.remember(receipt)
+        try:
+            self.spool(receipt)
+        except OSError as e:
+            print(f"Unable to spool or print receipt #{receipt.transaction_id}")
+            print(e)
+        if self.spool_dir and self.spool_keep_days and (self.spool_pruned_at is None or time.monotonic() - self.spool_pruned_at >= 3600):
+            self.spool_pruned_at = time.monotonic()
+            try:
+                self.prune_spool()
+            except OSError as e:
+                print(f"Unable to prune the receipt spool '{self.spool_dir}'")
+                print(e)
+        return receipt
+
+    def reprint(self, receipt):
+        # Runs on a worker thread; the layout and its renderings are already cached
+        self.remember(receipt)
+        if self.printer:
+            send_to_printer(receipt.render("escpos", self.width), self.printer)
+        return receipt
@@ -0,0 +1,116 @@
+import json
+import zlib
+import argparse
+from datetime import date
+from receipt import Receipt, layout
+
+# Receipt archive: one compressed snapshot of the receipt layout per sale.
+#
+# The journal flusher calls the hook from `archiver` inside the same commit that inserts a batch of
+# sales (next to rollups.apply), so every committed sale has its receipt. A snapshot is the
+# Receipt's values as compact JSON, zlib-compressed, typically 300-600 bytes. Reprinting any
+# receipt is then one primary key read and a decompress: no join over transaction_items, and the
+# store details and amount paid are exactly what the customer got.
+#
+# Sales committed before the archive existed can be backfilled from the raw tables:
+#     python receipt_archive.py backfill --from 2025-01-01 --to 2025-12-31
+
+ARCHIVE_INSERT = "INSERT INTO receipt_archive (transaction_id, receipt_date, snapshot) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE transaction_id = transaction_id"
+COMPRESSION_LEVEL = 6
+
+def pack(receipt):
+    return zlib.compress(json.dumps(receipt.to_dict(), separators=(',', ':')).encode('utf-8'), COMPRESSION_LEVEL)
+
+def unpack(snapshot):
+    return Receipt.from_dict(json.loads(zlib.decompress(snapshot)))
+
+def snapshot_row(sale, config):
+    # Journal records from before the archive carry neither the amount paid nor the cashier's name
+    receipt = layout(sale, sale.get('amount_paid', sale['total_amount']), sale.get('cashier_name', sale['cashier_username']), config)
+    return (sale['transaction_id'], sale['transaction_date'], pack(receipt))
+
+def archiver(config):
+    # Returns the on_commit hook: Callable(cursor, sales)
+    def archive(cursor, sales):
+        if sales:
+            cursor.executemany(ARCHIVE_INSERT, [snapshot_row(sale, config) for sale in sales])
+    return archive
+
+# Reads: primary key and (receipt_date, transaction_id) index lookups
+
+def fetch(db, transaction_id):
+    row = db.fetchone("SELECT snapshot FROM receipt_archive WHERE transaction_id = %s", (transaction_id,), prepared=True)
+    return unpack(row[0]) if row else None
+
+def on_date(db, receipt_date, limit=500):
+    rows = db.fetchall("SELECT transaction_id FROM receipt_archive WHERE receipt_date = %s ORDER BY transaction_id LIMIT %s", (receipt_date, limit), prepared=True)
+    return [transaction_id for (transaction_id,) in rows]
+
+def backfill(db, cnx, date_from, date_to, config, batch_size=1000, timeout_ms=None):
+    # Rebuilds snapshots for committed sales that have none, committing on `cnx` after every
+    # `batch_size` sales: an interrupted run loses one batch at most and the next run picks up the
+    # sales still without a snapshot. Returns the number archived. The amount paid was never
+    # stored, so backfilled receipts show the exact amount. Years of sales stream for longer than
+    # the pool's statement timeout: `timeout_ms` lifts it for this read.
+    period = (date_from, date_to)
+    hint = f"/*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */ " if timeout_ms else ""
+    sales = dict()
+    archived = 0
+    def write():
+        cnx.start_transaction()
+        cur = cnx.cursor()
+        try:
+            cur.executemany(ARCHIVE_INSERT, [snapshot_row(sale, config) for sale in sales.values()])
+            cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cur.close()
+        sales.clear()
+    for transaction_id, transaction_date, transaction_time, total_amount, cashier_username, full_name, item_name, quantity, price_per_unit, ean13 in db.stream(
+            f"""SELECT {hint}t.transaction_id, t.transaction_date, t.transaction_time, t.total_amount, t.cashier_username, u.full_name,
+                ti.item_name, ti.quantity, ti.price_per_unit, ti.ean13
+            FROM transactions t
+            LEFT JOIN receipt_archive r ON r.transaction_id = t.transaction_id
+            LEFT JOIN users u ON u.username = t.cashier_username
+            LEFT JOIN transaction_items ti ON ti.transaction_id = t.transaction_id AND ti.transaction_date = t.transaction_date
+            WHERE t.transaction_date BETWEEN %s AND %s AND r.transaction_id IS NULL
+            ORDER BY t.transaction_id, ti.item_id""", period):
+        sale = sales.get(transaction_id)
+        if sale is None:
+            if len(sales) >= batch_size:
+                archived += len(sales)
+                write()
+            sale = sales[transaction_id] = {
+                "transaction_id": transaction_id,
+                "transaction_date": str(transaction_date),
+                "transaction_time": str(transaction_time) if transaction_time is not None else None,
+                "total_amount": float(total_amount or 0),
+                "cashier_username": cashier_username,
+                "cashier_name": full_name or cashier_username,
+                "items": []
+            }
+        if item_name is not None:
+            sale["items"].append((item_name, quantity, float(price_per_unit), ean13))
+    if sales:
+        archived += len(sales)
+        write()
+    return archived
+
+if __name__ == "__main__":
+    import dal
+    from conn import CONFIG
+    parser = argparse.ArgumentParser(description="Maintain the receipt archive")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First day (default: the first sale)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--batch-size", type=int, default=1000, help="Sales per commit")
+    args = parser.parse_args()
+    date_from = args.date_from or dal.fetchone("SELECT MIN(transaction_date) FROM transactions")[0]
+    if date_from is None:
+        print("No sales to archive")
+    else:
+        with dal.connection() as cnx:
+            archived = backfill(dal, cnx, date_from, args.date_to, CONFIG, args.batch_size, timeout_ms=CONFIG.get('receipt_backfill_timeout_ms', 3600000))
+        print(f"Archived {archived} receipts from {date_from} to {args.date_to}")
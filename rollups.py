@@ -0,0 +1,164 @@
+import time
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+import mysql.connector
+
+# Daily sales rollups behind the admin dashboard.
+#
+# The journal flusher calls `apply` inside the same commit that inserts a batch of sales, so the
+# rollup tables never drift from `transactions`/`transaction_items`. Deltas are summed per key
+# for the whole batch first, so each rollup row is upserted once per batch rather than once per
+# sale; this keeps lanes from queueing on the lock of today's `sales_daily` row.
+#
+# `rebuild` recomputes a date range from the raw tables, e.g. after importing history:
+#     python rollups.py rebuild --from 2025-01-01 --to 2025-12-31
+# Months moved to cold storage (cold_storage.py) are skipped: their rollups were built while the
+# sales were live and are kept.
+#
+# A rebuild runs while the lanes keep selling. `apply` starts with the `sales_daily` row of every
+# day in its batch, so that row is the day's lock: `rebuild` first takes it for every day in the
+# range (creating rows that do not exist yet, so no gap locks are needed), in the same ascending
+# order. A flush already holding a day commits before the rebuild reads it; one arriving later
+# waits and then adds its sales on top of the rebuilt rows. A waiting flush has already inserted
+# its `transactions` rows, so the rebuild must not lock those: `rebuild_range` runs it under READ
+# COMMITTED, where its reads of the raw tables are consistent reads that take no locks (under
+# REPEATABLE READ, CREATE ... SELECT takes shared locks and deadlocks with that flush). Should
+# InnoDB still pick the rebuild as a deadlock victim, it is run again.
+
+DAILY_UPSERT = """INSERT INTO sales_daily (sales_date, transaction_count, item_count, revenue) VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE transaction_count = transaction_count + VALUES(transaction_count), item_count = item_count + VALUES(item_count), revenue = revenue + VALUES(revenue)"""
+HOURLY_UPSERT = """INSERT INTO sales_hourly (sales_date, sales_hour, transaction_count, item_count, revenue) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE transaction_count = transaction_count + VALUES(transaction_count), item_count = item_count + VALUES(item_count), revenue = revenue + VALUES(revenue)"""
+CASHIER_UPSERT = """INSERT INTO sales_by_cashier (sales_date, cashier_username, transaction_count, item_count, revenue) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE transaction_count = transaction_count + VALUES(transaction_count), item_count = item_count + VALUES(item_count), revenue = revenue + VALUES(revenue)"""
+PRODUCT_UPSERT = """INSERT INTO sales_by_product (sales_date, ean13, item_name, quantity, revenue) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE item_name = VALUES(item_name), quantity = quantity + VALUES(quantity), revenue = revenue + VALUES(revenue)"""
+DEADLOCK = 1213
+REBUILD_ATTEMPTS = 5
+
+def aggregate(sales):
+    daily = defaultdict(lambda: [0, 0, 0.0])
+    hourly = defaultdict(lambda: [0, 0, 0.0])
+    cashier = defaultdict(lambda: [0, 0, 0.0])
+    product = defaultdict(lambda: ['', 0, 0.0])
+    for sale in sales:
+        sales_date = sale['transaction_date']
+        item_count = sum(item[1] for item in sale['items'])
+        keys = [(daily, sales_date), (cashier, (sales_date, sale['cashier_username']))]
+        if sale.get('transaction_time'):
+            keys.append((hourly, (sales_date, int(sale['transaction_time'][:2]))))
+        for table, key in keys:
+            table[key][0] += 1
+            table[key][1] += item_count
+            table[key][2] += sale['total_amount']
+        for item_name, quantity, price_per_unit, ean13 in sale['items']:
+            line = product[(sales_date, ean13)]
+            line[0] = item_name
+            line[1] += quantity
+            line[2] += quantity * price_per_unit
+    return daily, hourly, cashier, product
+
+def apply(cursor, sales):
+    if not sales:
+        return
+    daily, hourly, cashier, product = aggregate(sales)
+    # Sorted keys give every lane the same lock order, so concurrent flushers cannot deadlock
+    cursor.executemany(DAILY_UPSERT, [(key, *row) for key, row in sorted(daily.items())])
+    if hourly:
+        cursor.executemany(HOURLY_UPSERT, [(*key, *row) for key, row in sorted(hourly.items())])
+    cursor.executemany(CASHIER_UPSERT, [(*key, *row) for key, row in sorted(cashier.items())])
+    cursor.executemany(PRODUCT_UPSERT, [(*key, *row) for key, row in sorted(product.items())])
+
+def lock_days(cursor, date_from, date_to):
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    # A no-op upsert takes the row lock whether or not the row existed
+    cursor.executemany("INSERT INTO sales_daily (sales_date) VALUES (%s) ON DUPLICATE KEY UPDATE sales_date = sales_date", [(day,) for day in days])
+
+def rebuild(cursor, date_from, date_to):
+    # Run it through `rebuild_range`, which provides the transaction it needs
+    period = (date_from, date_to)
+    lock_days(cursor, date_from, date_to)
+    for table in ('sales_daily', 'sales_hourly', 'sales_by_cashier', 'sales_by_product'):
+        cursor.execute(f"DELETE FROM {table} WHERE sales_date BETWEEN %s AND %s", period)
+    # One pass over the period's sales, then every per-sale rollup is grouped from that
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS rollup_source")
+    cursor.execute("""CREATE TEMPORARY TABLE rollup_source AS
+        SELECT t.transaction_id, t.transaction_date, HOUR(t.transaction_time) AS sales_hour, t.cashier_username, t.total_amount,
+            (SELECT COALESCE(SUM(ti.quantity), 0) FROM transaction_items ti WHERE ti.transaction_id = t.transaction_id AND ti.transaction_date = t.transaction_date) AS item_count
+        FROM transactions t WHERE t.transaction_date BETWEEN %s AND %s""", period)
+    cursor.execute("""INSERT INTO sales_daily (sales_date, transaction_count, item_count, revenue)
+        SELECT transaction_date, COUNT(*), SUM(item_count), SUM(total_amount) FROM rollup_source GROUP BY transaction_date""")
+    cursor.execute("""INSERT INTO sales_hourly (sales_date, sales_hour, transaction_count, item_count, revenue)
+        SELECT transaction_date, sales_hour, COUNT(*), SUM(item_count), SUM(total_amount) FROM rollup_source
+        WHERE sales_hour IS NOT NULL GROUP BY transaction_date, sales_hour""")
+    cursor.execute("""INSERT INTO sales_by_cashier (sales_date, cashier_username, transaction_count, item_count, revenue)
+        SELECT transaction_date, cashier_username, COUNT(*), SUM(item_count), SUM(total_amount) FROM rollup_source
+        GROUP BY transaction_date, cashier_username""")
+    cursor.execute("""INSERT INTO sales_by_product (sales_date, ean13, item_name, quantity, revenue)
+        SELECT t.transaction_date, ti.ean13, MAX(ti.item_name), SUM(ti.quantity), SUM(ti.quantity * ti.price_per_unit)
+        FROM transactions t JOIN transaction_items ti ON ti.transaction_id = t.transaction_id AND ti.transaction_date = t.transaction_date
+        WHERE t.transaction_date BETWEEN %s AND %s AND ti.transaction_date BETWEEN %s AND %s GROUP BY t.transaction_date, ti.ean13""", period + period)
+    cursor.execute("DROP TEMPORARY TABLE rollup_source")
+
+def rebuild_range(cnx, date_from, date_to, attempts=REBUILD_ATTEMPTS):
+    # One READ COMMITTED transaction per attempt on `cnx`; each statement reads the latest commits,
+    # so the sales read include every flush that held a day before lock_days got it
+    for attempt in range(1, attempts + 1):
+        cnx.start_transaction(isolation_level='READ COMMITTED')
+        cursor = cnx.cursor()
+        try:
+            rebuild(cursor, date_from, date_to)
+            cnx.commit()
+            return
+        except mysql.connector.Error as e:
+            cnx.rollback()
+            if e.errno != DEADLOCK or attempt == attempts:
+                raise
+            print(f"Deadlocked with a lane's flush, rebuilding {date_from} to {date_to} again")
+            time.sleep(attempt)
+        finally:
+            cursor.close()
+
+# Dashboard reads: primary key lookups, cost independent of history size
+
+def daily_summary(db, sales_date):
+    row = db.fetchone("SELECT transaction_count, item_count, revenue FROM sales_daily WHERE sales_date = %s", (sales_date,), prepared=True)
+    transaction_count, item_count, revenue = row or (0, 0, 0)
+    return {"transaction_count": transaction_count, "item_count": item_count, "revenue": float(revenue)}
+
+def hourly_summary(db, sales_date):
+    rows = db.fetchall("SELECT sales_hour, transaction_count, revenue FROM sales_hourly WHERE sales_date = %s ORDER BY sales_hour", (sales_date,), prepared=True)
+    return [{"hour": hour, "transaction_count": transaction_count, "revenue": float(revenue)} for hour, transaction_count, revenue in rows]
+
+def cashier_summary(db, sales_date):
+    rows = db.fetchall("SELECT cashier_username, transaction_count, revenue FROM sales_by_cashier WHERE sales_date = %s ORDER BY revenue DESC", (sales_date,), prepared=True)
+    return [{"cashier_username": cashier, "transaction_count": transaction_count, "revenue": float(revenue)} for cashier, transaction_count, revenue in rows]
+
+def top_products(db, sales_date, limit=5):
+    rows = db.fetchall("SELECT item_name, ean13, quantity, revenue FROM sales_by_product WHERE sales_date = %s ORDER BY quantity DESC LIMIT %s", (sales_date, limit), prepared=True)
+    return [{"item_name": item_name, "ean13": ean13, "quantity": int(quantity), "revenue": float(revenue)} for item_name, ean13, quantity, revenue in rows]
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import dal
+    from cold_storage import ColdStorage
+    from conn import CONFIG
+    parser = argparse.ArgumentParser(description="Maintain the sales rollup tables")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First day (default: the first live sale)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=date.today())
+    args = parser.parse_args()
+    first_day = args.date_from or dal.fetchone("SELECT MIN(transaction_date) FROM transactions")[0]
+    if first_day is None:
+        print("No sales to roll up")
+        sys.exit(0)
+    storage = ColdStorage(os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG.get('cold_storage_path', 'archive/sales')))
+    with dal.connection() as cnx:
+        for month, date_from, date_to in storage.segments(first_day, args.date_to):
+            if month is not None:
+                print(f"Skipped {month:%Y-%m}, it is in cold storage")
+                continue
+            rebuild_range(cnx, date_from, date_to)
+            print(f"Rebuilt sales rollups from {date_from} to {date_to}")
@@ -0,0 +1,192 @@
+import bisect
+import heapq
+import threading
+import unicodedata
+import re
+from collections import defaultdict
+
+# In-memory product search for name lookups and autocomplete.
+#
+# - Prefix matching: the vocabulary of name tokens is kept sorted, so all tokens starting with
+#   a prefix form one contiguous range found with bisect. This is a trie flattened into an array:
+#   the same lookups as a node-per-character trie at a fraction of the memory for a 50k catalog.
+# - Typo tolerance: every token is indexed by its character trigrams. A query token that matches
+#   nothing exactly is compared against tokens sharing trigrams with it and accepted within a
+#   small edit distance (adjacent swaps count as one edit).
+# - Digit-only queries also match EAN-13 prefixes.
+#
+# Every query token must match (the last one as a prefix). Results are ranked by match quality,
+# then by shorter name. The index is updated incrementally with `add` and `remove`.
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+MAX_PREFIX_CANDIDATES = 2000
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize(text))
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b, limit):
+    # Edit distance counting a swap of two adjacent characters as one edit ("itme" -> "item"),
+    # giving up (returning limit + 1) as soon as it must exceed `limit`
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+class ProductSearchIndex:
+    EXACT, PREFIX, FUZZY = 3.0, 2.0, 1.0
+
+    def __init__(self):
+        self.products = dict() # Format: {ean13 : (product_name, ean13, price)}
+        self.product_tokens = dict() # Format: {ean13 : tuple of tokens}
+        self.postings = defaultdict(set) # Format: {token : set of ean13}
+        self.vocabulary = [] # Sorted tokens
+        self.token_trigrams = defaultdict(set) # Format: {trigram : set of tokens}
+        self.eans = [] # Sorted EAN-13s
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.products)
+
+    def add(self, product):
+        product_name, ean13, price = product[:3]
+        with self.lock:
+            if ean13 in self.products:
+                if self.products[ean13][0] == product_name:
+                    self.products[ean13] = (product_name, ean13, price)
+                    return
+                self.remove(ean13)
+            tokens = tuple(dict.fromkeys(tokenize(product_name)))
+            self.products[ean13] = (product_name, ean13, price)
+            self.product_tokens[ean13] = tokens
+            for token in tokens:
+                if token not in self.postings:
+                    bisect.insort(self.vocabulary, token)
+                    for trigram in trigrams(token):
+                        self.token_trigrams[trigram].add(token)
+                self.postings[token].add(ean13)
+            bisect.insort(self.eans, ean13)
+
+    def remove(self, ean13):
+        with self.lock:
+            if ean13 not in self.products:
+                return
+            del self.products[ean13]
+            for token in self.product_tokens.pop(ean13):
+                owners = self.postings[token]
+                owners.discard(ean13)
+                if not owners:
+                    del self.postings[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                    for trigram in trigrams(token):
+                        self.token_trigrams[trigram].discard(token)
+            del self.eans[bisect.bisect_left(self.eans, ean13)]
+
+    def rebuild(self, products):
+        # Built aside, then swapped in under the lock: searches meanwhile see the old index, whole
+        fresh = ProductSearchIndex()
+        for product in products:
+            fresh.add(product)
+        with self.lock:
+            self.products = fresh.products
+            self.product_tokens = fresh.product_tokens
+            self.postings = fresh.postings
+            self.vocabulary = fresh.vocabulary
+            self.token_trigrams = fresh.token_trigrams
+            self.eans = fresh.eans
+
+    def _prefix_range(self, sorted_list, prefix):
+        start = bisect.bisect_left(sorted_list, prefix)
+        end = bisect.bisect_left(sorted_list, prefix + '\uffff')
+        return start, end
+
+    def _fuzzy_tokens(self, token):
+        limit = 1 if len(token) <= 5 else 2
+        query_trigrams = trigrams(token)
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for candidate in self.token_trigrams.get(trigram, ()):
+                shared[candidate] += 1
+        # Tokens within `limit` edits still share most trigrams; skip the ones that cannot match
+        needed = max(1, len(query_trigrams) - 3 * limit)
+        matches = dict()
+        for candidate, count in shared.items():
+            if count >= needed:
+                distance = edit_distance(token, candidate, limit)
+                if distance <= limit:
+                    matches[candidate] = 1.0 - distance / (limit + 1)
+        return matches
+
+    def _match_token(self, token, is_prefix, within=None):
+        # Returns [(score, set of ean13)] for one query token, best tier first.
+        # `within` narrows prefix matches to products the other query tokens already matched.
+        tiers = []
+        exact = self.postings.get(token)
+        if exact:
+            tiers.append((self.EXACT, exact))
+        if is_prefix:
+            start, end = self._prefix_range(self.vocabulary, token)
+            prefixed = set()
+            for candidate in self.vocabulary[start:end]:
+                if candidate != token:
+                    prefixed |= self.postings[candidate] if within is None else self.postings[candidate] & within
+                    if within is None and len(prefixed) >= MAX_PREFIX_CANDIDATES: # Very short prefixes: the closest tokens are enough
+                        break
+            if prefixed:
+                tiers.append((self.PREFIX, prefixed))
+        if not tiers and len(token) >= 3:
+            for candidate, similarity in sorted(self._fuzzy_tokens(token).items(), key=lambda entry: -entry[1]):
+                tiers.append((self.FUZZY * similarity, self.postings[candidate]))
+        return tiers
+
+    def search(self, query, limit=10):
+        # Returns up to `limit` products as (product_name, ean13, price, score), best first
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self.lock:
+            # Candidates must match every token; set intersections keep that step in C
+            token_tiers = [self._match_token(token, is_prefix=False) for token in tokens[:-1]]
+            candidates = None
+            for tiers in sorted(token_tiers, key=lambda tiers: sum(len(matched) for score, matched in tiers)):
+                matched = set().union(*(matched for score, matched in tiers))
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    break
+            if candidates is None or candidates:
+                # The last token is still being typed, so it also matches as a prefix
+                token_tiers.append(self._match_token(tokens[-1], is_prefix=True, within=candidates))
+                matched = set().union(*(matched for score, matched in token_tiers[-1]))
+                candidates = matched if candidates is None else candidates & matched
+            totals = dict.fromkeys(candidates or (), 0.0)
+            for tiers in token_tiers:
+                for ean13 in totals:
+                    for score, matched in tiers:
+                        if ean13 in matched:
+                            totals[ean13] += score
+                            break
+            if query.strip().isdigit():
+                start, end = self._prefix_range(self.eans, query.strip())
+                for ean13 in self.eans[start:min(end, start + limit)]:
+                    totals[ean13] = totals.get(ean13, 0.0) + self.EXACT * len(tokens)
+            products = self.products
+            ranked = heapq.nsmallest(limit, totals.items(), key=lambda entry: (-entry[1], len(products[entry[0]][0]), products[entry[0]][0]))
+            return [(*products[ean13], round(score, 3)) for ean13, score in ranked]
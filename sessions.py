@@ -0,0 +1,220 @@
+import os
+import time
+import sqlite3
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+
+# Server-side sessions for the admin server, replacing flask_session's filesystem store, which
+# wrote one file per session per request and never removed them.
+#
+# - `LRUSessionStore`: in-process dict with LRU and TTL eviction. Fastest, but each worker process
+#   has its own copy, so use it when the admin server runs as a single process.
+# - `SQLiteSessionStore`: one embedded SQLite file in WAL mode that all workers on a machine share.
+#
+# Both stores expire sessions on a background thread, so storage stays bounded. Requests that
+# never touch the session do no session I/O at all, and unchanged sessions are not rewritten.
+
+SERIALIZER = TaggedJSONSerializer() # Same format Flask uses for cookie sessions: handles bytes, tuples, datetimes
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class SessionStore(ABC):
+    def __init__(self, ttl, sweep_interval):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.sweeper_pid = None
+        self.sweeper_lock = threading.Lock()
+
+    def start_sweeper(self):
+        # One expiry thread per process; a forked worker starts its own on first use
+        if self.sweeper_pid == os.getpid():
+            return
+        with self.sweeper_lock:
+            if self.sweeper_pid == os.getpid():
+                return
+            self.sweeper_pid = os.getpid()
+            threading.Thread(target=self.sweep_forever, name="session-sweeper", daemon=True).start()
+
+    def sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.expire()
+            except Exception as e:
+                print(f"Unable to expire old sessions: {e}")
+
+    @abstractmethod
+    def load(self, sid):
+        pass
+
+    @abstractmethod
+    def save(self, sid, data):
+        pass
+
+    @abstractmethod
+    def touch(self, sid):
+        pass
+
+    @abstractmethod
+    def delete(self, sid):
+        pass
+
+    @abstractmethod
+    def expire(self):
+        pass
+
+class LRUSessionStore(SessionStore):
+    def __init__(self, max_entries=10000, ttl=43200, sweep_interval=60):
+        super().__init__(ttl, sweep_interval)
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # Format: {sid : (serialized data, expires)}, least recently used first
+        self.lock = threading.Lock()
+
+    def load(self, sid):
+        with self.lock:
+            entry = self.entries.get(sid)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires <= time.time():
+                del self.entries[sid]
+                return None
+            self.entries.move_to_end(sid)
+        # Stored serialized, so a request mutating its session cannot change the stored copy
+        return SERIALIZER.loads(data)
+
+    def save(self, sid, data):
+        serialized = SERIALIZER.dumps(data)
+        with self.lock:
+            self.entries[sid] = (serialized, time.time() + self.ttl)
+            self.entries.move_to_end(sid)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def touch(self, sid):
+        with self.lock:
+            entry = self.entries.get(sid)
+            if entry is not None:
+                self.entries[sid] = (entry[0], time.time() + self.ttl)
+
+    def delete(self, sid):
+        with self.lock:
+            self.entries.pop(sid, None)
+
+    def expire(self):
+        now = time.time()
+        with self.lock:
+            expired = [sid for sid, (data, expires) in self.entries.items() if expires <= now]
+            for sid in expired:
+                del self.entries[sid]
+        return len(expired)
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path, ttl=43200, sweep_interval=60):
+        super().__init__(ttl, sweep_interval)
+        self.path = path
+        self.local = threading.local() # One SQLite connection per thread
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as cnx:
+            cnx.execute("PRAGMA journal_mode=WAL")
+            cnx.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+            cnx.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def _connect(self):
+        cnx = getattr(self.local, 'cnx', None)
+        if cnx is None or self.local.pid != os.getpid():
+            cnx = sqlite3.connect(self.path, timeout=5)
+            cnx.execute("PRAGMA synchronous=NORMAL") # WAL + NORMAL: no fsync per write, still crash-safe
+            self.local.cnx = cnx
+            self.local.pid = os.getpid()
+        return cnx
+
+    def load(self, sid):
+        row = self._connect().execute("SELECT data, expires FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return SERIALIZER.loads(row[0])
+
+    def save(self, sid, data):
+        with self._connect() as cnx:
+            cnx.execute("INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)", (sid, SERIALIZER.dumps(data), time.time() + self.ttl))
+
+    def touch(self, sid):
+        # Extends the expiry only once half the TTL has passed, so reads rarely turn into writes
+        with self._connect() as cnx:
+            cnx.execute("UPDATE sessions SET expires = ? WHERE sid = ? AND expires < ?", (time.time() + self.ttl, sid, time.time() + self.ttl / 2))
+
+    def delete(self, sid):
+        with self._connect() as cnx:
+            cnx.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def expire(self):
+        with self._connect() as cnx:
+            return cnx.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),)).rowcount
+
+class StoreSessionInterface(SessionInterface):
+    session_class = ServerSideSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        self.store.start_sweeper()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load(sid)
+            if data is not None:
+                return self.session_class(data, sid=sid)
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if not session.new:
+                # Emptied session: remove it on both sides
+                self.store.delete(session.sid)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+        if session.modified:
+            self.store.save(session.sid, dict(session))
+        elif not session.new:
+            self.store.touch(session.sid)
+        if session.new or session.modified or session.permanent:
+            response.set_cookie(
+                cookie_name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+def create_store(config, app_path):
+    # Builds the store named by `session_backend` in config.json: "sqlite" (default) or "lru"
+    ttl = int(config.get('session_ttl', 43200))
+    sweep_interval = int(config.get('session_sweep_interval', 60))
+    backend = config.get('session_backend', 'sqlite')
+    if backend == 'sqlite':
+        path = os.path.join(app_path, config.get('session_sqlite_path', 'sessions/sessions.sqlite'))
+        return SQLiteSessionStore(path, ttl=ttl, sweep_interval=sweep_interval)
+    if backend == 'lru':
+        return LRUSessionStore(max_entries=int(config.get('session_max_entries', 10000)), ttl=ttl, sweep_interval=sweep_interval)
+    raise ValueError(f"Unknown session_backend '{backend}' in config.json, expected 'lru' or 'sqlite'")
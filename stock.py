@@ -0,0 +1,217 @@
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+# Stock levels kept in step with the sales, without lanes queueing on popular products.
+#
+# Lanes never update `products`. The journal flusher calls `record_sales` inside the commit that
+# inserts a batch of sales (next to rollups.apply), and it appends the batch's stock deltas to
+# `stock_movements` in one multi-row INSERT: one row per product per sale, summed over the sale's
+# lines. Appends take no lock another lane waits for, however popular the product.
+#
+# `compact` folds the ledger into `products.stock` in the background:
+#     python stock.py compact --watch 30
+# It claims movements with FOR UPDATE SKIP LOCKED under READ COMMITTED, so it never waits on a
+# lane's open commit (those rows are picked up next round), applies them with one UPDATE per batch
+# and deletes exactly the rows it applied. A product's stock is `products.stock` plus its
+# movements still in the ledger; sale history itself stays in transaction_items.
+#
+# Deliveries and stock counts go through the same ledger:
+#     python stock.py receive 9555555555555 48
+#     python stock.py count 9555555555555 30
+#     python stock.py reorder 9555555555555 12        flag the product once stock falls below 12
+#     python stock.py low
+#
+# `low_stock` reads the `low_stock` index on `stock_headroom` (stock - reorder_level) and corrects
+# it with the ledger, which compaction keeps short.
+
+MOVEMENT_INSERT = "INSERT INTO stock_movements (ean13, quantity, reason, reference) VALUES (%s, %s, %s, %s)"
+# products.stock and the product's movements in one statement, so one snapshot: a compaction
+# committing between two separate reads would count its movements twice or not at all
+LEVELS_QUERY = """SELECT p.product_name, p.ean13, p.stock + COALESCE((SELECT SUM(m.quantity) FROM stock_movements m WHERE m.ean13 = p.ean13), 0), p.reorder_level
+    FROM products p WHERE p.ean13 IN ({eans})"""
+SALE = "sale"
+RECEIPT = "receipt"
+COUNT = "count"
+COMPACT_LOCK = "stock_compaction"
+
+def sale_movements(sales):
+    # [(ean13, quantity, reason, reference)], products sorted within each sale
+    rows = []
+    for sale in sales:
+        deltas = defaultdict(int)
+        for item_name, quantity, price_per_unit, ean13 in sale['items']:
+            if ean13:
+                deltas[ean13] -= quantity
+        rows.extend((ean13, delta, SALE, sale['transaction_id']) for ean13, delta in sorted(deltas.items()) if delta)
+    return rows
+
+def record_sales(cursor, sales):
+    # Runs inside the flusher's commit: Callable(cursor, sales)
+    rows = sale_movements(sales)
+    if rows:
+        cursor.executemany(MOVEMENT_INSERT, rows)
+
+# Background compaction, on its own connection
+
+def compact_batch(cnx, batch_size=5000):
+    # Returns the number of movements folded into `products.stock`
+    cur = cnx.cursor()
+    try:
+        cnx.start_transaction()
+        cur.execute("SELECT movement_id, ean13, quantity FROM stock_movements ORDER BY movement_id LIMIT %s FOR UPDATE SKIP LOCKED", (batch_size,))
+        rows = cur.fetchall()
+        if not rows:
+            cnx.commit()
+            return 0
+        deltas = defaultdict(int)
+        for movement_id, ean13, quantity in rows:
+            deltas[ean13] += quantity
+        deltas = sorted((ean13, delta) for ean13, delta in deltas.items() if delta)
+        if deltas:
+            # `updated_at = updated_at`: a stock change is not a catalog change, lanes need not refresh
+            cases = " ".join("WHEN %s THEN %s" for ean13, delta in deltas)
+            params = [value for pair in deltas for value in pair] + [ean13 for ean13, delta in deltas]
+            cur.execute(f"UPDATE products SET stock = stock + CASE ean13 {cases} ELSE 0 END, updated_at = updated_at WHERE ean13 IN ({', '.join(['%s'] * len(deltas))})", params)
+        cur.execute(f"DELETE FROM stock_movements WHERE movement_id IN ({', '.join(['%s'] * len(rows))})", [movement_id for movement_id, ean13, quantity in rows])
+        cnx.commit()
+        return len(rows)
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cur.close()
+
+def compact(cnx, batch_size=5000, pause=0.05):
+    cur = cnx.cursor()
+    cur.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED") # No gap locks in front of the lanes' inserts
+    cur.close()
+    folded = 0
+    while True:
+        claimed = compact_batch(cnx, batch_size)
+        folded += claimed
+        if claimed < batch_size:
+            return folded
+        if pause:
+            time.sleep(pause)
+
+# Reads
+
+def pending(db, eans=None):
+    # {ean13 : sum of movements not yet compacted}, from the covering `pending` index
+    if eans is None:
+        rows = db.fetchall("SELECT ean13, SUM(quantity) FROM stock_movements GROUP BY ean13")
+    elif eans:
+        rows = db.fetchall(f"SELECT ean13, SUM(quantity) FROM stock_movements WHERE ean13 IN ({', '.join(['%s'] * len(eans))}) GROUP BY ean13", tuple(eans))
+    else:
+        rows = []
+    return {ean13: int(quantity) for ean13, quantity in rows}
+
+def levels(db, eans):
+    # {ean13 : {"product_name", "stock", "reorder_level"}} for the products that exist
+    if not eans:
+        return dict()
+    rows = db.fetchall(LEVELS_QUERY.format(eans=', '.join(['%s'] * len(eans))), tuple(eans))
+    return {ean13: {"product_name": product_name, "stock": int(stock), "reorder_level": reorder_level} for product_name, ean13, stock, reorder_level in rows}
+
+def low_stock(db, limit=50):
+    # Products below their reorder level, furthest below first
+    deltas = pending(db)
+    rows = db.fetchall("SELECT product_name, ean13, stock, reorder_level FROM products WHERE stock_headroom < 0 ORDER BY stock_headroom LIMIT %s", (limit + len(deltas),))
+    products = {ean13: (product_name, stock, reorder_level) for product_name, ean13, stock, reorder_level in rows}
+    # Products the ledger may have pushed below their level since the last compaction
+    missing = [ean13 for ean13, delta in deltas.items() if delta < 0 and ean13 not in products]
+    for start in range(0, len(missing), 1000):
+        chunk = missing[start:start + 1000]
+        for product_name, ean13, stock, reorder_level in db.fetchall(f"SELECT product_name, ean13, stock, reorder_level FROM products WHERE ean13 IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk)):
+            products[ean13] = (product_name, stock, reorder_level)
+    low = []
+    for ean13, (product_name, stock, reorder_level) in products.items():
+        stock += deltas.get(ean13, 0)
+        if stock < reorder_level:
+            low.append({"product_name": product_name, "ean13": ean13, "stock": stock, "reorder_level": reorder_level})
+    low.sort(key=lambda product: (product["stock"] - product["reorder_level"], product["ean13"]))
+    return low[:limit]
+
+# Deliveries, counts and reorder levels
+
+def receive(cursor, ean13, quantity, reference=None):
+    cursor.execute(MOVEMENT_INSERT, (ean13, quantity, RECEIPT, reference))
+
+def record_count(cursor, ean13, counted, reference=None):
+    # Records the difference between the shelf count and the current level; returns it. Sales still
+    # in a lane's journal when the count is taken are subtracted again once they arrive.
+    # The product row is locked first, so no compaction of it can commit until the count does, and
+    # the level is then read on the same transaction.
+    cursor.execute("SELECT id FROM products WHERE ean13 = %s FOR UPDATE", (ean13,))
+    if cursor.fetchone() is None:
+        raise ValueError(f"no product with EAN-13 '{ean13}'")
+    cursor.execute(LEVELS_QUERY.format(eans='%s'), (ean13,))
+    product_name, ean13, stock, reorder_level = cursor.fetchone()
+    delta = counted - int(stock)
+    if delta:
+        cursor.execute(MOVEMENT_INSERT, (ean13, delta, COUNT, reference))
+    return delta
+
+def set_reorder_level(cursor, ean13, reorder_level):
+    # Moves `updated_at` on, unlike a stock change: it is what tells the admin server's cached stock
+    # pages that the level changed
+    cursor.execute("SELECT id FROM products WHERE ean13 = %s FOR UPDATE", (ean13,))
+    if cursor.fetchone() is None:
+        raise ValueError(f"no product with EAN-13 '{ean13}'")
+    cursor.execute("UPDATE products SET reorder_level = %s, updated_at = CURRENT_TIMESTAMP WHERE ean13 = %s", (reorder_level, ean13))
+
+if __name__ == "__main__":
+    import dal
+    parser = argparse.ArgumentParser(description="Track stock levels")
+    parser.add_argument("command", choices=["compact", "receive", "count", "reorder", "low"])
+    parser.add_argument("ean13", nargs="?")
+    parser.add_argument("quantity", nargs="?", type=int)
+    parser.add_argument("--reference", help="Delivery note or count sheet number")
+    parser.add_argument("--watch", type=float, help="Keep compacting every this many seconds")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Movements per compaction transaction")
+    parser.add_argument("--limit", type=int, default=50, help="Products to list for `low`")
+    args = parser.parse_args()
+
+    if args.command == "low":
+        for product in low_stock(dal, args.limit):
+            print(f"{product['ean13']}  {product['stock']:>6} / {product['reorder_level']:<6} {product['product_name']}")
+        sys.exit(0)
+    if args.command != "compact":
+        if not args.ean13 or args.quantity is None:
+            parser.error(f"{args.command} needs an EAN-13 and a quantity")
+        try:
+            with dal.transaction() as cursor:
+                if args.command == "receive":
+                    receive(cursor, args.ean13, args.quantity, args.reference)
+                    print(f"Received {args.quantity} of {args.ean13}")
+                elif args.command == "count":
+                    print(f"Adjusted {args.ean13} by {record_count(cursor, args.ean13, args.quantity, args.reference):+d}")
+                else:
+                    set_reorder_level(cursor, args.ean13, args.quantity)
+                    print(f"Reorder level of {args.ean13} is now {args.quantity}")
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        sys.exit(0)
+
+    cnx = dal.connect()
+    cur = cnx.cursor()
+    cur.execute("SELECT GET_LOCK(%s, 0)", (COMPACT_LOCK,))
+    locked = cur.fetchone()[0]
+    cur.close()
+    if not locked:
+        print("Another compaction is running")
+        sys.exit(1)
+    try:
+        while True:
+            started = time.perf_counter()
+            folded = compact(cnx, args.batch_size)
+            if folded or not args.watch:
+                print(f"Compacted {folded} stock movements in {time.perf_counter() - started:.2f}s", flush=True)
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    finally:
+        cnx.close()
@@ -1,4 +1,26 @@
--- There are 4 table in the database
+-- There are 12 table in the database
+--
+-- This is the reference schema after every migration in migrations/ has run. Databases are
+-- created and upgraded with `python migrate.py upgrade`; `python migrate.py partitions` adds the
+-- coming months' partitions. The partition lists below are examples, the real ones depend on the
+-- date of the first sale.
+
+--
+-- Table structure for table `schema_migrations`
+--
+
+DROP TABLE IF EXISTS `schema_migrations`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `schema_migrations` (
+  `version` int NOT NULL,
+  `name` varchar(255) NOT NULL,
+  `checksum` char(40) NOT NULL,
+  `applied_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `duration_ms` int NOT NULL,
+  PRIMARY KEY (`version`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
 
 --
 -- Table structure for table `users`
@@ -13,7 +35,8 @@ CREATE TABLE `users` (
   `pword` varchar(255) NOT NULL,
   `clearance` int NOT NULL,
   `full_name` varchar(255) NOT NULL,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  KEY `username` (`username`)
 ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
 --
@@ -27,9 +50,15 @@ CREATE TABLE `products` (
   `id` int NOT NULL AUTO_INCREMENT,
   `product_name` varchar(255) NOT NULL,
   `ean13` varchar(15) NOT NULL,
-  `price` float NOT NULL,
+  `price` decimal(10,2) NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `stock` int NOT NULL DEFAULT '0',
+  `reorder_level` int NOT NULL DEFAULT '0',
+  `stock_headroom` int GENERATED ALWAYS AS ((`stock` - `reorder_level`)) VIRTUAL,
   PRIMARY KEY (`id`),
-  UNIQUE KEY `ean13` (`ean13`)
+  UNIQUE KEY `ean13` (`ean13`),
+  KEY `updated_at` (`updated_at`),
+  KEY `low_stock` (`stock_headroom`)
 ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -42,11 +71,18 @@ DROP TABLE IF EXISTS `transactions`;
 /*!50503 SET character_set_client = utf8mb4 */;
 CREATE TABLE `transactions` (
   `transaction_id` varchar(16) NOT NULL,
-  `total_amount` float DEFAULT NULL,
+  `total_amount` decimal(12,2) DEFAULT NULL,
   `cashier_username` varchar(255) NOT NULL,
-  `transaction_date` date DEFAULT NULL,
-  PRIMARY KEY (`transaction_id`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+  `transaction_date` date NOT NULL,
+  `transaction_time` time DEFAULT NULL,
+  PRIMARY KEY (`transaction_id`,`transaction_date`),
+  KEY `date_report` (`transaction_date`,`transaction_id`,`cashier_username`,`transaction_time`,`total_amount`),
+  KEY `cashier_date_report` (`cashier_username`,`transaction_date`,`transaction_id`,`transaction_time`,`total_amount`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+/*!50500 PARTITION BY RANGE  COLUMNS(transaction_date)
+(PARTITION p_past VALUES LESS THAN ('2025-01-01') ENGINE = InnoDB,
+ PARTITION p202501 VALUES LESS THAN ('2025-02-01') ENGINE = InnoDB,
+ PARTITION p_future VALUES LESS THAN (MAXVALUE) ENGINE = InnoDB) */;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
 --
@@ -61,9 +97,145 @@ CREATE TABLE `transaction_items` (
   `transaction_id` varchar(16) DEFAULT NULL,
   `item_name` varchar(255) DEFAULT NULL,
   `quantity` int DEFAULT NULL,
-  `price_per_unit` float DEFAULT NULL,
+  `price_per_unit` decimal(10,2) DEFAULT NULL,
   `ean13` varchar(16) DEFAULT NULL,
-  PRIMARY KEY (`item_id`),
-  KEY `transaction_id` (`transaction_id`),
-  CONSTRAINT `transaction_items_ibfk_1` FOREIGN KEY (`transaction_id`) REFERENCES `transactions` (`transaction_id`)
-) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
\ No newline at end of file
+  `transaction_date` date NOT NULL,
+  PRIMARY KEY (`item_id`,`transaction_date`),
+  KEY `transaction_lines` (`transaction_id`,`item_id`,`item_name`,`quantity`,`price_per_unit`,`ean13`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+/*!50500 PARTITION BY RANGE  COLUMNS(transaction_date)
+(PARTITION p_past VALUES LESS THAN ('2025-01-01') ENGINE = InnoDB,
+ PARTITION p202501 VALUES LESS THAN ('2025-02-01') ENGINE = InnoDB,
+ PARTITION p_future VALUES LESS THAN (MAXVALUE) ENGINE = InnoDB) */;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+-- Fills transaction_items.transaction_date for writers that leave it out (migrations/0004)
+DELIMITER ;;
+CREATE TRIGGER `transaction_items_date` BEFORE INSERT ON `transaction_items` FOR EACH ROW
+SET NEW.transaction_date = COALESCE(NEW.transaction_date, (SELECT t.transaction_date FROM transactions t WHERE t.transaction_id = NEW.transaction_id LIMIT 1), CURDATE()) ;;
+DELIMITER ;
+
+-- Sales rollups, maintained by the journal flusher (see rollups.py)
+
+--
+-- Table structure for table `sales_daily`
+--
+
+DROP TABLE IF EXISTS `sales_daily`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `sales_daily` (
+  `sales_date` date NOT NULL,
+  `transaction_count` int NOT NULL DEFAULT '0',
+  `item_count` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`sales_date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `sales_hourly`
+--
+
+DROP TABLE IF EXISTS `sales_hourly`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `sales_hourly` (
+  `sales_date` date NOT NULL,
+  `sales_hour` tinyint NOT NULL,
+  `transaction_count` int NOT NULL DEFAULT '0',
+  `item_count` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`sales_date`,`sales_hour`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `sales_by_cashier`
+--
+
+DROP TABLE IF EXISTS `sales_by_cashier`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `sales_by_cashier` (
+  `sales_date` date NOT NULL,
+  `cashier_username` varchar(255) NOT NULL,
+  `transaction_count` int NOT NULL DEFAULT '0',
+  `item_count` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`sales_date`,`cashier_username`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `sales_by_product`
+--
+
+DROP TABLE IF EXISTS `sales_by_product`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `sales_by_product` (
+  `sales_date` date NOT NULL,
+  `ean13` varchar(16) NOT NULL,
+  `item_name` varchar(255) DEFAULT NULL,
+  `quantity` int NOT NULL DEFAULT '0',
+  `revenue` decimal(14,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`sales_date`,`ean13`),
+  KEY `sales_date_quantity` (`sales_date`,`quantity`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `lane_metrics`
+--
+
+DROP TABLE IF EXISTS `lane_metrics`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `lane_metrics` (
+  `lane` varchar(16) NOT NULL,
+  `payload` mediumtext NOT NULL,
+  `received_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`lane`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+-- Receipt snapshots, written by the journal flusher (see receipt_archive.py)
+
+--
+-- Table structure for table `receipt_archive`
+--
+
+DROP TABLE IF EXISTS `receipt_archive`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `receipt_archive` (
+  `transaction_id` varchar(16) NOT NULL,
+  `receipt_date` date NOT NULL,
+  `snapshot` blob NOT NULL,
+  PRIMARY KEY (`transaction_id`),
+  KEY `receipt_date` (`receipt_date`,`transaction_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+-- Stock movements not yet folded into products.stock (see stock.py)
+
+--
+-- Table structure for table `stock_movements`
+--
+
+DROP TABLE IF EXISTS `stock_movements`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `stock_movements` (
+  `movement_id` bigint NOT NULL AUTO_INCREMENT,
+  `ean13` varchar(15) NOT NULL,
+  `quantity` int NOT NULL,
+  `reason` varchar(16) NOT NULL,
+  `reference` varchar(64) DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`movement_id`),
+  KEY `pending` (`ean13`,`quantity`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
\ No newline at end of file
@@ -0,0 +1,332 @@
+import json
+import math
+import zlib
+import base64
+import binascii
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Live best sellers from streaming heavy-hitter sketches, in constant memory however many SKUs sell.
+#
+# Each lane feeds the items of every sale its journal flusher commits (JournalFlusher.after_commit)
+# into a `TopSellers`: one sketch for the current day and one per `bucket_minutes` for the last
+# `window_minutes`. A sketch is
+#
+#   - Space-Saving: `capacity` counters. An item not monitored evicts the smallest counter and
+#     inherits its count as its error, so a counter is an upper bound and count - error a lower
+#     bound on the item's true quantity; any item sold more than total/capacity is monitored.
+#   - Count-Min: `depth` rows of `width` counters. Its estimate of any item is never below the true
+#     quantity and, with probability 1 - e^-depth, at most e/width * total above it; it tightens
+#     the Space-Saving upper bounds.
+#
+# The sketches travel with the lane's metrics snapshot (metrics.Registry.attach), so the admin server
+# gets them from `lane_metrics` every `metrics_ship_interval` seconds. Both are mergeable: `merge`
+# adds the lanes up, with the bounds still valid, and `top` lists the best sellers with them.
+# A lane saves its sketches when it closes and restores them on start, for the same day.
+#
+# Sketches arrive from the lanes over HTTP, so `validate` checks a TopSellers snapshot down to its
+# counters, within MAX_* sizes, and decodes every Count-Min; decompression never inflates past
+# the size width and depth call for. The admin server rejects a payload that fails it, and the
+# reads below skip a stored lane that fails it rather than failing for every lane.
+
+CAPACITY = 128
+WIDTH = 1024
+DEPTH = 4
+BUCKET_MINUTES = 5
+WINDOW_MINUTES = 60
+MAX_CAPACITY = 4096
+MAX_COUNT_MIN_CELLS = 1 << 16 # width * depth; the default sketch has 4096
+MAX_DEPTH = 16
+MAX_BUCKETS = 48
+
+def _indexes(key, width, depth):
+    # Same on every lane and every run, unlike hash()
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * depth).digest()
+    return [int.from_bytes(digest[4 * row:4 * row + 4], 'little') % width for row in range(depth)]
+
+class CountMin:
+    def __init__(self, width=WIDTH, depth=DEPTH, counts=None):
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else array('q', bytes(8 * width * depth)) # Row after row
+
+    def add(self, key, weight=1):
+        for row, column in enumerate(_indexes(key, self.width, self.depth)):
+            self.counts[row * self.width + column] += weight
+
+    def estimate(self, key):
+        return min(self.counts[row * self.width + column] for row, column in enumerate(_indexes(key, self.width, self.depth)))
+
+    def snapshot(self):
+        return {"width": self.width, "depth": self.depth, "counts": base64.b64encode(zlib.compress(self.counts.tobytes())).decode('ascii')}
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        width, depth = snapshot["width"], snapshot["depth"]
+        if not _integer(width) or not _integer(depth) or width < 1 or not 1 <= depth <= MAX_DEPTH or width * depth > MAX_COUNT_MIN_CELLS:
+            raise ValueError("Count-Min width and depth out of range")
+        if not isinstance(snapshot["counts"], str):
+            raise ValueError("Count-Min counters must be a string")
+        size = 8 * width * depth
+        try:
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(base64.b64decode(snapshot["counts"], validate=True), size)
+        except (binascii.Error, zlib.error) as e:
+            raise ValueError(f"Count-Min counters do not decode: {e}") from e
+        if len(data) != size or decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError("Count-Min counters do not match width and depth")
+        counts = array('q')
+        counts.frombytes(data)
+        return cls(width, depth, counts)
+
+class SpaceSaving:
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.counters = dict() # Format: {key : [count, error]}
+
+    def add(self, key, weight=1):
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+        else:
+            # O(capacity) scan; a checkout adds a handful of items, so this never shows
+            evicted = min(self.counters, key=lambda monitored: self.counters[monitored][0])
+            smallest = self.counters.pop(evicted)[0]
+            self.counters[key] = [smallest + weight, smallest]
+            return evicted
+        return None
+
+    def floor(self):
+        # Upper bound on the count of any item not monitored
+        return min(count for count, error in self.counters.values()) if len(self.counters) >= self.capacity else 0
+
+class HeavyHitters:
+    def __init__(self, capacity=CAPACITY, width=WIDTH, depth=DEPTH):
+        self.space_saving = SpaceSaving(capacity)
+        self.count_min = CountMin(width, depth)
+        self.names = dict() # Format: {key : item_name}, monitored items only
+        self.total = 0
+
+    def add(self, key, name, weight):
+        self.total += weight
+        self.count_min.add(key, weight)
+        evicted = self.space_saving.add(key, weight)
+        if evicted is not None:
+            self.names.pop(evicted, None)
+        self.names[key] = name
+
+    def snapshot(self):
+        return {
+            "total": self.total,
+            "capacity": self.space_saving.capacity,
+            "counters": [[key, count, error, self.names.get(key)] for key, (count, error) in self.space_saving.counters.items()],
+            "count_min": self.count_min.snapshot()
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get("count_min"), dict):
+            raise ValueError("sketch must be an object with a Count-Min")
+        capacity, total, counters = snapshot["capacity"], snapshot["total"], snapshot["counters"]
+        if not _integer(capacity) or not 1 <= capacity <= MAX_CAPACITY or not _integer(total):
+            raise ValueError("sketch capacity or total out of range")
+        if not isinstance(counters, list) or len(counters) > capacity:
+            raise ValueError("sketch counters must be a list within its capacity")
+        count_min = CountMin.from_snapshot(snapshot["count_min"])
+        sketch = cls(capacity, count_min.width, count_min.depth)
+        sketch.count_min = count_min
+        sketch.total = total
+        for counter in counters:
+            if not isinstance(counter, list) or len(counter) != 4:
+                raise ValueError("sketch counter must be [key, count, error, name]")
+            key, count, error, name = counter
+            if not isinstance(key, str) or not _integer(count) or not _integer(error) or not (name is None or isinstance(name, str)):
+                raise ValueError("sketch counter has the wrong types")
+            sketch.space_saving.counters[key] = [count, error]
+            sketch.names[key] = name
+        return sketch
+
+class TopSellers:
+    def __init__(self, capacity=CAPACITY, width=WIDTH, depth=DEPTH, bucket_minutes=BUCKET_MINUTES, window_minutes=WINDOW_MINUTES):
+        self.capacity = capacity
+        self.width = width
+        self.depth = depth
+        self.bucket_minutes = bucket_minutes
+        self.bucket_count = math.ceil(window_minutes / bucket_minutes)
+        self.day = None # "YYYY-MM-DD" of `daily`
+        self.daily = HeavyHitters(capacity, width, depth)
+        self.buckets = OrderedDict() # Format: {"YYYY-MM-DD HH:MM" bucket start : HeavyHitters}, oldest first
+        self.lock = threading.Lock()
+
+    def _new_sketch(self):
+        return HeavyHitters(self.capacity, self.width, self.depth)
+
+    def _bucket(self, sale_date, sale_time):
+        hour, minute = (int(part) for part in sale_time.split(':')[:2])
+        minute -= minute % self.bucket_minutes
+        return f"{sale_date} {hour:02d}:{minute:02d}"
+
+    def add_sales(self, sales):
+        # JournalFlusher.after_commit: sales newly committed to MySQL, never a replayed one
+        with self.lock:
+            for sale in sales:
+                sale_date = str(sale['transaction_date'])
+                if self.day is None or sale_date > self.day:
+                    self.day = sale_date
+                    self.daily = self._new_sketch()
+                sketches = [self.daily] if sale_date == self.day else []
+                if sale.get('transaction_time'):
+                    start = self._bucket(sale_date, str(sale['transaction_time']))
+                    bucket = self.buckets.get(start)
+                    if bucket is None and (not self.buckets or start > next(iter(self.buckets))):
+                        bucket = self.buckets[start] = self._new_sketch()
+                        self.buckets = OrderedDict(sorted(self.buckets.items())[-self.bucket_count:])
+                    if bucket is not None:
+                        sketches.append(bucket)
+                for item_name, quantity, price_per_unit, ean13 in sale['items']:
+                    for sketch in sketches:
+                        sketch.add(ean13 or item_name, item_name, quantity)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "day": self.day,
+                "daily": self.daily.snapshot(),
+                "bucket_minutes": self.bucket_minutes,
+                "buckets": {start: sketch.snapshot() for start, sketch in self.buckets.items()}
+            }
+
+    def restore(self, snapshot):
+        daily, buckets = decode(snapshot)
+        with self.lock:
+            self.day = snapshot["day"]
+            self.daily = daily
+            self.buckets = OrderedDict(sorted(buckets.items()))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as sketch_file:
+            json.dump(self.snapshot(), sketch_file, separators=(',', ':'))
+
+    def load(self, path, today):
+        # Picks up where the lane left off, unless the saved sketches are from another day
+        try:
+            with open(path, encoding='utf-8') as sketch_file:
+                snapshot = json.load(sketch_file)
+            if snapshot.get("day") == today:
+                self.restore(snapshot)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Unable to restore best sellers from '{path}'")
+            print(e)
+
+def _integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def decode(snapshot):
+    # TopSellers snapshot -> (daily HeavyHitters, {bucket start : HeavyHitters}); ValueError if malformed
+    try:
+        if not isinstance(snapshot, dict) or not (snapshot.get("day") is None or isinstance(snapshot["day"], str)):
+            raise ValueError("best sellers must be an object with a day")
+        buckets = snapshot["buckets"]
+        if not _integer(snapshot["bucket_minutes"]) or snapshot["bucket_minutes"] < 1:
+            raise ValueError("bucket_minutes must be a positive integer")
+        if not isinstance(buckets, dict) or len(buckets) > MAX_BUCKETS:
+            raise ValueError(f"buckets must be an object of at most {MAX_BUCKETS} sketches")
+        for start in buckets:
+            datetime.strptime(start, "%Y-%m-%d %H:%M")
+        return HeavyHitters.from_snapshot(snapshot["daily"]), {start: HeavyHitters.from_snapshot(sketch) for start, sketch in buckets.items()}
+    except KeyError as e:
+        raise ValueError(f"best sellers are missing {e}") from e
+
+def validate(snapshot):
+    # Raises ValueError unless `snapshot` is a well-formed TopSellers snapshot
+    decode(snapshot)
+
+# Admin side: merging the lanes and reading the result
+
+def merge(snapshots):
+    # HeavyHitters snapshots from several lanes -> {"total", "count_min", "items": {key : [lower, upper, name]}}.
+    # An item a lane does not monitor may still have sold there up to that lane's smallest counter.
+    total = 0
+    count_min = None
+    items = dict()
+    floors = []
+    for snapshot in snapshots:
+        sketch = HeavyHitters.from_snapshot(snapshot)
+        if count_min is None:
+            count_min = sketch.count_min
+        elif (count_min.width, count_min.depth) == (sketch.count_min.width, sketch.count_min.depth):
+            count_min = CountMin(count_min.width, count_min.depth, array('q', (a + b for a, b in zip(count_min.counts, sketch.count_min.counts))))
+        else:
+            print(f"Skipped a best sellers sketch of {sketch.count_min.width}x{sketch.count_min.depth}, the others are {count_min.width}x{count_min.depth}")
+            continue
+        total += sketch.total
+        floor = sketch.space_saving.floor()
+        floors.append((sketch, floor))
+    for sketch, floor in floors:
+        for key, (count, error) in sketch.space_saving.counters.items():
+            items.setdefault(key, [0, 0, sketch.names.get(key)])
+    for key, item in items.items():
+        for sketch, floor in floors:
+            counter = sketch.space_saving.counters.get(key)
+            if counter is not None:
+                item[0] += counter[0] - counter[1]
+                item[1] += counter[0]
+            else:
+                item[1] += floor
+            if item[2] is None:
+                item[2] = sketch.names.get(key)
+    return {"total": total, "count_min": count_min, "items": items}
+
+def top(merged, limit=10):
+    # Best sellers with bounds: the true quantity is between `lower` and `upper`; `upper` is exact
+    # from Space-Saving, or from Count-Min with the stated confidence
+    count_min = merged["count_min"]
+    rows = []
+    for key, (lower, upper, name) in merged["items"].items():
+        if count_min is not None:
+            upper = max(lower, min(upper, count_min.estimate(key)))
+        rows.append({"ean13": key, "item_name": name or key, "estimate": (lower + upper) // 2 if upper > lower else lower, "lower": lower, "upper": upper})
+    rows.sort(key=lambda row: (-row["estimate"], -row["lower"], row["ean13"]))
+    guarantee = None
+    if count_min is not None:
+        guarantee = {
+            "count_min_error": math.ceil(math.e / count_min.width * merged["total"]),
+            "confidence": round(1 - math.exp(-count_min.depth), 4)
+        }
+    return {"total": merged["total"], "items": rows[:limit], "guarantee": guarantee}
+
+def lane_sketches(lanes):
+    # {lane : (metrics snapshot, received_at)} -> [TopSellers snapshot], leaving out malformed ones
+    sketches = []
+    for lane, (snapshot, received_at) in sorted(lanes.items()):
+        lane_snapshot = snapshot.get("sketches", {}).get("top_sellers")
+        if lane_snapshot is None:
+            continue
+        try:
+            validate(lane_snapshot)
+        except ValueError as e:
+            print(f"Skipped the best sellers of lane '{lane}'")
+            print(e)
+            continue
+        sketches.append(lane_snapshot)
+    return sketches
+
+def today(lanes, day, limit=10):
+    return top(merge([sketches["daily"] for sketches in lane_sketches(lanes) if sketches.get("day") == day]), limit)
+
+def last_window(lanes, now, minutes=WINDOW_MINUTES, limit=10):
+    # Buckets that end after now - minutes; the window is a bucket wider at most
+    since = now - timedelta(minutes=minutes)
+    snapshots = []
+    for sketches in lane_sketches(lanes):
+        for start, sketch in sketches["buckets"].items():
+            if datetime.strptime(start, "%Y-%m-%d %H:%M") + timedelta(minutes=sketches["bucket_minutes"]) > since:
+                snapshots.append(sketch)
+    return top(merge(snapshots), limit)
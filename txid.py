@@ -0,0 +1,74 @@
+import re
+import time
+import threading
+from datetime import datetime, timezone
+
+# Transaction ID generator in the spirit of Snowflake/ULID, with no database coordination.
+#
+# Layout (15 characters, fits `transactions.transaction_id varchar(16)`):
+#   TTTTTTTTT  milliseconds since EPOCH_MS, 9 Crockford base32 digits (good for ~1100 years)
+#   LLL        lane identity from config.json appinfo.serial_id, left padded with '0'
+#   SSS        per-lane sequence within the millisecond, 3 base32 digits (32768 per ms)
+#
+# IDs are monotonic per lane, unique across lanes as long as serial IDs are unique, and sort by
+# time, so InnoDB appends new rows at the right edge of the primary key instead of at random pages.
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+EPOCH_MS = 1735689600000 # 2025-01-01 00:00:00 UTC
+TIMESTAMP_DIGITS = 9
+LANE_DIGITS = 3
+SEQUENCE_DIGITS = 3
+MAX_SEQUENCE = 32 ** SEQUENCE_DIGITS - 1
+
+def encode(value, digits):
+    chars = []
+    for _ in range(digits):
+        value, remainder = divmod(value, 32)
+        chars.append(CROCKFORD[remainder])
+    if value:
+        raise ValueError("Value does not fit in the requested number of digits")
+    return ''.join(reversed(chars))
+
+def decode(text):
+    value = 0
+    for char in text:
+        value = value * 32 + CROCKFORD.index(char)
+    return value
+
+def normalize_lane_id(lane_id):
+    lane = str(lane_id).strip().upper()
+    if not re.fullmatch(r"[0-9A-Z]{1,%d}" % LANE_DIGITS, lane):
+        raise ValueError(f"Lane serial ID '{lane_id}' must be 1 to {LANE_DIGITS} letters or digits")
+    return lane.rjust(LANE_DIGITS, '0')
+
+class TransactionIdGenerator:
+    def __init__(self, lane_id, clock=time.time):
+        self.lane = normalize_lane_id(lane_id)
+        self.clock = clock
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            now_ms = int(self.clock() * 1000) - EPOCH_MS
+            if now_ms > self.last_ms:
+                self.last_ms = now_ms
+                self.sequence = 0
+            else:
+                # Same millisecond, or the wall clock stepped backwards: stay on the last
+                # timestamp and count up so IDs keep increasing.
+                self.sequence += 1
+                if self.sequence > MAX_SEQUENCE:
+                    self.last_ms += 1
+                    self.sequence = 0
+            return encode(self.last_ms, TIMESTAMP_DIGITS) + self.lane + encode(self.sequence, SEQUENCE_DIGITS)
+
+def parse(transaction_id):
+    # Returns (datetime in UTC, lane, sequence) for an ID made by TransactionIdGenerator
+    if len(transaction_id) != TIMESTAMP_DIGITS + LANE_DIGITS + SEQUENCE_DIGITS:
+        raise ValueError(f"'{transaction_id}' is not a generated transaction ID")
+    timestamp_ms = decode(transaction_id[:TIMESTAMP_DIGITS]) + EPOCH_MS
+    lane = transaction_id[TIMESTAMP_DIGITS:TIMESTAMP_DIGITS + LANE_DIGITS].lstrip('0') or '0'
+    sequence = decode(transaction_id[TIMESTAMP_DIGITS + LANE_DIGITS:])
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc), lane, sequence
@@ -0,0 +1,87 @@
+import time
+import traceback
+from collections import deque
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+# Background execution for blocking work (database queries) so the Qt event loop never waits on I/O.
+# Jobs run on a QThreadPool and hand their result back to the GUI thread through Qt signals.
+
+class WorkerSignals(QObject):
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    finished = pyqtSignal()
+
+class Worker(QRunnable):
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals() # Created on the GUI thread, so connected slots run there
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.error.emit(e)
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+class WorkerExecutor:
+    def __init__(self, max_threads=1):
+        # A single thread keeps jobs in submission order; more threads are only safe when each
+        # job brings its own connection (see `dal`).
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self.active = set() # Keeps workers (and their signals) alive until their results are delivered
+
+    def submit(self, fn, *args, on_result=None, on_error=None, **kwargs):
+        worker = Worker(fn, *args, **kwargs)
+        if on_result:
+            worker.signals.result.connect(on_result)
+        if on_error:
+            worker.signals.error.connect(on_error)
+        worker.signals.finished.connect(lambda: self.active.discard(worker))
+        self.active.add(worker)
+        self.pool.start(worker)
+        return worker
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+class LatencyTracker:
+    # Rolling window of latency samples (in milliseconds) checked against a budget
+    def __init__(self, name, budget_ms, window=1000):
+        self.name = name
+        self.budget_ms = budget_ms
+        self.samples = deque(maxlen=window)
+        self.over_budget = 0
+
+    def start(self):
+        return time.perf_counter()
+
+    def stop(self, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        self.samples.append(elapsed)
+        if elapsed > self.budget_ms:
+            self.over_budget += 1
+            print(f"{self.name} took {elapsed:.1f}ms (budget {self.budget_ms}ms)")
+        return elapsed
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def summary(self):
+        return {
+            "count": len(self.samples),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": max(self.samples, default=0.0),
+            "over_budget": self.over_budget
+        }
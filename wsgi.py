@@ -0,0 +1,30 @@
+import sys
+import dal
+from admin import create_app
+from conn import CONFIG
+
+# WSGI entry point for the admin server.
+#
+#     gunicorn -c gunicorn.conf.py wsgi:app     Linux/macOS, several worker processes
+#     python wsgi.py                            Any OS, one process with `admin_threads` threads (waitress)
+
+try:
+    app = create_app()
+except ValueError as e:
+    print(e)
+    sys.exit(1)
+
+if __name__ == "__main__":
+    host, port = CONFIG.get('admin_bind', '127.0.0.1:5000').rsplit(':', 1)
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress is not installed (pip install waitress), using the threaded development server instead")
+        serve = None
+    try:
+        if serve:
+            serve(app, host=host, port=int(port), threads=int(CONFIG.get('admin_threads', 4)), channel_timeout=int(CONFIG.get('admin_timeout', 120)))
+        else:
+            app.run(host=host, port=int(port), threaded=True)
+    finally:
+        dal.close_pool()